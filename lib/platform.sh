@@ -54,6 +54,48 @@ get_zsh_path() {
     fi
 }
 
+# Run a package manager command while holding a lock shared by all setup scripts.
+# brew and apt-get refuse to run while another instance holds their lock, so
+# components set up concurrently take turns here instead of failing.
+with_package_lock() {
+    local lock="${TMPDIR:-/tmp}/dotfiles-package.lock"
+    until mkdir "$lock" 2>/dev/null; do
+        # Take over a lock left behind by a setup script that was killed
+        local owner
+        owner=$(cat "$lock/pid" 2>/dev/null || true)
+        if [[ -n "$owner" ]] && ! kill -0 "$owner" 2>/dev/null; then
+            rm -rf "$lock"
+            continue
+        fi
+        sleep 0.2
+    done
+    echo $$ > "$lock/pid"
+
+    local status=0
+    "$@" || status=$?
+    rm -rf "$lock"
+    return $status
+}
+
+# Install apt packages, refreshing the package index at most once per setup run.
+# inv setup refreshes it before installing every component's packages in one
+# transaction, and sets DOTFILES_APT_UPDATED so the scripts don't repeat it.
+# Usage: with_package_lock apt_install zsh
+apt_install() {
+    if [[ -z "${DOTFILES_APT_UPDATED:-}" ]]; then
+        sudo apt-get update -qq || return
+        export DOTFILES_APT_UPDATED=1
+    fi
+    sudo apt-get install -y "$@"
+}
+
+# Print the local path of a cached installer or release artifact, downloading it
+# only if the cache has no fresh copy (see scripts/artifacts.py).
+# Usage: installer=$(fetch_artifact uv-installer) && sh "$installer"
+fetch_artifact() {
+    (cd "$REPO_DIR" && "${DOTFILES_PYTHON:-python3}" -m scripts.artifacts fetch "$@")
+}
+
 # Ensure zsh is installed
 ensure_zsh() {
     if command -v zsh &> /dev/null; then
@@ -68,8 +110,7 @@ ensure_zsh() {
             ;;
         linux)
             echo "📦 Installing zsh..."
-            sudo apt-get update -qq
-            sudo apt-get install -y zsh
+            with_package_lock apt_install zsh
             ;;
     esac
 }
@@ -97,6 +138,27 @@ setup_homebrew() {
     fi
 }
 
+# Print the sha256 of a file
+file_sha256() {
+    if command -v sha256sum &> /dev/null; then
+        sha256sum "$1" | cut -d' ' -f1
+    else
+        shasum -a 256 "$1" | cut -d' ' -f1
+    fi
+}
+
+# Record something setup installed in the install manifest, which inv reset
+# tears down from (see InstallManifest in scripts/setup.py). The component is
+# the directory of the running setup script unless DOTFILES_COMPONENT is set.
+# Usage: record_artifact symlink|file|dir|tree|gitconfig <path> <expected>
+record_artifact() {
+    local manifest="${XDG_STATE_HOME:-$HOME/.local/state}/dotfiles/manifest.tsv"
+    local component="${DOTFILES_COMPONENT:-$(basename "$(dirname "$0")")}"
+    mkdir -p "$(dirname "$manifest")"
+    # One short printf per record, so lines from concurrent scripts don't interleave
+    printf '%s\t%s\t%s\t%s\n' "$1" "$2" "$3" "$component" >> "$manifest"
+}
+
 # Ensure a symlink exists and points to the correct target.
 # Handles stale symlinks (wrong target), existing files (backs up), and missing targets.
 ensure_symlink() {
@@ -124,6 +186,7 @@ ensure_symlink() {
         ln -s "$src" "$target"
         echo "  ✓ $label linked"
     fi
+    record_artifact symlink "$target" "$src"
 }
 
 # Print detected platform info
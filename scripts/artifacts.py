@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+Local cache for installer scripts and release downloads
+
+Component setup scripts fetch installers and release tarballs through this
+cache instead of piping curl straight into a shell, so provisioning many
+machines (or re-provisioning one) downloads each artifact once. Content is
+stored by sha256; release metadata is revalidated with ETag/Last-Modified once
+its TTL runs out, and release assets are verified against the release's
+published checksums.
+
+Usage:
+    python -m scripts.artifacts fetch uv-installer     # Print the cached path
+    python -m scripts.artifacts fetch lazygit --arch arm64
+    python -m scripts.artifacts prefetch               # Download everything concurrently
+    python -m scripts.artifacts list                   # Show what is cached
+    python -m scripts.artifacts --offline fetch NAME   # Never touch the network
+"""
+
+import argparse
+import contextlib
+import fcntl
+import hashlib
+import http.client
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, TypedDict
+
+from scripts.fsutil import get_cache_dir
+from scripts.setup import Colors, print_colored
+
+
+class CacheEntry(TypedDict):
+    sha256: str
+    etag: str
+    last_modified: str
+    fetched_at: float
+    size: int
+
+
+class Artifact(TypedDict):
+    url: str
+    ttl: int
+    components: list[str]
+    platforms: list[str]
+
+
+class Release(TypedDict):
+    api_url: str
+    asset: str
+    checksums: str
+    ttl: int
+    components: list[str]
+    platforms: list[str]
+
+
+DAY = 86400
+USER_AGENT = "dotfiles-setup"
+HTTP_TIMEOUT_SECONDS = 30
+
+# Installer scripts change upstream without notice, so they are revalidated weekly
+ARTIFACTS: dict[str, Artifact] = {
+    "uv-installer": {
+        "url": "https://astral.sh/uv/install.sh",
+        "ttl": 7 * DAY,
+        "components": ["terminal"],
+        "platforms": ["Darwin", "Linux"],
+    },
+    "fnm-installer": {
+        "url": "https://fnm.vercel.app/install",
+        "ttl": 7 * DAY,
+        "components": ["terminal"],
+        "platforms": ["Linux"],
+    },
+    "pnpm-installer": {
+        "url": "https://get.pnpm.io/install.sh",
+        "ttl": 7 * DAY,
+        "components": ["terminal"],
+        "platforms": ["Darwin", "Linux"],
+    },
+    "starship-installer": {
+        "url": "https://starship.rs/install.sh",
+        "ttl": 7 * DAY,
+        "components": ["terminal"],
+        "platforms": ["Linux"],
+    },
+}
+
+# GitHub releases: metadata is revalidated daily, versioned assets never change
+RELEASES: dict[str, Release] = {
+    "lazygit": {
+        "api_url": "https://api.github.com/repos/jesseduffield/lazygit/releases/latest",
+        "asset": "lazygit_{version}_Linux_{arch}.tar.gz",
+        "checksums": "checksums.txt",
+        "ttl": DAY,
+        "components": ["lazygit"],
+        "platforms": ["Linux"],
+    },
+}
+
+
+class ArtifactError(Exception):
+    pass
+
+
+def get_artifacts_dir() -> Path:
+    return get_cache_dir() / "artifacts"
+
+
+def normalize_arch(machine: str) -> str:
+    if machine in ("x86_64", "amd64"):
+        return "x86_64"
+    if machine in ("aarch64", "arm64"):
+        return "arm64"
+    return machine
+
+
+class ArtifactCache:
+    """Content-addressed download cache shared by every setup script.
+
+    objects/<sha256> holds each downloaded body once and index.json maps URLs
+    to the object they last resolved to, with the validators needed to
+    revalidate them. The index is guarded by a file lock, since several
+    component scripts may fetch at the same time.
+
+    Args:
+        root: Cache directory; defaults to $XDG_CACHE_HOME/dotfiles/artifacts.
+        offline: Serve everything from the cache and fail instead of downloading.
+        now: Clock, replaceable in tests.
+    """
+
+    def __init__(
+        self,
+        root: Optional[Path] = None,
+        offline: bool = False,
+        now: Callable[[], float] = time.time,
+    ) -> None:
+        self.root = root or get_artifacts_dir()
+        self.offline = offline
+        self.now = now
+        self._thread_lock = threading.Lock()
+
+    def object_path(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / digest
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[dict[str, CacheEntry]]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._thread_lock, open(self.root / ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            index_path = self.root / "index.json"
+            try:
+                with open(index_path) as f:
+                    index: dict[str, CacheEntry] = json.load(f)
+            except (OSError, ValueError):
+                index = {}
+            before = json.dumps(index, sort_keys=True)
+            yield index
+            if json.dumps(index, sort_keys=True) != before:
+                tmp_path = index_path.with_suffix(".tmp")
+                tmp_path.write_text(json.dumps(index, indent=2, sort_keys=True) + "\n")
+                tmp_path.replace(index_path)
+
+    def _cached(self, url: str) -> Optional[tuple[CacheEntry, Path]]:
+        with self._locked() as index:
+            entry = index.get(url)
+        if entry is None:
+            return None
+        path = self.object_path(entry["sha256"])
+        if not path.is_file() or _hash_path(path) != entry["sha256"]:
+            return None
+        return entry, path
+
+    def fetch(self, url: str, ttl: Optional[int] = None, sha256: Optional[str] = None) -> Path:
+        """Return a local path with the content at url, downloading only if needed.
+
+        A cached copy younger than ttl is used as is. An older one is revalidated
+        with If-None-Match/If-Modified-Since, and used if the server is unreachable.
+
+        Args:
+            url: What to download.
+            ttl: Seconds a cached copy stays fresh; None means it never goes stale
+                (for versioned, immutable URLs).
+            sha256: Expected content hash, if known.
+
+        Returns:
+            Path to the cached object. Its name is its sha256.
+
+        Raises:
+            ArtifactError: If the content is unavailable or fails verification.
+        """
+        cached = self._cached(url)
+        if cached is not None:
+            entry, path = cached
+            fresh = ttl is None or self.now() - entry["fetched_at"] < ttl
+            if (fresh or self.offline) and (sha256 is None or entry["sha256"] == sha256):
+                return path
+        if self.offline:
+            raise ArtifactError(f"{url} is not cached and --offline was given")
+
+        headers = {"User-Agent": USER_AGENT}
+        if cached is not None:
+            if cached[0]["etag"]:
+                headers["If-None-Match"] = cached[0]["etag"]
+            if cached[0]["last_modified"]:
+                headers["If-Modified-Since"] = cached[0]["last_modified"]
+
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=HTTP_TIMEOUT_SECONDS) as response:
+                digest, size = self._store(response)
+                etag = response.headers.get("ETag", "")
+                last_modified = response.headers.get("Last-Modified", "")
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and cached is not None:
+                with self._locked() as index:
+                    index[url] = {**cached[0], "fetched_at": self.now()}
+                return cached[1]
+            raise ArtifactError(f"{url}: HTTP {e.code}") from e
+        except (urllib.error.URLError, OSError) as e:
+            if cached is not None:
+                print(f"  ⚠️  {url} unreachable ({e}), using cached copy", file=sys.stderr)
+                return cached[1]
+            raise ArtifactError(f"{url}: {e}") from e
+
+        if sha256 is not None and digest != sha256:
+            raise ArtifactError(f"{url}: expected sha256 {sha256}, got {digest}")
+
+        with self._locked() as index:
+            index[url] = {
+                "sha256": digest,
+                "etag": etag,
+                "last_modified": last_modified,
+                "fetched_at": self.now(),
+                "size": size,
+            }
+        return self.object_path(digest)
+
+    def _store(self, response: http.client.HTTPResponse) -> tuple[str, int]:
+        tmp_dir = self.root / "objects"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = tmp_dir / f".download.{os.getpid()}.{threading.get_ident()}"
+        digest = hashlib.sha256()
+        size = 0
+        with open(tmp_path, "wb") as f:
+            while chunk := response.read(64 * 1024):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+
+        path = self.object_path(digest.hexdigest())
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path.replace(path)
+        return digest.hexdigest(), size
+
+    def fetch_release(
+        self, api_url: str, asset: str, checksums: str = "", ttl: Optional[int] = DAY, **fields: str
+    ) -> Path:
+        """Download an asset of a GitHub release, verified against its checksums file.
+
+        Args:
+            api_url: GitHub API URL of the release (e.g., .../releases/latest).
+            asset: Asset file name; {version} and any extra fields are filled in.
+            checksums: Name of the release's checksums file, or "" to skip verification.
+            ttl: Seconds the release metadata stays fresh.
+            **fields: Extra values for the asset name template (e.g., arch).
+
+        Returns:
+            Path to the cached asset.
+
+        Raises:
+            ArtifactError: If the asset is missing or its checksum does not match.
+        """
+        release = json.loads(self.fetch(api_url, ttl=ttl).read_text())
+        version = str(release["tag_name"]).removeprefix("v")
+        urls = {a["name"]: a["browser_download_url"] for a in release.get("assets", [])}
+
+        name = asset.format(version=version, **fields)
+        if name not in urls:
+            raise ArtifactError(f"{api_url}: release {version} has no asset {name}")
+
+        expected = None
+        if checksums:
+            if checksums not in urls:
+                raise ArtifactError(f"{api_url}: release {version} has no {checksums}")
+            for line in self.fetch(urls[checksums], ttl=None).read_text().splitlines():
+                parts = line.split()
+                if len(parts) == 2 and parts[1].lstrip("*") == name:
+                    expected = parts[0]
+            if expected is None:
+                raise ArtifactError(f"{checksums} does not list {name}")
+
+        return self.fetch(urls[name], ttl=None, sha256=expected)
+
+    def entries(self) -> dict[str, CacheEntry]:
+        with self._locked() as index:
+            return dict(index)
+
+
+def _hash_path(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def fetch_named(cache: ArtifactCache, name: str, arch: Optional[str] = None) -> Path:
+    """Fetch one of the artifacts in ARTIFACTS or RELEASES by name.
+
+    Args:
+        cache: Cache to fetch through.
+        name: Key of ARTIFACTS or RELEASES, or a URL.
+        arch: CPU architecture for release assets; defaults to this machine's.
+
+    Returns:
+        Path to the cached artifact.
+
+    Raises:
+        ArtifactError: If the name is unknown or the download fails.
+    """
+    if name in ARTIFACTS:
+        return cache.fetch(ARTIFACTS[name]["url"], ttl=ARTIFACTS[name]["ttl"])
+    if name in RELEASES:
+        release = RELEASES[name]
+        return cache.fetch_release(
+            release["api_url"],
+            release["asset"],
+            release["checksums"],
+            ttl=release["ttl"],
+            arch=arch or normalize_arch(platform.machine()),
+        )
+    if "://" in name:
+        return cache.fetch(name, ttl=7 * DAY)
+    raise ArtifactError(f"Unknown artifact: {name}")
+
+
+def artifacts_for(components: list[str], system: Optional[str] = None) -> list[str]:
+    system = system or platform.system()
+    names = [*ARTIFACTS, *RELEASES]
+    specs: dict[str, Artifact | Release] = {**ARTIFACTS, **RELEASES}
+    return [
+        name
+        for name in names
+        if system in specs[name]["platforms"]
+        and any(component in specs[name]["components"] for component in components)
+    ]
+
+
+def prefetch(cache: ArtifactCache, names: list[str], jobs: int = 8) -> dict[str, str]:
+    """Fetch several artifacts concurrently.
+
+    Args:
+        cache: Cache to fetch through.
+        names: Artifact names to fetch.
+        jobs: Maximum concurrent downloads.
+
+    Returns:
+        Error message per artifact that could not be fetched; empty on success.
+    """
+
+    def fetch_one(name: str) -> Optional[str]:
+        try:
+            fetch_named(cache, name)
+        except ArtifactError as e:
+            return str(e)
+        return None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(names)))) as pool:
+        results = pool.map(fetch_one, names)
+        return {name: error for name, error in zip(names, results, strict=True) if error}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cache installers and release artifacts")
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        default=os.environ.get("DOTFILES_OFFLINE") == "1",
+        help="Only use cached artifacts (also enabled by DOTFILES_OFFLINE=1)",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    fetch_parser = commands.add_parser("fetch", help="Print the local path of an artifact")
+    fetch_parser.add_argument("name", help="Artifact name or URL")
+    fetch_parser.add_argument("--arch", help="CPU architecture for release assets")
+    prefetch_parser = commands.add_parser("prefetch", help="Download artifacts concurrently")
+    prefetch_parser.add_argument("names", nargs="*", help="Artifacts (default: all)")
+    commands.add_parser("list", help="List cached artifacts")
+    args = parser.parse_args()
+
+    cache = ArtifactCache(offline=args.offline)
+    if args.command == "fetch":
+        try:
+            print(fetch_named(cache, args.name, args.arch))
+        except ArtifactError as e:
+            # stdout is the path callers capture, so errors go to stderr
+            print(f"{Colors.RED}Error: {e}{Colors.NC}", file=sys.stderr)
+            sys.exit(1)
+    elif args.command == "prefetch":
+        names = args.names or [*ARTIFACTS, *RELEASES]
+        errors = prefetch(cache, names)
+        for name, error in errors.items():
+            print_colored(f"  ✗ {name}: {error}", Colors.RED)
+        print_colored(f"Cached {len(names) - len(errors)}/{len(names)} artifacts", Colors.GREEN)
+        if errors:
+            sys.exit(1)
+    else:
+        entries = cache.entries()
+        for url, entry in sorted(entries.items()):
+            age = (time.time() - entry["fetched_at"]) / 3600
+            print(f"  {entry['sha256'][:12]}  {entry['size']:>10}  {age:6.1f}h old  {url}")
+        total = sum(entry["size"] for entry in entries.values())
+        print(f"  {len(entries)} artifact(s), {total} bytes in {cache.root}")
+
+
+if __name__ == "__main__":
+    main()
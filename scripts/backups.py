@@ -0,0 +1,291 @@
+"""
+Content-addressed store for the files and directories setup replaces
+
+backup_if_exists() in scripts/setup.py moves anything in the way of a managed
+path in here, as do inv reset and the bundle extractor; inv cleanup prunes it.
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections.abc import Iterator
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, TypedDict, cast
+
+from scripts.fsutil import clone_file, get_state_dir, hash_file
+
+
+class BackupFile(TypedDict):
+    hash: str
+    mode: int
+    size: int
+    mtime_ns: int
+
+
+class BackupEntry(TypedDict):
+    id: str
+    source: str
+    kind: str
+    created: float
+    files: dict[str, BackupFile]
+    links: dict[str, str]
+    dirs: list[str]
+
+
+BACKUP_KEEP = 5
+
+
+class BackupStore:
+    """Content-addressed store for files and directories replaced by setup.
+
+    Each file's content is kept once under objects/<sha256>, hardlinked from the
+    original when nothing else shares its inode, so backing up the same config
+    over and over costs no extra space. index.jsonl records what was backed up,
+    from where and when, and is what restore() and prune() work from.
+    latest/<sha256 of the source path>.json holds the newest entry for each
+    path, so a backup never has to read the index. Backups and prune() hold an
+    flock on .lock, so prune() cannot drop a line or object a backup in another
+    process is writing.
+    """
+
+    def __init__(self, root: Optional[Path] = None) -> None:
+        self.root = root or get_state_dir() / "backups"
+        self.objects_dir = self.root / "objects"
+        self.index_path = self.root / "index.jsonl"
+        self.latest_dir = self.root / "latest"
+        self._thread_lock = threading.Lock()
+
+    def object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest
+
+    def latest_path(self, source: str) -> Path:
+        return self.latest_dir / f"{hashlib.sha256(source.encode()).hexdigest()}.json"
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[None]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._thread_lock, open(self.root / ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def latest(self, source: str) -> Optional[BackupEntry]:
+        """Return the newest backup of source (an absolute path), if any."""
+        try:
+            with open(self.latest_path(source)) as f:
+                return cast(BackupEntry, json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    def entries(self) -> list[BackupEntry]:
+        """Return every recorded backup, oldest first."""
+        if not self.index_path.exists():
+            return []
+        entries: list[BackupEntry] = []
+        with open(self.index_path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entries.append(cast(BackupEntry, json.loads(line)))
+                except json.JSONDecodeError:
+                    # A line cut short by an interrupted write
+                    continue
+        return entries
+
+    def backup(self, path: Path) -> BackupEntry:
+        """Move a file or directory into the store and record it in the index.
+
+        Files whose size and mtime match the latest backup of the same path
+        reuse its hash without being read again.
+
+        Args:
+            path: File or directory to back up. It no longer exists afterwards.
+
+        Returns:
+            The index entry describing the backup.
+        """
+        with self._locked():
+            return self._backup(path)
+
+    def _backup(self, path: Path) -> BackupEntry:
+        source = path.absolute()
+        latest = self.latest(str(source))
+        previous = latest["files"] if latest else {}
+
+        files: dict[str, BackupFile] = {}
+        links: dict[str, str] = {}
+        dirs: list[str] = []
+        if path.is_dir():
+            kind = "dir"
+            for dirpath, dirnames, filenames in os.walk(path):
+                current = Path(dirpath)
+                rel_dir = current.relative_to(path)
+                if rel_dir != Path("."):
+                    dirs.append(str(rel_dir))
+                for name in [*dirnames, *filenames]:
+                    item = current / name
+                    rel = str(rel_dir / name)
+                    if item.is_symlink():
+                        links[rel] = os.readlink(item)
+                    elif item.is_file():
+                        files[rel] = self._store_file(item, previous.get(rel))
+        else:
+            kind = "file"
+            files["."] = self._store_file(path, previous.get("."))
+
+        created = time.time()
+        entry: BackupEntry = {
+            "id": f"{datetime.fromtimestamp(created):%Y%m%d_%H%M%S}-{os.urandom(3).hex()}",
+            "source": str(source),
+            "kind": kind,
+            "created": created,
+            "files": files,
+            "links": links,
+            "dirs": dirs,
+        }
+        # One write on an O_APPEND fd, so concurrent backups never interleave lines
+        line = json.dumps(entry) + "\n"
+        fd = os.open(self.index_path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            size = os.fstat(fd).st_size
+            if size and os.pread(fd, 1, size - 1) != b"\n":
+                # Start a fresh line after one an interrupted write cut short
+                line = "\n" + line
+            os.write(fd, line.encode())
+        finally:
+            os.close(fd)
+        self._write_latest(entry)
+
+        if kind == "dir":
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+        return entry
+
+    def _write_latest(self, entry: BackupEntry) -> None:
+        self.latest_dir.mkdir(exist_ok=True)
+        path = self.latest_path(entry["source"])
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}")
+        tmp.write_text(json.dumps(entry))
+        os.replace(tmp, path)
+
+    def _store_file(self, path: Path, previous: Optional[BackupFile]) -> BackupFile:
+        st = path.stat()
+        if (
+            previous is not None
+            and previous["size"] == st.st_size
+            and previous["mtime_ns"] == st.st_mtime_ns
+            and self.object_path(previous["hash"]).exists()
+        ):
+            digest = previous["hash"]
+        else:
+            digest = hash_file(path)
+
+        obj = self.object_path(digest)
+        if not obj.exists():
+            obj.parent.mkdir(parents=True, exist_ok=True)
+            tmp = obj.with_name(f".{digest}.{os.getpid()}.{threading.get_ident()}")
+            tmp.unlink(missing_ok=True)
+            # A file with other links (e.g. generated memory) must not share its inode
+            clone_file(path, tmp, allow_hardlink=st.st_nlink == 1)
+            os.replace(tmp, obj)
+
+        return {
+            "hash": digest,
+            "mode": st.st_mode & 0o7777,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+        }
+
+    def restore(self, entry_id: str, dest: Optional[Path] = None) -> Path:
+        """Recreate a backed-up file or directory.
+
+        Args:
+            entry_id: The id of the index entry to restore.
+            dest: Where to restore to. Defaults to the original location.
+
+        Returns:
+            The restored path.
+
+        Raises:
+            KeyError: If no entry has the given id.
+        """
+        matches = [entry for entry in self.entries() if entry["id"] == entry_id]
+        if not matches:
+            raise KeyError(entry_id)
+        entry = matches[0]
+        dest = dest or Path(entry["source"])
+
+        if entry["kind"] == "dir":
+            dest.mkdir(parents=True, exist_ok=True)
+            for rel_dir in entry["dirs"]:
+                (dest / rel_dir).mkdir(parents=True, exist_ok=True)
+        for rel, file in entry["files"].items():
+            target = dest if rel == "." else dest / rel
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.unlink(missing_ok=True)
+            clone_file(self.object_path(file["hash"]), target, allow_hardlink=False)
+            os.chmod(target, file["mode"])
+            os.utime(target, ns=(file["mtime_ns"], file["mtime_ns"]))
+        for rel, link in entry["links"].items():
+            (dest / rel).symlink_to(link)
+        return dest
+
+    def prune(
+        self, keep: Optional[int] = None, max_age: Optional[float] = None, dry_run: bool = False
+    ) -> tuple[int, int]:
+        """Apply the retention policy and delete objects no backup refers to.
+
+        Args:
+            keep: Keep at most this many of the newest backups per source path.
+            max_age: Drop backups older than this many seconds.
+            dry_run: Only work out what would be removed.
+
+        Returns:
+            Number of backups dropped and number of bytes freed.
+        """
+        with self._locked():
+            return self._prune(keep, max_age, dry_run)
+
+    def _prune(
+        self, keep: Optional[int], max_age: Optional[float], dry_run: bool
+    ) -> tuple[int, int]:
+        entries = self.entries()
+        now = time.time()
+        kept: list[BackupEntry] = []
+        seen: dict[str, int] = {}
+        for entry in reversed(entries):
+            seen[entry["source"]] = seen.get(entry["source"], 0) + 1
+            if keep is not None and seen[entry["source"]] > keep:
+                continue
+            if max_age is not None and now - entry["created"] > max_age:
+                continue
+            kept.append(entry)
+        kept.reverse()
+
+        if len(kept) != len(entries) and not dry_run:
+            tmp = self.index_path.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                f.writelines(json.dumps(entry) + "\n" for entry in kept)
+            os.replace(tmp, self.index_path)
+            # Retention only ever drops the oldest backups of a path, so a
+            # latest pointer only goes stale once all of them are gone
+            remaining = {entry["source"] for entry in kept}
+            for source in {entry["source"] for entry in entries} - remaining:
+                self.latest_path(source).unlink(missing_ok=True)
+
+        referenced = {file["hash"] for entry in kept for file in entry["files"].values()}
+        freed = 0
+        if self.objects_dir.exists():
+            for obj in self.objects_dir.glob("*/*"):
+                if obj.name not in referenced and not obj.name.startswith("."):
+                    freed += obj.stat().st_size
+                    if not dry_run:
+                        obj.unlink()
+        return len(entries) - len(kept), freed
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the scripts/setup.py hot paths
+
+Generates synthetic skill and memory trees in a temp dir and times the
+functions setup runs for every tool, at several tree sizes. Results can be
+saved as a JSON baseline and later runs compared against it.
+
+Usage:
+    python -m scripts.bench                  # Run and compare against the baseline
+    python -m scripts.bench --sizes 10,1000  # Only run the given tree sizes
+    python -m scripts.bench --save           # Store this run as the new baseline
+    python -m scripts.bench --threshold 0.5  # Allow up to 50% slowdown
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import TypedDict
+
+from scripts.setup import (
+    Colors,
+    convert_md_to_toml,
+    find_skill_files,
+    generate_memory,
+    generate_skills,
+    get_repo_root,
+    parse_frontmatter,
+    print_colored,
+    symlink_skills_to_config,
+)
+
+DEFAULT_SIZES = [10, 1000, 10000]
+DEFAULT_REPEATS = 3
+DEFAULT_THRESHOLD = 0.25
+# Timings below this are too noisy to call a regression
+NOISE_FLOOR_SECONDS = 0.005
+
+
+class BenchTree(TypedDict):
+    skills_dir: Path
+    memory_dir: Path
+    contents: list[str]
+    skill_files: list[Path]
+
+
+class BenchResults(TypedDict):
+    machine: str
+    python: str
+    results: dict[str, dict[str, float]]
+
+
+Benchmark = Callable[[BenchTree, Path], Callable[[], object]]
+
+
+def get_baseline_path() -> Path:
+    return get_repo_root() / ".benchmarks" / "baseline.json"
+
+
+def make_tree(root: Path, size: int) -> BenchTree:
+    """Create a synthetic skills directory and memory directory.
+
+    Half of the skills are directory-based (skill-N/SKILL.md), the rest are flat
+    .md files, matching the two layouts find_skill_files() understands.
+
+    Args:
+        root: Empty directory to create the trees in.
+        size: Number of skills and number of memory files to create.
+
+    Returns:
+        Paths to the generated trees and the skill contents.
+    """
+    skills_dir = root / "skills"
+    memory_dir = root / "memory"
+    skills_dir.mkdir(parents=True)
+    memory_dir.mkdir(parents=True)
+
+    contents: list[str] = []
+    for i in range(size):
+        content = (
+            f"---\nname: skill-{i}\ndescription: Synthetic skill number {i}\n---\n\n"
+            f"# Skill {i}\n\n" + f"Step {i}: do the thing carefully.\n" * 20
+        )
+        if i % 2:
+            (skills_dir / f"skill-{i}.md").write_text(content)
+        else:
+            (skills_dir / f"skill-{i}").mkdir()
+            (skills_dir / f"skill-{i}" / "SKILL.md").write_text(content)
+        contents.append(content)
+        (memory_dir / f"memory-{i:05d}.md").write_text(f"# Rules {i}\n\n" + "- Be precise.\n" * 20)
+
+    return {
+        "skills_dir": skills_dir,
+        "memory_dir": memory_dir,
+        "contents": contents,
+        "skill_files": [path for _, path in find_skill_files(skills_dir)],
+    }
+
+
+def _bench_find_skill_files(tree: BenchTree, _work: Path) -> Callable[[], object]:
+    return lambda: find_skill_files(tree["skills_dir"])
+
+
+def _bench_parse_frontmatter(tree: BenchTree, _work: Path) -> Callable[[], object]:
+    return lambda: [parse_frontmatter(content) for content in tree["contents"]]
+
+
+def _bench_convert_md_to_toml(tree: BenchTree, _work: Path) -> Callable[[], object]:
+    return lambda: [convert_md_to_toml(path) for path in tree["skill_files"]]
+
+
+def _bench_generate_skills_cold(tree: BenchTree, work: Path) -> Callable[[], object]:
+    return lambda: generate_skills(tree["skills_dir"], work / "commands", "toml")
+
+
+def _bench_generate_skills_warm(tree: BenchTree, work: Path) -> Callable[[], object]:
+    generate_skills(tree["skills_dir"], work / "commands", "toml")
+    return lambda: generate_skills(tree["skills_dir"], work / "commands", "toml")
+
+
+def _bench_generate_memory_single_file(tree: BenchTree, work: Path) -> Callable[[], object]:
+    return lambda: generate_memory(tree["memory_dir"], work, "rules.md", "single_file")
+
+
+def _bench_generate_memory_directory(tree: BenchTree, work: Path) -> Callable[[], object]:
+    return lambda: generate_memory(tree["memory_dir"], work, "rules", "directory")
+
+
+def _bench_symlink_skills_cold(tree: BenchTree, work: Path) -> Callable[[], object]:
+    return lambda: symlink_skills_to_config([tree["skills_dir"]], work / "skills", "bench")
+
+
+def _bench_symlink_skills_warm(tree: BenchTree, work: Path) -> Callable[[], object]:
+    symlink_skills_to_config([tree["skills_dir"]], work / "skills", "bench")
+    return lambda: symlink_skills_to_config([tree["skills_dir"]], work / "skills", "bench")
+
+
+BENCHMARKS: dict[str, Benchmark] = {
+    "find_skill_files": _bench_find_skill_files,
+    "parse_frontmatter": _bench_parse_frontmatter,
+    "convert_md_to_toml": _bench_convert_md_to_toml,
+    "generate_skills[cold]": _bench_generate_skills_cold,
+    "generate_skills[warm]": _bench_generate_skills_warm,
+    "generate_memory[single_file]": _bench_generate_memory_single_file,
+    "generate_memory[directory]": _bench_generate_memory_directory,
+    "symlink_skills_to_config[cold]": _bench_symlink_skills_cold,
+    "symlink_skills_to_config[warm]": _bench_symlink_skills_warm,
+}
+
+
+def run_benchmarks(sizes: list[int], repeats: int = DEFAULT_REPEATS) -> BenchResults:
+    """Time every benchmark at every tree size.
+
+    Each repeat gets a fresh work dir, so "cold" benchmarks always start from
+    nothing. The best of the repeats is recorded, since it is the least noisy.
+
+    Args:
+        sizes: Tree sizes (number of skills and memory files) to run at.
+        repeats: How many times to run each benchmark.
+
+    Returns:
+        Best time in seconds for each size and benchmark, plus machine details.
+    """
+    results: dict[str, dict[str, float]] = {}
+    with tempfile.TemporaryDirectory(prefix="dotfiles-bench-") as tmp:
+        for size in sizes:
+            tree = make_tree(Path(tmp) / f"tree-{size}", size)
+            timings: dict[str, float] = {}
+            for name, bench in BENCHMARKS.items():
+                best = float("inf")
+                for repeat in range(repeats):
+                    work = Path(tmp) / f"work-{size}-{len(timings)}-{repeat}"
+                    work.mkdir()
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        run = bench(tree, work)
+                        start = time.perf_counter()
+                        run()
+                        best = min(best, time.perf_counter() - start)
+                timings[name] = best
+                print(f"  {size:>6}  {name:<32} {best * 1000:10.2f} ms")
+            results[str(size)] = timings
+
+    return {
+        "machine": f"{platform.system()}-{platform.machine()}",
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+
+def compare_results(
+    current: BenchResults, baseline: BenchResults, threshold: float = DEFAULT_THRESHOLD
+) -> list[str]:
+    """Find benchmarks that got slower than the baseline allows.
+
+    Args:
+        current: Results of this run.
+        baseline: Previously saved results.
+        threshold: Allowed slowdown as a fraction (0.25 means 25% slower).
+
+    Returns:
+        One message per regression; empty if there are none.
+    """
+    regressions: list[str] = []
+    for size, timings in current["results"].items():
+        for name, seconds in timings.items():
+            before = baseline["results"].get(size, {}).get(name)
+            if before is None or seconds < NOISE_FLOOR_SECONDS:
+                continue
+            if seconds > before * (1 + threshold):
+                regressions.append(
+                    f"{name} at {size}: {before * 1000:.2f} ms -> {seconds * 1000:.2f} ms "
+                    f"(+{(seconds / before - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the AI tools setup script")
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(size) for size in DEFAULT_SIZES),
+        help="Comma-separated tree sizes (default: %(default)s)",
+    )
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="Runs per benchmark")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Allowed slowdown before failing, as a fraction (default: %(default)s)",
+    )
+    parser.add_argument("--baseline", type=Path, default=None, help="Baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="Save this run as the baseline")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    baseline_path: Path = args.baseline or get_baseline_path()
+
+    print_colored(f"Benchmarking sizes {', '.join(map(str, sizes))}", Colors.BOLD)
+    current = run_benchmarks(sizes, repeats=args.repeats)
+
+    if args.save:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(current, indent=2) + "\n")
+        print_colored(f"\nSaved baseline to {baseline_path}", Colors.GREEN)
+        return
+
+    if not baseline_path.exists():
+        print_colored(
+            f"\nNo baseline at {baseline_path}, run with --save to create one", Colors.YELLOW
+        )
+        return
+
+    with open(baseline_path) as f:
+        baseline: BenchResults = json.load(f)
+    if baseline["machine"] != current["machine"]:
+        print_colored(
+            f"\nWarning: baseline was recorded on {baseline['machine']}, not {current['machine']}",
+            Colors.YELLOW,
+        )
+
+    regressions = compare_results(current, baseline, args.threshold)
+    if regressions:
+        print_colored(f"\n{len(regressions)} regression(s) past {args.threshold:.0%}:", Colors.RED)
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print_colored(f"\nNo regressions past {args.threshold:.0%}", Colors.GREEN)
+
+
+if __name__ == "__main__":
+    main()
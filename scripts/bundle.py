@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Pre-rendered environment bundles, for provisioning containers without setup
+
+A bundle is a tar archive (zstd-compressed when the zstd binary is there,
+gzip otherwise) of everything setup installed into a home: the symlinks into
+the repo, the generated skill commands and memory, the ~/.zshrc loader with
+setup's aliases and the component configs. Paths are stored relative to the
+home, and symlink targets and file content that refer to the repo or the home
+use placeholders, so a bundle made on one machine unpacks into any home
+against any checkout of the repo. bundle.json, the first member, lists the
+install manifest records and git config values to apply.
+
+Usage:
+    python -m scripts.bundle create dotfiles.tar.zst    # Bundle what setup installed in $HOME
+    python -m scripts.bundle extract dotfiles.tar.zst   # Unpack it into $HOME in one pass
+    python -m scripts.bundle extract dotfiles.tar.zst --home /srv/rootfs/root
+"""
+
+import argparse
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Optional, TypedDict
+
+from scripts.backups import BackupStore
+from scripts.fsutil import get_state_dir, hash_file
+from scripts.setup import (
+    SHELL_ALIASES,
+    SKILLS_MANIFEST,
+    Colors,
+    InstallManifest,
+    ManifestRecord,
+    get_repo_root,
+    print_colored,
+)
+
+BUNDLE_VERSION = 1
+BUNDLE_MANIFEST = "bundle.json"
+REPO_PLACEHOLDER = "__REPO_DIR__"
+HOME_PLACEHOLDER = "__HOME__"
+ZSHRC_LOADER = Path("shell") / ".zshrc.loader"
+
+
+class BundleManifest(TypedDict):
+    version: int
+    created: float
+    # Install manifest records, with placeholders in path and expected
+    records: list[ManifestRecord]
+    # Members whose content has placeholders to fill in on extraction
+    templates: list[str]
+
+
+class BundleError(Exception):
+    pass
+
+
+def home_state_dir(home: Path) -> Path:
+    """State dir setup uses for a home (see _home_env in tasks.py for other homes)."""
+    if home == Path.home():
+        return get_state_dir()
+    return home / ".local" / "state" / "dotfiles"
+
+
+def relocate(value: str, home: Path, repo_dir: Path) -> str:
+    """Replace a leading repo or home path with its placeholder."""
+    # The repo is usually inside the home, so it has to be tried first
+    for root, placeholder in ((repo_dir, REPO_PLACEHOLDER), (home, HOME_PLACEHOLDER)):
+        if value == str(root) or value.startswith(f"{root}/"):
+            return placeholder + value[len(str(root)) :]
+    return value
+
+
+def resolve(value: str, home: Path, repo_dir: Path) -> str:
+    """Replace a leading placeholder with the repo or home path."""
+    for placeholder, root in ((REPO_PLACEHOLDER, repo_dir), (HOME_PLACEHOLDER, home)):
+        if value.startswith(placeholder):
+            return str(root) + value[len(placeholder) :]
+    return value
+
+
+def _fill(text: str, home: Path, repo_dir: Path) -> str:
+    return text.replace(REPO_PLACEHOLDER, str(repo_dir)).replace(HOME_PLACEHOLDER, str(home))
+
+
+@contextmanager
+def _open_archive(path: Path, mode: str) -> Iterator[tarfile.TarFile]:
+    """Open a bundle as a tar stream, through the zstd binary for .zst files.
+
+    Args:
+        path: Archive path; a .zst or .zstd suffix means zstd, anything else
+            is written with gzip and read with whatever tarfile detects.
+        mode: "r" or "w".
+
+    Raises:
+        BundleError: If the archive needs zstd and it is not installed.
+    """
+    if path.suffix not in (".zst", ".zstd"):
+        with tarfile.open(str(path), "r|*" if mode == "r" else "w|gz") as tar:
+            yield tar
+        return
+
+    if shutil.which("zstd") is None:
+        raise BundleError(f"{path.name} is zstd-compressed, but zstd is not installed")
+    if mode == "r":
+        command = ["zstd", "-q", "-dc", str(path)]
+    else:
+        command = ["zstd", "-q", "-T0", "-f", "-o", str(path)]
+    proc = subprocess.Popen(
+        command,
+        stdin=subprocess.PIPE if mode == "w" else None,
+        stdout=subprocess.PIPE if mode == "r" else None,
+    )
+    pipe = proc.stdout if mode == "r" else proc.stdin
+    assert pipe is not None
+    try:
+        with tarfile.open(fileobj=pipe, mode="r|" if mode == "r" else "w|") as tar:
+            yield tar
+    finally:
+        pipe.close()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise BundleError(f"zstd failed on {path}")
+
+
+def _add_bytes(tar: tarfile.TarFile, name: str, data: bytes, like: Optional[Path] = None) -> None:
+    info = tar.gettarinfo(str(like), arcname=name) if like else tarfile.TarInfo(name)
+    info.size = len(data)
+    if like is None:
+        info.mtime = int(time.time())
+        info.mode = 0o644
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _render_zshrc(zshrc: Path, repo_dir: Path) -> bytes:
+    """Render ~/.zshrc as setup would write it: the loader plus setup's aliases.
+
+    Lines other tools appended to the home's ~/.zshrc are left out, since those
+    tools are not part of the bundle.
+    """
+    content = zshrc.read_text()
+    text = (repo_dir / ZSHRC_LOADER).read_text()
+    for alias_config in SHELL_ALIASES.values():
+        if alias_config["alias"] in content:
+            text += f"\n{alias_config['comment']}\n{alias_config['alias']}\n"
+    return text.encode()
+
+
+def create_bundle(
+    records: list[ManifestRecord], output: Path, home: Path, repo_dir: Optional[Path] = None
+) -> BundleManifest:
+    """Write everything the install manifest records for a home into a bundle.
+
+    Symlinks are stored with relocated targets and files and generated trees
+    with their content. ~/.zshrc is rendered from shell/.zshrc.loader rather
+    than copied, since tools append machine-specific lines to it. Skill
+    generation manifests are stored as templates so generated commands still
+    count as current against another checkout of the repo.
+
+    Args:
+        records: Install manifest records of the home.
+        output: Archive to write (see _open_archive for compression).
+        home: The home the records belong to.
+        repo_dir: Checkout the home was set up from; this repo by default.
+
+    Returns:
+        The bundle's manifest.
+
+    Raises:
+        BundleError: If a recorded path is outside the home.
+    """
+    repo_dir = repo_dir or get_repo_root()
+    manifest: BundleManifest = {
+        "version": BUNDLE_VERSION,
+        "created": time.time(),
+        "records": [],
+        "templates": [],
+    }
+    members: list[tuple[str, Path, str]] = []
+    for record in records:
+        relocated: ManifestRecord = {
+            **record,
+            "path": relocate(record["path"], home, repo_dir),
+            "expected": relocate(record["expected"], home, repo_dir),
+        }
+        manifest["records"].append(relocated)
+        if record["kind"] == "gitconfig":
+            continue
+        path = Path(record["path"])
+        if not path.is_relative_to(home):
+            raise BundleError(f"{path} is outside {home}")
+        if path.is_symlink() or path.exists():
+            members.append((str(path.relative_to(home)), path, record["kind"]))
+
+    rendered: list[tuple[str, Path, bytes]] = []
+    for name, path, kind in members:
+        if name == ".zshrc" and kind == "file":
+            rendered.append((name, path, _render_zshrc(path, repo_dir)))
+        elif kind == "file" and path.name == SKILLS_MANIFEST:
+            text = path.read_text().replace(str(repo_dir), REPO_PLACEHOLDER)
+            rendered.append((name, path, text.encode()))
+        elif kind == "tree" and path.is_dir() and not path.is_symlink():
+            for skills_manifest in path.rglob(SKILLS_MANIFEST):
+                text = skills_manifest.read_text().replace(str(repo_dir), REPO_PLACEHOLDER)
+                rel = str(skills_manifest.relative_to(home))
+                rendered.append((rel, skills_manifest, text.encode()))
+    templates = {name for name, _, _ in rendered}
+    manifest["templates"] = sorted(templates)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with _open_archive(output, "w") as tar:
+        _add_bytes(tar, BUNDLE_MANIFEST, json.dumps(manifest, indent=2).encode())
+        for name, path, data in rendered:
+            _add_bytes(tar, name, data, like=path)
+        for name, path, kind in members:
+            if name in templates:
+                continue
+            if path.is_symlink():
+                info = tar.gettarinfo(str(path), arcname=name)
+                info.linkname = relocate(os.readlink(path), home, repo_dir)
+                tar.addfile(info)
+            else:
+                tar.add(
+                    str(path),
+                    arcname=name,
+                    recursive=kind == "tree",
+                    filter=lambda info: None if info.name in templates else info,
+                )
+
+    return manifest
+
+
+def _member_path(home: Path, name: str) -> Path:
+    rel = Path(name)
+    if rel.is_absolute() or ".." in rel.parts:
+        raise BundleError(f"Refusing to extract {name} outside the home")
+    return home / rel
+
+
+def _clear(path: Path, store: BackupStore) -> None:
+    # Make way for an extracted member, backing up anything setup did not put there
+    if path.is_symlink():
+        path.unlink()
+    elif path.exists():
+        store.backup(path)
+
+
+def _write_file(path: Path, data: IO[bytes], mode: int, mtime: float) -> None:
+    tmp = path.with_name(f".{path.name}.unbundle")
+    with open(tmp, "wb") as f:
+        shutil.copyfileobj(data, f)
+    tmp.chmod(mode)
+    os.utime(tmp, (mtime, mtime))
+    os.replace(tmp, path)
+
+
+def extract_bundle(archive: Path, home: Path, repo_dir: Optional[Path] = None) -> BundleManifest:
+    """Unpack a bundle into a home in one streaming pass over the archive.
+
+    Symlinks are created pointing into repo_dir, templates are filled in, and
+    everything else is written as stored. Anything in the way is backed up
+    (symlinks are just replaced). The bundle's records are then appended to
+    the home's install manifest, so inv reset and inv doctor know about them,
+    and its git config values are added to the home's global git config.
+
+    Args:
+        archive: Bundle written by create_bundle().
+        home: Home to unpack into.
+        repo_dir: Checkout the symlinks should point into; this repo by default.
+
+    Returns:
+        The bundle's manifest.
+
+    Raises:
+        BundleError: If the archive is not a bundle or has unsafe members.
+    """
+    repo_dir = repo_dir or get_repo_root()
+    state_dir = home_state_dir(home)
+    store = BackupStore(state_dir / "backups")
+    manifest: Optional[BundleManifest] = None
+    templates: set[str] = set()
+
+    with _open_archive(archive, "r") as tar:
+        for member in tar:
+            if manifest is None:
+                data = tar.extractfile(member) if member.name == BUNDLE_MANIFEST else None
+                if data is None:
+                    raise BundleError(f"{archive} is not a bundle (no {BUNDLE_MANIFEST} first)")
+                manifest = json.load(data)
+                if manifest["version"] != BUNDLE_VERSION:
+                    raise BundleError(f"Unsupported bundle version {manifest['version']}")
+                templates = set(manifest["templates"])
+                continue
+
+            path = _member_path(home, member.name)
+            if member.isdir():
+                if path.is_symlink() or (path.exists() and not path.is_dir()):
+                    _clear(path, store)
+                path.mkdir(parents=True, exist_ok=True)
+                path.chmod(member.mode)
+                continue
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if member.issym():
+                _clear(path, store)
+                path.symlink_to(resolve(member.linkname, home, repo_dir))
+            elif member.isfile():
+                data = tar.extractfile(member)
+                assert data is not None
+                _clear(path, store)
+                if member.name in templates:
+                    data = io.BytesIO(_fill(data.read().decode(), home, repo_dir).encode())
+                _write_file(path, data, member.mode, member.mtime)
+
+    if manifest is None:
+        raise BundleError(f"{archive} is empty")
+
+    records: list[ManifestRecord] = [
+        {
+            **record,
+            "path": resolve(record["path"], home, repo_dir),
+            "expected": resolve(record["expected"], home, repo_dir),
+        }
+        for record in manifest["records"]
+    ]
+    for record in records:
+        # Filled-in templates differ from what was bundled, so hash them again
+        path = Path(record["path"])
+        if (
+            record["kind"] == "file"
+            and record["expected"]
+            and path.is_relative_to(home)
+            and str(path.relative_to(home)) in templates
+        ):
+            record["expected"] = hash_file(path)
+    InstallManifest(state_dir / "manifest.tsv").record(records)
+
+    git_env = {**os.environ, "HOME": str(home)}
+    for record in records:
+        if record["kind"] != "gitconfig" or not record["expected"]:
+            continue
+        key, value = record["path"], record["expected"]
+        current = subprocess.run(
+            ["git", "config", "--global", "--get-all", key],
+            capture_output=True,
+            text=True,
+            env=git_env,
+        )
+        if value not in current.stdout.splitlines():
+            subprocess.run(
+                ["git", "config", "--global", "--add", key, value], check=True, env=git_env
+            )
+
+    return manifest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bundle or unpack a pre-rendered environment")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create_parser = commands.add_parser("create", help="Bundle what setup installed")
+    create_parser.add_argument("output", type=Path, help="Archive to write (.tar.zst or .tar.gz)")
+    extract_parser = commands.add_parser("extract", help="Unpack a bundle")
+    extract_parser.add_argument("archive", type=Path, help="Bundle to unpack")
+    for sub in (create_parser, extract_parser):
+        sub.add_argument("--home", type=Path, default=Path.home(), help="Home directory")
+        sub.add_argument("--repo-dir", type=Path, default=None, help="Repo checkout")
+    args = parser.parse_args()
+
+    home: Path = args.home.absolute()
+    try:
+        if args.command == "create":
+            records = InstallManifest(home_state_dir(home) / "manifest.tsv").records()
+            if not records:
+                raise BundleError(f"Nothing installed in {home} yet, run setup first")
+            manifest = create_bundle(records, args.output, home, args.repo_dir)
+            print_colored(
+                f"Bundled {len(manifest['records'])} records into {args.output}", Colors.GREEN
+            )
+        else:
+            manifest = extract_bundle(args.archive, home, args.repo_dir)
+            print_colored(f"Unpacked {len(manifest['records'])} records into {home}", Colors.GREEN)
+    except (BundleError, OSError) as e:
+        print_colored(f"Error: {e}", Colors.RED)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
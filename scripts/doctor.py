@@ -0,0 +1,233 @@
+"""
+Health and drift checks for everything setup manages
+
+inv doctor compares $HOME against what setup left there: every install
+manifest record, each AI tool's links and generated skill and memory output,
+the global git config keys and the installed binaries. Checks only read, and
+run concurrently with a timeout each, so a full check is cheap enough for a
+login hook or a cron job.
+"""
+
+import os
+import shutil
+import subprocess
+import time
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Optional, TypedDict
+
+from scripts.fsutil import hash_file
+from scripts.setup import (
+    ManifestRecord,
+    SkillCatalog,
+    ToolConfig,
+    memory_is_current,
+    outdated_skills,
+    plan_tool_links,
+)
+
+DOCTOR_JOBS = 16
+DOCTOR_TIMEOUT_SECONDS = 2.0
+# How often pending checks are looked at for having run out of time
+DOCTOR_POLL_SECONDS = 0.05
+
+
+class DoctorCheck(TypedDict):
+    # manifest, gitconfig, links, skills, memory or binary
+    check: str
+    subject: str
+    # ok, drift, or timeout (the check did not finish in time)
+    status: str
+    detail: str
+
+
+Probe = Callable[[], list[DoctorCheck]]
+
+
+def _result(check: str, subject: str, detail: str = "") -> DoctorCheck:
+    return {
+        "check": check,
+        "subject": subject,
+        "status": "drift" if detail else "ok",
+        "detail": detail,
+    }
+
+
+def check_record(record: ManifestRecord) -> list[DoctorCheck]:
+    """Check that an installed path is still what setup left there.
+
+    Args:
+        record: Install manifest record of any kind but gitconfig.
+    """
+    path = Path(record["path"])
+    kind = record["kind"]
+    detail = ""
+    if path.is_symlink():
+        target = os.readlink(path)
+        if kind != "symlink":
+            detail = f"replaced by a symlink to {target}"
+        elif target != record["expected"]:
+            detail = f"points to {target}, expected {record['expected']}"
+    elif not path.exists():
+        detail = "missing"
+    elif kind == "symlink":
+        detail = "no longer a symlink"
+    elif kind == "file":
+        if not path.is_file():
+            detail = "no longer a file"
+        elif record["expected"] and hash_file(path) != record["expected"]:
+            detail = "content changed"
+    elif not path.is_dir():
+        detail = "no longer a directory"
+    return [_result("manifest", str(path), detail)]
+
+
+def check_git_key(key: str, expected: list[str], timeout: float) -> list[DoctorCheck]:
+    """Check that a global git config key holds the values setup set.
+
+    Args:
+        key: Git config key (e.g., include.path).
+        expected: Values the key must hold; an empty string only requires a value.
+        timeout: Seconds to wait for git.
+    """
+    result = subprocess.run(
+        ["git", "config", "--global", "--get-all", key],
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+    )
+    values = result.stdout.splitlines() if result.returncode == 0 else []
+    missing = [value for value in expected if value and value not in values]
+    if not values:
+        detail = "not set"
+    elif missing:
+        detail = f"missing {', '.join(missing)} (set to {', '.join(values)})"
+    else:
+        detail = ""
+    return [_result("gitconfig", key, detail)]
+
+
+def check_tool(
+    tool_id: str, tool_config: ToolConfig, ai_root: Path, catalog: SkillCatalog
+) -> list[DoctorCheck]:
+    """Check an AI tool's links and generated skill and memory output.
+
+    Args:
+        tool_id: The tool's key in tools.json.
+        tool_config: The tool's entry from tools.json.
+        ai_root: Root of the repo's ai/ directory.
+        catalog: Skill index shared by every tool.
+    """
+    config_dir = Path(os.path.expanduser(tool_config["config_dir"]))
+    changes = [
+        f"{action['action']} {action['target']}"
+        for action in plan_tool_links(tool_config, ai_root, catalog)
+        if action["action"] != "skip"
+    ]
+    results = [_result("links", tool_id, "; ".join(changes))]
+
+    if "skills_generate" in tool_config:
+        gen_cfg = tool_config["skills_generate"]
+        target = config_dir / gen_cfg["target"]
+        fmt = gen_cfg.get("format", "md")
+        outdated = outdated_skills(ai_root / gen_cfg["source"], target, fmt, catalog)
+        detail = f"out of date: {', '.join(outdated)}" if outdated else ""
+        results.append(_result("skills", str(target), detail))
+
+    if "memory_generate" in tool_config:
+        mem_cfg = tool_config["memory_generate"]
+        source_dir = ai_root / mem_cfg["source"]
+        current = memory_is_current(source_dir, config_dir, mem_cfg["target"], mem_cfg["mode"])
+        target = config_dir / mem_cfg["target"]
+        results.append(_result("memory", str(target), "" if current else "out of date"))
+
+    return results
+
+
+def check_binary(name: str, timeout: float, version: bool = True) -> list[DoctorCheck]:
+    """Check that a binary is on PATH, and report its version.
+
+    Args:
+        name: Binary name.
+        timeout: Seconds to wait for the version command.
+        version: Run "<name> --version"; only look the binary up if False.
+    """
+    resolved = shutil.which(name)
+    if resolved is None:
+        return [_result("binary", name, "not installed")]
+    if not version:
+        return [{"check": "binary", "subject": name, "status": "ok", "detail": resolved}]
+
+    result = subprocess.run(
+        [resolved, "--version"], capture_output=True, text=True, timeout=timeout
+    )
+    if result.returncode != 0:
+        return [_result("binary", name, f"{resolved} --version exited {result.returncode}")]
+    lines = (result.stdout or result.stderr).strip().splitlines()
+    detail = lines[0] if lines else resolved
+    return [{"check": "binary", "subject": name, "status": "ok", "detail": detail}]
+
+
+def run_probes(
+    probes: dict[str, Probe],
+    timeout: float = DOCTOR_TIMEOUT_SECONDS,
+    jobs: int = DOCTOR_JOBS,
+) -> list[DoctorCheck]:
+    """Run probes concurrently, each with its own time limit.
+
+    A probe's time limit starts when a worker picks it up, not when it is
+    queued. A probe that runs out of time, or raises, is reported as a
+    timeout or drift for its name instead of holding up the others.
+
+    Args:
+        probes: Probes by name, used as the subject if a probe does not finish.
+        timeout: Seconds each probe may run.
+        jobs: Maximum number of probes to run at once.
+
+    Returns:
+        Every probe's results, in the order the probes were given.
+    """
+    started: dict[str, float] = {}
+
+    def run(name: str) -> list[DoctorCheck]:
+        started[name] = time.monotonic()
+        return probes[name]()
+
+    results: dict[str, list[DoctorCheck]] = {}
+    pool = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        futures: dict[Future[list[DoctorCheck]], str] = {
+            pool.submit(run, name): name for name in probes
+        }
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=DOCTOR_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures[future]
+                error: Optional[BaseException] = future.exception()
+                if isinstance(error, subprocess.TimeoutExpired):
+                    results[name] = [_timed_out(name, timeout)]
+                elif error is not None:
+                    results[name] = [_result("probe", name, f"failed: {error}")]
+                else:
+                    results[name] = future.result()
+            now = time.monotonic()
+            for future in list(pending):
+                name = futures[future]
+                if name in started and now - started[name] > timeout:
+                    results[name] = [_timed_out(name, timeout)]
+                    pending.discard(future)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return [check for name in probes for check in results[name]]
+
+
+def _timed_out(name: str, timeout: float) -> DoctorCheck:
+    return {
+        "check": "probe",
+        "subject": name,
+        "status": "timeout",
+        "detail": f"no answer within {timeout:g}s",
+    }
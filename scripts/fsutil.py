@@ -0,0 +1,75 @@
+"""
+Filesystem helpers shared by setup and the stores it keeps
+
+Where state and caches live, how files are hashed, and how a file is
+duplicated as cheaply as the filesystem allows. Kept free of imports from the
+rest of the package so scripts/setup.py and the stores can both build on it.
+"""
+
+import fcntl
+import hashlib
+import os
+import shutil
+from pathlib import Path
+
+# Linux FICLONE ioctl: share the source's extents (reflink) on btrfs/xfs
+FICLONE = 0x40049409
+
+
+def get_cache_dir() -> Path:
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "dotfiles"
+
+
+def get_state_dir() -> Path:
+    return Path(os.environ.get("XDG_STATE_HOME") or Path.home() / ".local" / "state") / "dotfiles"
+
+
+def hash_file(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def clone_file(source: Path, target: Path, allow_hardlink: bool = True) -> str:
+    """Create target with source's content as cheaply as the filesystem allows.
+
+    Tries, in order: a hardlink, a reflink (FICLONE), an in-kernel
+    copy_file_range(), and finally a regular shutil.copy2().
+
+    Args:
+        source: File to duplicate.
+        target: Path to create; must not already exist.
+        allow_hardlink: Whether target may share source's inode. Disable this when
+            either file could later be modified in place.
+
+    Returns:
+        The method used: "hardlink", "reflink", "copy_file_range" or "copy".
+    """
+    if allow_hardlink:
+        try:
+            os.link(source, target)
+            return "hardlink"
+        except OSError:
+            pass
+
+    try:
+        with open(source, "rb") as src, open(target, "xb") as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                method = "reflink"
+            except OSError:
+                if not hasattr(os, "copy_file_range"):
+                    raise
+                remaining = os.fstat(src.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+                method = "copy_file_range"
+        shutil.copystat(source, target)
+        return method
+    except OSError:
+        target.unlink(missing_ok=True)
+
+    shutil.copy2(source, target)
+    return "copy"
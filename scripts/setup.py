@@ -10,16 +10,38 @@ Usage:
     python setup.py claude       # Setup only Claude Code
     python setup.py gemini       # Setup only Gemini CLI
     python setup.py --list       # List available tools
+    python setup.py --force      # Regenerate all skill commands
+    python setup.py --jobs 4     # Setup up to 4 tools concurrently
+    python setup.py --dry-run    # Show what would change without touching anything
+    python setup.py --watch      # Keep regenerating outputs as skills/memory change
 """
 
 import argparse
+import ctypes
+import ctypes.util
+import hashlib
+import io
 import json
+import locale
 import os
+import select
 import shutil
+import struct
 import sys
-from datetime import datetime
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import TypedDict
+from typing import Optional, TextIO, TypedDict, cast
+
+if not __package__:
+    # Run as python scripts/setup.py: make the scripts package importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.backups import BACKUP_KEEP, BackupStore
+from scripts.fsutil import clone_file, get_cache_dir, get_state_dir, hash_file
 
 
 class Symlink(TypedDict):
@@ -65,6 +87,63 @@ class ToolsConfig(TypedDict):
     tools: dict[str, ToolConfig]
 
 
+class LinkAction(TypedDict):
+    action: str
+    source: Optional[Path]
+    target: Path
+    label: str
+
+
+class SkillEntry(TypedDict):
+    name: str
+    path: str
+    flat: bool
+    frontmatter: dict[str, str]
+    hash: str
+    mtime_ns: int
+    size: int
+
+
+class SkillDocument(TypedDict):
+    name: str
+    hash: str
+    content: str
+    frontmatter: dict[str, str]
+    body: str
+
+
+class SkillWriter(TypedDict):
+    suffix: str
+    render: Callable[[SkillDocument], str]
+
+
+class CatalogDir(TypedDict):
+    mtime_ns: int
+    subdirs: dict[str, int]
+    skills: list[SkillEntry]
+
+
+class SkillManifestEntry(TypedDict):
+    source: str
+    source_hash: str
+    output: str
+    output_hash: str
+    output_mtime_ns: int
+
+
+class SkillsManifest(TypedDict):
+    converter_version: int
+    format: str
+    skills: dict[str, SkillManifestEntry]
+
+
+class ManifestRecord(TypedDict):
+    kind: str
+    path: str
+    expected: str
+    component: str
+
+
 class Colors:
     GREEN = "\033[0;32m"
     YELLOW = "\033[1;33m"
@@ -89,6 +168,37 @@ def get_ai_root(repo_root: Path) -> Path:
     return repo_root / AI_DIR
 
 
+def repo_commit(repo_root: Path) -> str:
+    """Read the checked-out commit straight from .git, without running git.
+
+    Args:
+        repo_root: The checkout to look at. A .git file (worktree) is followed.
+
+    Returns:
+        The commit hash, or an empty string if it cannot be determined.
+    """
+    git_dir = repo_root / ".git"
+    try:
+        if git_dir.is_file():
+            git_dir = repo_root / git_dir.read_text().strip().removeprefix("gitdir: ")
+        head = (git_dir / "HEAD").read_text().strip()
+        if not head.startswith("ref: "):
+            return head
+        ref = head.removeprefix("ref: ")
+        # Branches of a linked worktree live in the main repository's git dir
+        common_dir = git_dir
+        if (git_dir / "commondir").is_file():
+            common_dir = git_dir / (git_dir / "commondir").read_text().strip()
+        if (common_dir / ref).is_file():
+            return (common_dir / ref).read_text().strip()
+        for line in (common_dir / "packed-refs").read_text().splitlines():
+            if line.endswith(f" {ref}"):
+                return line.split()[0]
+    except OSError:
+        pass
+    return ""
+
+
 def load_tools_config(ai_root: Path) -> ToolsConfig:
     config_path = ai_root / "tools.json"
     if not config_path.exists():
@@ -138,30 +248,286 @@ def setup_shell_alias(tool_id: str) -> bool:
     return True
 
 
-def backup_if_exists(path: Path) -> None:
+# symlink: expected is the link target. file: expected is the sha256 we wrote,
+# or "" for files shared with other tools (always backed up on teardown).
+# dir: a directory holding other records, removed once empty. tree: a generated
+# directory as older manifests recorded it; with no record of what in it setup
+# wrote, teardown moves it to the backup store. gitconfig: path is the key,
+# expected the value.
+MANIFEST_KINDS = ("symlink", "file", "dir", "tree", "gitconfig")
+
+
+class InstallManifest:
+    """Log of everything setup installs into $HOME, for inv reset to tear down.
+
+    manifest.tsv in the state dir holds one tab-separated record per line (kind,
+    path, expected, component), appended by scripts/setup.py and by the
+    component scripts (record_artifact in lib/platform.sh). Records are only
+    ever appended, each with a single O_APPEND write, so concurrent writers do
+    not interleave; a later record for the same path supersedes earlier ones.
+
+    Args:
+        path: Manifest file; defaults to $XDG_STATE_HOME/dotfiles/manifest.tsv.
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = path or get_state_dir() / "manifest.tsv"
+
+    @staticmethod
+    def _key(record: ManifestRecord) -> tuple[str, str, str]:
+        # A git key can hold several values, so only those include the value
+        expected = record["expected"] if record["kind"] == "gitconfig" else ""
+        return record["kind"], record["path"], expected
+
+    def record(self, records: list[ManifestRecord]) -> None:
+        if not records:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            for record in records:
+                fields = [record["kind"], record["path"], record["expected"], record["component"]]
+                os.write(fd, ("\t".join(fields) + "\n").encode())
+        finally:
+            os.close(fd)
+
+    def records(self) -> list[ManifestRecord]:
+        """Current records, one per path (per key and value for git config).
+
+        Returns:
+            Records in the order their paths were first installed.
+        """
+        if not self.path.exists():
+            return []
+        latest: dict[tuple[str, str, str], ManifestRecord] = {}
+        with open(self.path) as f:
+            for line in f:
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) != 4 or fields[0] not in MANIFEST_KINDS:
+                    continue
+                record: ManifestRecord = {
+                    "kind": fields[0],
+                    "path": fields[1],
+                    "expected": fields[2],
+                    "component": fields[3],
+                }
+                latest[self._key(record)] = record
+        return list(latest.values())
+
+    def rewrite(self, records: list[ManifestRecord]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.unlink(missing_ok=True)
+        InstallManifest(tmp).record(records)
+        tmp.touch()
+        os.replace(tmp, self.path)
+
+    def compact(self) -> None:
+        """Drop superseded records so the manifest does not grow with every run."""
+        self.rewrite(self.records())
+
+
+def _generated_records(
+    output_dir: Path, outputs: dict[str, str], manifest_name: str, component: str
+) -> list[ManifestRecord]:
+    # Each generated output is a file with the hash setup wrote, so teardown
+    # backs up any a user has since edited, and never touches their own files
+    records: list[ManifestRecord] = [
+        {"kind": "file", "path": str(output_dir / name), "expected": digest, "component": component}
+        for name, digest in sorted(outputs.items())
+        if (output_dir / name).is_file()
+    ]
+    manifest_path = output_dir / manifest_name
+    if manifest_path.is_file():
+        records.append(
+            {
+                "kind": "file",
+                "path": str(manifest_path),
+                "expected": hash_file(manifest_path),
+                "component": component,
+            }
+        )
+    return records
+
+
+def tool_manifest_records(
+    tool_id: str, tool_config: ToolConfig, actions: list[LinkAction], config_dir: Path
+) -> list[ManifestRecord]:
+    """Describe what setup_tool() installed for a tool.
+
+    Args:
+        tool_id: The tool's key in tools.json; records belong to "ai:<tool_id>".
+        tool_config: The tool's entry from tools.json.
+        actions: The link plan that was applied.
+        config_dir: The tool's expanded config directory.
+
+    Returns:
+        Records for every link, directory and generated output of the tool.
+    """
+    component = f"ai:{tool_id}"
+    records: list[ManifestRecord] = []
+    for action in actions:
+        if action["action"] in ("missing", "prune"):
+            continue
+        source = action["source"]
+        records.append(
+            {
+                "kind": "dir" if source is None else "symlink",
+                "path": str(action["target"]),
+                "expected": "" if source is None else str(source),
+                "component": component,
+            }
+        )
+
+    if "skills_generate" in tool_config:
+        target = config_dir / tool_config["skills_generate"]["target"]
+        skills_manifest = load_skills_manifest(target)
+        if skills_manifest is not None:
+            outputs = {
+                entry["output"]: entry["output_hash"]
+                for entry in skills_manifest["skills"].values()
+            }
+            if skills_manifest["format"] == "json" and (target / SKILLS_INDEX).is_file():
+                outputs[SKILLS_INDEX] = hash_file(target / SKILLS_INDEX)
+            records.append(
+                {"kind": "dir", "path": str(target), "expected": "", "component": component}
+            )
+            records += _generated_records(target, outputs, SKILLS_MANIFEST, component)
+
+    if "memory_generate" in tool_config:
+        mem_cfg = tool_config["memory_generate"]
+        target = config_dir / mem_cfg["target"]
+        if mem_cfg["mode"] == "single_file" and target.is_file():
+            records += _generated_records(
+                target.parent, {target.name: hash_file(target)}, MEMORY_MANIFEST, component
+            )
+        elif target.is_dir():
+            records.append(
+                {"kind": "dir", "path": str(target), "expected": "", "component": component}
+            )
+            records += _generated_records(
+                target, load_memory_manifest(target), MEMORY_MANIFEST, component
+            )
+
+    return records
+
+
+def backup_if_exists(path: Path, store: Optional[BackupStore] = None) -> None:
     if path.exists() and not path.is_symlink():
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_path = path.with_suffix(f"{path.suffix}.backup.{timestamp}")
-        print_colored(f"  Backing up existing {path.name} to {backup_path.name}", Colors.YELLOW)
-        path.rename(backup_path)
+        entry = (store or BackupStore()).backup(path)
+        print_colored(
+            f"  Backing up existing {path.name} to backup store ({entry['id']})", Colors.YELLOW
+        )
     elif path.is_symlink():
         print_colored(f"  Removing existing symlink: {path}", Colors.YELLOW)
         path.unlink()
 
 
-def create_symlink(source: Path, target: Path, name: str) -> bool:
-    if not source.exists():
-        print_colored(f"  Warning: Source {name} not found at {source}", Colors.RED)
+def plan_symlink(
+    source: Optional[Path], target: Path, label: str, source_exists: Optional[bool] = None
+) -> LinkAction:
+    """Work out what it takes to make target a symlink to source (or a plain directory).
+
+    Only lstat/readlink calls are made; nothing on disk is changed.
+
+    Args:
+        source: What target should point at, or None if target should be a real directory.
+        target: The managed path in the tool's config directory.
+        label: Name used when reporting the action.
+        source_exists: Override the existence check for sources that are created
+            later in the run (e.g., settings copied from a template).
+
+    Returns:
+        The action needed: "create", "replace", "skip", or "missing" if source is absent.
+    """
+    if source is not None:
+        if source_exists is None:
+            source_exists = source.exists()
+        if not source_exists:
+            return {"action": "missing", "source": source, "target": target, "label": label}
+
+    if target.is_symlink():
+        up_to_date = source is not None and os.readlink(target) == str(source)
+    elif target.exists():
+        up_to_date = source is None and target.is_dir()
+    else:
+        return {"action": "create", "source": source, "target": target, "label": label}
+
+    action = "skip" if up_to_date else "replace"
+    return {"action": action, "source": source, "target": target, "label": label}
+
+
+def apply_link_action(action: LinkAction) -> bool:
+    """Carry out a single planned action.
+
+    Args:
+        action: An action produced by plan_symlink() or plan_skill_links().
+
+    Returns:
+        True if the target is now in the desired state, False if the source is missing.
+    """
+    kind = action["action"]
+    source = action["source"]
+    target = action["target"]
+
+    if kind == "skip":
+        return True
+    if kind == "missing":
+        print_colored(f"  Warning: Source {action['label']} not found at {source}", Colors.RED)
         return False
+    if kind == "prune":
+        print_colored(f"  Pruning stale link {action['label']}", Colors.YELLOW)
+        target.unlink()
+        return True
+
+    if kind == "replace":
+        backup_if_exists(target)
 
-    backup_if_exists(target)
+    if source is None:
+        target.mkdir(parents=True, exist_ok=True)
+        return True
 
-    print_colored(f"  Creating symlink for {name}", Colors.GREEN)
+    print_colored(f"  Creating symlink for {action['label']}", Colors.GREEN)
     target.symlink_to(source)
     print(f"    {target} -> {source}")
     return True
 
 
+def apply_plan(actions: list[LinkAction]) -> bool:
+    """Apply every action in a plan, leaving up-to-date paths untouched.
+
+    Args:
+        actions: Actions in the order they must be applied.
+
+    Returns:
+        True if every action succeeded, False if any source was missing.
+    """
+    success = True
+    for action in actions:
+        if not apply_link_action(action):
+            success = False
+
+    skipped = sum(1 for action in actions if action["action"] == "skip")
+    if skipped:
+        print_colored(f"  {skipped} link(s) already up to date", Colors.GREEN)
+    return success
+
+
+def print_plan(actions: list[LinkAction]) -> None:
+    if not actions:
+        print("  Nothing to link")
+        return
+
+    for action in actions:
+        source = action["source"]
+        destination = "(directory)" if source is None else str(source)
+        print(f"  {action['action']:<8} {action['target']} -> {destination}")
+
+
+def create_symlink(source: Path, target: Path, name: str) -> bool:
+    return apply_link_action(plan_symlink(source, target, name))
+
+
 def parse_frontmatter(content: str) -> tuple[dict[str, str], str]:
     """Parse YAML frontmatter delimited by --- from markdown content.
 
@@ -189,32 +555,98 @@ def parse_frontmatter(content: str) -> tuple[dict[str, str], str]:
     return frontmatter, body
 
 
-def convert_md_to_toml(md_path: Path) -> str:
-    """Convert a markdown skill file to Gemini CLI's TOML command format.
-
-    Extracts the description from YAML frontmatter and wraps the markdown body
-    in a triple-quoted prompt field.
+def load_skill_document(name: str, data: bytes) -> SkillDocument:
+    """Parse a skill file's raw bytes into the model every format writer renders from.
 
     Args:
-        md_path: Path to the markdown skill file (e.g., SKILL.md).
+        name: Skill name (subdirectory name or file stem).
+        data: Raw contents of the skill file.
 
     Returns:
-        TOML-formatted string with description and prompt fields.
+        The skill's content, frontmatter, body and content hash.
     """
-    content = md_path.read_text()
+    content = data.decode()
     frontmatter, body = parse_frontmatter(content)
-    description = frontmatter.get("description", "")
+    return {
+        "name": name,
+        "hash": hashlib.sha256(data).hexdigest(),
+        "content": content,
+        "frontmatter": frontmatter,
+        "body": body,
+    }
+
+
+def render_skill_toml(document: SkillDocument) -> str:
+    description = document["frontmatter"].get("description", "")
 
     lines = []
     if description:
         lines.append(f'description = "{description}"')
     lines.append('prompt = """')
-    lines.append(body)
+    lines.append(document["body"])
     lines.append('"""')
 
     return "\n".join(lines)
 
 
+def render_skill_md(document: SkillDocument) -> str:
+    return document["content"]
+
+
+def render_skill_json(document: SkillDocument) -> str:
+    record = {
+        "name": document["name"],
+        "description": document["frontmatter"].get("description", ""),
+        "frontmatter": document["frontmatter"],
+        "prompt": document["body"],
+    }
+    return json.dumps(record, indent=2, sort_keys=True)
+
+
+# Output formats for skills_generate. Each writer renders one parsed skill; the
+# json format additionally keeps an _index.json of every skill in the target dir.
+SKILL_WRITERS: dict[str, SkillWriter] = {
+    "toml": {"suffix": "toml", "render": render_skill_toml},
+    "md": {"suffix": "md", "render": render_skill_md},
+    "json": {"suffix": "json", "render": render_skill_json},
+}
+
+SKILLS_INDEX = "_index.json"
+
+
+def convert_md_to_toml(md_path: Path) -> str:
+    """Convert a markdown skill file to Gemini CLI's TOML command format.
+
+    Extracts the description from YAML frontmatter and wraps the markdown body
+    in a triple-quoted prompt field.
+
+    Args:
+        md_path: Path to the markdown skill file (e.g., SKILL.md).
+
+    Returns:
+        TOML-formatted string with description and prompt fields.
+    """
+    return render_skill_toml(load_skill_document(md_path.stem, md_path.read_bytes()))
+
+
+def _scan_skills(source_dir: Path) -> tuple[list[tuple[str, Path]], dict[str, int]]:
+    skills: list[tuple[str, Path]] = []
+    flat: list[tuple[str, Path]] = []
+    subdirs: dict[str, int] = {}
+
+    with os.scandir(source_dir) as it:
+        for entry in it:
+            if entry.is_dir():
+                subdirs[entry.name] = entry.stat().st_mtime_ns
+                skill_file = Path(entry.path) / "SKILL.md"
+                if skill_file.exists():
+                    skills.append((entry.name, skill_file))
+            elif entry.name.endswith(".md") and entry.name.lower() != "readme.md":
+                flat.append((entry.name[: -len(".md")], Path(entry.path)))
+
+    return skills + flat, subdirs
+
+
 def find_skill_files(source_dir: Path) -> list[tuple[str, Path]]:
     """Discover skill files in both subdirectory and flat-file formats.
 
@@ -228,53 +660,464 @@ def find_skill_files(source_dir: Path) -> list[tuple[str, Path]]:
         List of (skill_name, skill_path) tuples. skill_name is derived from
         the subdirectory name or the file stem.
     """
-    skills = []
+    return _scan_skills(source_dir)[0]
+
+
+SKILL_CATALOG_VERSION = 1
+
 
-    for skill_dir in source_dir.iterdir():
-        if skill_dir.is_dir():
-            skill_file = skill_dir / "SKILL.md"
-            if skill_file.exists():
-                skills.append((skill_dir.name, skill_file))
+class SkillCatalog:
+    """Index of every skill in the skills directories, shared by all tools in a run.
 
-    for md_file in source_dir.glob("*.md"):
-        if md_file.name.lower() != "readme.md":
-            skills.append((md_file.stem, md_file))
+    Each source directory is scanned at most once per run. Between runs the index
+    is persisted to cache_path: a directory whose own mtime and subdirectory
+    mtimes are unchanged reuses its cached listing, and a skill file whose
+    mtime and size are unchanged reuses its cached frontmatter and content hash.
+    Skill files read during a run are parsed once and kept in memory, so every
+    format writer renders from the same document.
 
-    return skills
+    Args:
+        cache_path: Where to persist the index, or None to keep it in memory only.
+    """
+
+    def __init__(self, cache_path: Optional[Path] = None) -> None:
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self._dirs: dict[str, CatalogDir] = {}
+        self._documents: dict[str, SkillDocument] = {}
+        self._cached = self._load()
+        self._dirty = False
+
+    def _load(self) -> dict[str, CatalogDir]:
+        if self.cache_path is None:
+            return {}
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get("version") != SKILL_CATALOG_VERSION:
+            return {}
+        dirs: dict[str, CatalogDir] = data.get("dirs", {})
+        return dirs
+
+    def skills(self, source_dir: Path) -> list[SkillEntry]:
+        """Return the skills in a source directory, scanning it only if it changed.
+
+        Args:
+            source_dir: Directory containing skills (subdirs with SKILL.md or flat .md files).
+
+        Returns:
+            Skill entries in discovery order; empty if the directory does not exist.
+        """
+        key = str(source_dir)
+        with self._lock:
+            if key not in self._dirs:
+                refreshed = self._refresh(source_dir, self._cached.get(key))
+                if refreshed != self._cached.get(key):
+                    self._dirty = True
+                self._dirs[key] = refreshed
+            return self._dirs[key]["skills"]
+
+    def _refresh(self, source_dir: Path, cached: Optional[CatalogDir]) -> CatalogDir:
+        try:
+            dir_mtime = source_dir.stat().st_mtime_ns
+        except OSError:
+            return {"mtime_ns": 0, "subdirs": {}, "skills": []}
+
+        if cached is not None and self._listing_unchanged(source_dir, dir_mtime, cached):
+            listing = [(entry["name"], Path(entry["path"])) for entry in cached["skills"]]
+            subdirs = cached["subdirs"]
+        else:
+            listing, subdirs = _scan_skills(source_dir)
+
+        previous = {entry["path"]: entry for entry in cached["skills"]} if cached else {}
+        skills = []
+        for name, path in listing:
+            entry = self._entry(name, path, previous.get(str(path)))
+            if entry is not None:
+                skills.append(entry)
+
+        return {"mtime_ns": dir_mtime, "subdirs": subdirs, "skills": skills}
+
+    @staticmethod
+    def _listing_unchanged(source_dir: Path, dir_mtime: int, cached: CatalogDir) -> bool:
+        if cached["mtime_ns"] != dir_mtime:
+            return False
+        for name, mtime_ns in cached["subdirs"].items():
+            try:
+                if (source_dir / name).stat().st_mtime_ns != mtime_ns:
+                    return False
+            except OSError:
+                return False
+        return True
 
+    def _entry(self, name: str, path: Path, previous: Optional[SkillEntry]) -> Optional[SkillEntry]:
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+
+        if (
+            previous is not None
+            and previous["name"] == name
+            and previous["mtime_ns"] == stat.st_mtime_ns
+            and previous["size"] == stat.st_size
+        ):
+            return previous
+
+        document = load_skill_document(name, path.read_bytes())
+        self._documents[str(path)] = document
+        return {
+            "name": name,
+            "path": str(path),
+            "flat": path.name != "SKILL.md",
+            "frontmatter": document["frontmatter"],
+            "hash": document["hash"],
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+        }
+
+    def document(self, skill: SkillEntry) -> SkillDocument:
+        """Return a skill's parsed content, reading the file at most once per run.
+
+        Args:
+            skill: Entry returned by skills().
+
+        Returns:
+            The parsed skill, shared by every caller in this run.
+        """
+        with self._lock:
+            document = self._documents.get(skill["path"])
+            if document is None or document["hash"] != skill["hash"]:
+                document = load_skill_document(skill["name"], Path(skill["path"]).read_bytes())
+                self._documents[skill["path"]] = document
+            return document
+
+    def touched_dirs(self) -> list[str]:
+        with self._lock:
+            return list(self._dirs)
+
+    def invalidate(self, source_dir: Path) -> None:
+        """Revalidate a source directory against the disk on its next lookup.
+
+        Args:
+            source_dir: Directory whose in-run listing should be dropped.
+        """
+        key = str(source_dir)
+        with self._lock:
+            if key in self._dirs:
+                self._cached[key] = self._dirs.pop(key)
+
+    def save(self) -> None:
+        """Persist the index if anything was rescanned during this run."""
+        if self.cache_path is None or not self._dirty:
+            return
+
+        with self._lock:
+            merged = {**self._cached, **self._dirs}
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            # Several provisioned homes share one cache, so each writer needs its own temp file
+            tmp_path = self.cache_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump({"version": SKILL_CATALOG_VERSION, "dirs": merged}, f)
+            tmp_path.replace(self.cache_path)
+            self._cached = merged
+            self._dirty = False
+
+
+SKILLS_MANIFEST = ".skills-manifest.json"
+
+# Bump whenever convert_md_to_toml() or the md passthrough changes its output for
+# the same input, so every generated command is rewritten on the next run.
+SKILLS_CONVERTER_VERSION = 1
+
+
+def load_skills_manifest(target_dir: Path) -> Optional[SkillsManifest]:
+    """Load the generation manifest written by a previous generate_skills() run.
+
+    Args:
+        target_dir: Directory holding generated commands (e.g., ~/.gemini/commands).
+
+    Returns:
+        The parsed manifest, or None if it is missing or unreadable.
+    """
+    try:
+        with open(target_dir / SKILLS_MANIFEST) as f:
+            manifest: SkillsManifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(manifest, dict) or "skills" not in manifest:
+        return None
+    return manifest
+
+
+def _skill_is_current(entry: SkillManifestEntry, skill: SkillEntry, target_path: Path) -> bool:
+    if (
+        entry["source"] != skill["path"]
+        or entry["source_hash"] != skill["hash"]
+        or entry["output"] != target_path.name
+    ):
+        return False
+
+    try:
+        output_stat = target_path.stat()
+    except OSError:
+        return False
+
+    return (
+        output_stat.st_mtime_ns == entry["output_mtime_ns"]
+        or hash_file(target_path) == entry["output_hash"]
+    )
 
-def generate_skills(source_dir: Path, target_dir: Path, fmt: str) -> bool:
+
+def outdated_skills(
+    source_dir: Path, target_dir: Path, fmt: str, catalog: Optional[SkillCatalog] = None
+) -> list[str]:
+    """List the skills generate_skills() would regenerate or prune, without writing.
+
+    Args:
+        source_dir: Directory containing skills (subdirs with SKILL.md or flat .md files).
+        target_dir: Output directory for generated commands (e.g., ~/.gemini/commands).
+        fmt: Output format, a key of SKILL_WRITERS ("toml", "md" or "json").
+        catalog: Shared skill index; a throwaway in-memory one is used if omitted.
+
+    Returns:
+        Names of skills whose output is missing, stale or left over; empty if
+        the target directory is up to date.
+    """
+    writer = SKILL_WRITERS.get(fmt)
+    manifest = load_skills_manifest(target_dir)
+    catalog = catalog or SkillCatalog()
+    skills = catalog.skills(source_dir) if source_dir.exists() else []
+    if (
+        writer is None
+        or manifest is None
+        or target_dir.is_symlink()
+        or manifest.get("converter_version") != SKILLS_CONVERTER_VERSION
+        or manifest.get("format") != fmt
+    ):
+        return [skill["name"] for skill in skills] or [target_dir.name]
+
+    recorded = manifest["skills"]
+    outdated = [
+        skill["name"]
+        for skill in skills
+        if skill["name"] not in recorded
+        or not _skill_is_current(
+            recorded[skill["name"]], skill, target_dir / f"{skill['name']}.{writer['suffix']}"
+        )
+    ]
+    names = {skill["name"] for skill in skills}
+    outdated += [
+        name
+        for name, entry in recorded.items()
+        if name not in names and (target_dir / entry["output"]).exists()
+    ]
+    return outdated
+
+
+def generate_skills(
+    source_dir: Path,
+    target_dir: Path,
+    fmt: str,
+    force: bool = False,
+    dry_run: bool = False,
+    catalog: Optional[SkillCatalog] = None,
+) -> bool:
+    """Generate tool command files from skills, rewriting only what changed.
+
+    A manifest in the target directory records each skill's source hash, the
+    converter version and the generated output's hash. Skills whose source and
+    output are unchanged are skipped, and outputs of deleted skills are pruned.
+    A target directory without a manifest (or a forced run) is backed up and
+    rebuilt from scratch.
+
+    Args:
+        source_dir: Directory containing skills (subdirs with SKILL.md or flat .md files).
+        target_dir: Output directory for generated commands (e.g., ~/.gemini/commands).
+        fmt: Output format, a key of SKILL_WRITERS ("toml", "md" or "json").
+        force: Ignore the manifest and regenerate every skill.
+        dry_run: Only report which skills would be generated or pruned.
+        catalog: Shared skill index; a throwaway in-memory one is used if omitted.
+
+    Returns:
+        True if the commands were generated (or already up to date), False otherwise.
+    """
     if not source_dir.exists():
         print_colored(f"  Warning: Skills directory not found at {source_dir}", Colors.RED)
         return False
 
-    backup_if_exists(target_dir)
-    target_dir.mkdir(parents=True, exist_ok=True)
+    writer = SKILL_WRITERS.get(fmt)
+    if writer is None:
+        print_colored(f"  Warning: Unknown skills_generate format '{fmt}'", Colors.RED)
+        return False
+
+    manifest = None if force else load_skills_manifest(target_dir)
+    if manifest is None or target_dir.is_symlink():
+        if dry_run and target_dir.exists():
+            print(f"  Would back up {target_dir} and regenerate all skills")
+        elif not dry_run:
+            backup_if_exists(target_dir)
+        recorded: dict[str, SkillManifestEntry] = {}
+    else:
+        recorded = manifest["skills"]
+    if not dry_run:
+        target_dir.mkdir(parents=True, exist_ok=True)
+
+    up_to_date_converter = (
+        manifest is not None
+        and manifest.get("converter_version") == SKILLS_CONVERTER_VERSION
+        and manifest.get("format") == fmt
+    )
+    previous = recorded if up_to_date_converter else {}
 
-    skills = find_skill_files(source_dir)
+    catalog = catalog or SkillCatalog()
+    skills = catalog.skills(source_dir)
     if not skills:
         print_colored(f"  Warning: No skill files found in {source_dir}", Colors.YELLOW)
         return False
 
-    print_colored(f"  Generating {fmt} files in {target_dir}", Colors.GREEN)
-    for skill_name, skill_path in skills:
-        if fmt == "toml":
-            output = convert_md_to_toml(skill_path)
-            target_path = target_dir / f"{skill_name}.toml"
-        else:
-            output = skill_path.read_text()
-            target_path = target_dir / f"{skill_name}.md"
+    suffix = writer["suffix"]
+    entries: dict[str, SkillManifestEntry] = {}
+    outputs: set[str] = set()
+    changed = 0
+    for skill in skills:
+        skill_name = skill["name"]
+        skill_path = Path(skill["path"])
+        target_path = target_dir / f"{skill_name}.{suffix}"
+        outputs.add(target_path.name)
+
+        entry = previous.get(skill_name)
+        if entry is not None and _skill_is_current(entry, skill, target_path):
+            entries[skill_name] = entry
+            continue
+
+        if changed == 0:
+            verb = "Would generate" if dry_run else "Generating"
+            print_colored(f"  {verb} {fmt} files in {target_dir}", Colors.GREEN)
+        changed += 1
+
+        if dry_run:
+            print(f"    {skill_path.name} ({skill_name}) -> {target_path.name}")
+            continue
 
+        output = writer["render"](catalog.document(skill))
         target_path.write_text(output + "\n")
         print(f"    {skill_path.name} ({skill_name}) -> {target_path.name}")
 
+        entries[skill_name] = {
+            "source": skill["path"],
+            "source_hash": skill["hash"],
+            "output": target_path.name,
+            "output_hash": hash_file(target_path),
+            "output_mtime_ns": target_path.stat().st_mtime_ns,
+        }
+
+    pruned = 0
+    for skill_name, entry in recorded.items():
+        stale = target_dir / entry["output"]
+        if entry["output"] in outputs or not (stale.exists() or stale.is_symlink()):
+            continue
+        pruned += 1
+        if dry_run:
+            print(f"    Would prune {stale.name} ({skill_name} removed)")
+            continue
+        stale.unlink()
+        print(f"    Pruned {stale.name} ({skill_name} removed)")
+
+    index_path = target_dir / SKILLS_INDEX
+    if fmt == "json" and not dry_run and (changed or pruned or not index_path.exists()):
+        index = [
+            {
+                "name": skill["name"],
+                "description": skill["frontmatter"].get("description", ""),
+                "output": f"{skill['name']}.{suffix}",
+            }
+            for skill in skills
+        ]
+        index_path.write_text(json.dumps(index, indent=2) + "\n")
+    elif (
+        fmt != "json"
+        and not dry_run
+        and manifest is not None
+        and manifest.get("format") == "json"
+        and index_path.exists()
+    ):
+        # Only remove an index this setup wrote when the target was in json format
+        index_path.unlink()
+
+    if not dry_run and (changed or pruned or entries != recorded):
+        new_manifest: SkillsManifest = {
+            "converter_version": SKILLS_CONVERTER_VERSION,
+            "format": fmt,
+            "skills": entries,
+        }
+        with open(target_dir / SKILLS_MANIFEST, "w") as f:
+            json.dump(new_manifest, f, indent=2, sort_keys=True)
+
+    if not changed and not pruned:
+        print_colored(
+            f"  Skills up to date in {target_dir} ({len(entries)} unchanged)", Colors.GREEN
+        )
+
     return True
 
 
+def plan_skill_links(
+    skills_dirs: list[Path], target_dir: Path, catalog: Optional[SkillCatalog] = None
+) -> list[LinkAction]:
+    """Plan the per-skill symlinks for a config skills directory.
+
+    Each skill subdirectory (with a SKILL.md) is linked into target_dir by name,
+    with later source directories overriding earlier ones. Links in target_dir
+    that point into one of skills_dirs but no longer match a skill are pruned;
+    anything else already in target_dir is left alone.
+
+    Args:
+        skills_dirs: Directories containing skills (each subdir with SKILL.md).
+        target_dir: The config skills directory (e.g., ~/.claude/skills/).
+        catalog: Shared skill index; a throwaway in-memory one is used if omitted.
+
+    Returns:
+        Actions to apply in order, starting with the target directory itself.
+    """
+    actions = [plan_symlink(None, target_dir, target_dir.name)]
+
+    catalog = catalog or SkillCatalog()
+    desired: dict[str, Path] = {}
+    for source_dir in skills_dirs:
+        for skill in catalog.skills(source_dir):
+            if not skill["flat"]:
+                desired[skill["name"]] = Path(skill["path"]).parent
+
+    if actions[0]["action"] != "skip":
+        existing: list[os.DirEntry[str]] = []
+    else:
+        with os.scandir(target_dir) as it:
+            existing = list(it)
+
+    for name, skill_dir in desired.items():
+        actions.append(plan_symlink(skill_dir, target_dir / name, name))
+
+    owned_dirs = {str(source_dir) for source_dir in skills_dirs}
+    for entry in existing:
+        if entry.name in desired or not entry.is_symlink():
+            continue
+        if os.path.dirname(os.readlink(entry.path)) in owned_dirs:
+            actions.append(
+                {"action": "prune", "source": None, "target": Path(entry.path), "label": entry.name}
+            )
+
+    return actions
+
+
 def symlink_skills_to_config(
     skills_dirs: list[Path],
     target_dir: Path,
     label: str,
+    catalog: Optional[SkillCatalog] = None,
 ) -> bool:
     """Symlink individual skills from source directories into the config skills directory.
 
@@ -282,39 +1125,137 @@ def symlink_skills_to_config(
         skills_dirs: List of directories containing skills (each subdir with SKILL.md).
         target_dir: The config skills directory (e.g., ~/.claude/skills/).
         label: Label for logging (e.g., "public skills" or "work skills").
+        catalog: Shared skill index; a throwaway in-memory one is used if omitted.
 
     Returns:
         True if all symlinks were created successfully, False if any failed.
     """
-    success = True
-
     for source_dir in skills_dirs:
         if not source_dir.exists():
             print_colored(f"  Info: {label} dir {source_dir} not found, skipping", Colors.YELLOW)
-            continue
 
-        print_colored(f"  Linking {label} from {source_dir}", Colors.GREEN)
+    return apply_plan(plan_skill_links(skills_dirs, target_dir, catalog))
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _stripped_chunks(path: Path) -> Iterator[str]:
+    # Streaming equivalent of read_text().strip(): drop leading whitespace, and
+    # hold back trailing whitespace until more content proves it is not at the end.
+    # Decoded as text, so the Unicode whitespace str.strip() drops (e.g. NBSP,
+    # U+2028) and \r\n line endings are handled exactly as before.
+    leading = True
+    pending = ""
+    with open(path) as f:
+        while chunk := f.read(CHUNK_SIZE):
+            if leading:
+                chunk = chunk.lstrip()
+                if not chunk:
+                    continue
+                leading = False
+            body = chunk.rstrip()
+            if body:
+                yield pending + body
+                pending = chunk[len(body) :]
+            else:
+                pending += chunk
+
+
+def _memory_chunks(memory_files: list[Path]) -> Iterator[bytes]:
+    # Encoded the way write_text() would, so the output matches the old
+    # "\n\n".join(...) + "\n" byte for byte
+    encoding = locale.getpreferredencoding(False)
+    for index, mem_file in enumerate(memory_files):
+        if index:
+            yield b"\n\n"
+        for chunk in _stripped_chunks(mem_file):
+            yield chunk.encode(encoding)
+    yield b"\n"
+
+
+def _same_content(source: Path, target: Path) -> bool:
+    try:
+        if os.path.samefile(source, target):
+            return True
+        if source.stat().st_size != target.stat().st_size:
+            return False
+    except OSError:
+        return False
+    return hash_file(source) == hash_file(target)
 
-        for skill_dir in source_dir.iterdir():
-            if not skill_dir.is_dir():
-                continue
 
-            skill_file = skill_dir / "SKILL.md"
-            if not skill_file.exists():
-                continue
+MEMORY_MANIFEST = ".memory-manifest.json"
 
-            target_link = target_dir / skill_dir.name
 
-            if target_link.exists() or target_link.is_symlink():
-                if target_link.is_symlink():
-                    target_link.unlink()
-                else:
-                    shutil.rmtree(target_link)
+def load_memory_manifest(output_dir: Path) -> dict[str, str]:
+    """Load what generate_memory() last wrote into a directory.
 
-            target_link.symlink_to(skill_dir)
-            print(f"    {skill_dir.name} -> {skill_dir}")
+    Args:
+        output_dir: Directory holding generated memory (the single file's parent,
+            or the target directory in directory mode).
+
+    Returns:
+        Output filename -> sha256 of the content setup wrote; empty if missing or unreadable.
+    """
+    try:
+        with open(output_dir / MEMORY_MANIFEST) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
 
-    return success
+
+def _save_memory_manifest(output_dir: Path, written: dict[str, str]) -> None:
+    with open(output_dir / MEMORY_MANIFEST, "w") as f:
+        json.dump(written, f, indent=2, sort_keys=True)
+
+
+def _make_way_for_output(path: Path, written_hash: Optional[str]) -> None:
+    # Only a file that is still exactly what setup last wrote may be overwritten;
+    # anything else (hand edits, a user's own file) goes to the backup store
+    if path.is_file() and not path.is_symlink() and written_hash == hash_file(path):
+        return
+    backup_if_exists(path)
+
+
+def memory_is_current(source_dir: Path, config_dir: Path, target: str, mode: str) -> bool:
+    """Check whether generate_memory() would leave its output untouched.
+
+    Args:
+        source_dir: Directory containing memory .md files (e.g., repo_root/memory).
+        config_dir: The tool's config directory (e.g., ~/.windsurf).
+        target: Target filename (single_file mode) or directory name (directory mode).
+        mode: Either "single_file" or "directory".
+
+    Returns:
+        True if the generated output matches the memory files, False otherwise.
+    """
+    memory_files = sorted(source_dir.glob("*.md"))
+    target_path = config_dir / target
+    if target_path.is_symlink():
+        return False
+
+    if mode == "single_file":
+        if not target_path.is_file():
+            return False
+        expected = hashlib.sha256()
+        for chunk in _memory_chunks(memory_files):
+            expected.update(chunk)
+        return expected.hexdigest() == hash_file(target_path)
+
+    if mode == "directory":
+        if not target_path.is_dir():
+            return False
+        wanted = {mem_file.name for mem_file in memory_files}
+        stale = set(load_memory_manifest(target_path)) - wanted
+        if any(os.path.lexists(target_path / name) for name in stale):
+            return False
+        return all(
+            _same_content(mem_file, target_path / mem_file.name) for mem_file in memory_files
+        )
+
+    return False
 
 
 def generate_memory(source_dir: Path, config_dir: Path, target: str, mode: str) -> bool:
@@ -322,7 +1263,19 @@ def generate_memory(source_dir: Path, config_dir: Path, target: str, mode: str)
 
     For tools that cannot use @-references to include shared memory files,
     this function either concatenates all memory files into a single output file
-    or copies them individually into a target directory.
+    or copies them individually into a target directory. Outputs whose content
+    is already correct are left untouched.
+
+    In single_file mode the sources are streamed twice: once to hash the
+    expected output and, only if that differs from what is on disk, once more
+    into a temp file that is atomically renamed into place. In directory mode
+    each changed file is reflinked (or copied where reflinks are unsupported).
+
+    A manifest next to the outputs records the hash of everything setup wrote.
+    An output is only overwritten, and a memory file that was removed only
+    pruned, while it still has that content; hand-edited and unknown files are
+    moved to the backup store instead, and other files in the directory are
+    left alone.
 
     Args:
         source_dir: Directory containing memory .md files (e.g., repo_root/memory).
@@ -345,24 +1298,72 @@ def generate_memory(source_dir: Path, config_dir: Path, target: str, mode: str)
     target_path = config_dir / target
 
     if mode == "single_file":
-        backup_if_exists(target_path)
-        parts = []
-        for mem_file in memory_files:
-            parts.append(mem_file.read_text().strip())
-        target_path.write_text("\n\n".join(parts) + "\n")
+        output_dir = target_path.parent
+        written = load_memory_manifest(output_dir)
+        expected = hashlib.sha256()
+        for chunk in _memory_chunks(memory_files):
+            expected.update(chunk)
+        digest = expected.hexdigest()
+        is_file = target_path.is_file() and not target_path.is_symlink()
+        if is_file and digest == hash_file(target_path):
+            if written.get(target_path.name) != digest:
+                _save_memory_manifest(output_dir, {**written, target_path.name: digest})
+            print_colored(f"  Memory up to date: {target_path}", Colors.GREEN)
+            return True
+        _make_way_for_output(target_path, written.get(target_path.name))
+
+        with tempfile.NamedTemporaryFile(
+            dir=output_dir, prefix=f".{target_path.name}.", delete=False
+        ) as tmp:
+            for chunk in _memory_chunks(memory_files):
+                tmp.write(chunk)
+        os.replace(tmp.name, target_path)
+        _save_memory_manifest(output_dir, {**written, target_path.name: digest})
         print_colored(f"  Generated {target_path}", Colors.GREEN)
         for mem_file in memory_files:
             print(f"    Included: {mem_file.name}")
     elif mode == "directory":
-        backup_if_exists(target_path)
+        written = {}
+        if not target_path.is_dir() or target_path.is_symlink():
+            backup_if_exists(target_path)
+        else:
+            written = load_memory_manifest(target_path)
         target_path.mkdir(parents=True, exist_ok=True)
+
+        updated = 0
+        now_written: dict[str, str] = {}
         for mem_file in memory_files:
             dest = target_path / mem_file.name
-            if dest.exists() or dest.is_symlink():
-                dest.unlink()
-            shutil.copy2(mem_file, dest)
-            print(f"    {mem_file.name} -> {dest}")
-        print_colored(f"  Copied memory files to {target_path}", Colors.GREEN)
+            if dest.is_file() and not dest.is_symlink() and _same_content(mem_file, dest):
+                now_written[dest.name] = written.get(dest.name) or hash_file(dest)
+                continue
+            _make_way_for_output(dest, written.get(dest.name))
+            tmp_dest = target_path / f".{mem_file.name}.tmp"
+            tmp_dest.unlink(missing_ok=True)
+            # A copy, not a hardlink: edits in the tool's directory must not
+            # reach the repo's memory files
+            method = clone_file(mem_file, tmp_dest, allow_hardlink=False)
+            os.replace(tmp_dest, dest)
+            now_written[dest.name] = hash_file(dest)
+            updated += 1
+            print(f"    {mem_file.name} -> {dest} ({method})")
+
+        for name, written_hash in written.items():
+            stale = target_path / name
+            if name in now_written or not os.path.lexists(stale):
+                continue
+            _make_way_for_output(stale, written_hash)
+            stale.unlink(missing_ok=True)
+            updated += 1
+            print(f"    Pruned {name}")
+
+        if now_written != written:
+            _save_memory_manifest(target_path, now_written)
+
+        if updated:
+            print_colored(f"  Copied memory files to {target_path}", Colors.GREEN)
+        else:
+            print_colored(f"  Memory up to date: {target_path}", Colors.GREEN)
     else:
         print_colored(f"  Warning: Unknown memory_generate mode '{mode}'", Colors.RED)
         return False
@@ -406,7 +1407,62 @@ def ensure_settings_from_template(tool_dir: Path, template_cfg: SettingsTemplate
     return True
 
 
-def setup_tool(tool_id: str, tool_config: ToolConfig, ai_root: Path) -> bool:
+def get_skills_dirs(tool_config: ToolConfig, ai_root: Path) -> list[Path]:
+    skills_dirs = [ai_root / tool_config["skills_symlink"]["source"]]
+    for extra_dir_str in tool_config.get("extra_skills_dirs", []):
+        if extra_dir_str.startswith("~"):
+            skills_dirs.append(Path(os.path.expanduser(extra_dir_str)))
+        else:
+            skills_dirs.append(ai_root / extra_dir_str)
+    return skills_dirs
+
+
+def plan_tool_links(
+    tool_config: ToolConfig, ai_root: Path, catalog: Optional[SkillCatalog] = None
+) -> list[LinkAction]:
+    """Plan every symlink a tool needs: its configured symlinks and per-skill links.
+
+    Args:
+        tool_config: The tool's entry from tools.json.
+        ai_root: Root of the repo's ai/ directory.
+        catalog: Shared skill index; a throwaway in-memory one is used if omitted.
+
+    Returns:
+        Actions to apply in order. Nothing on disk is changed.
+    """
+    config_dir = Path(os.path.expanduser(tool_config["config_dir"]))
+    tool_dir = ai_root / tool_config["tool_dir"]
+
+    # A settings file that will be copied from its template counts as present
+    templated: set[Path] = set()
+    if "settings_template" in tool_config:
+        template_cfg = tool_config["settings_template"]
+        if (tool_dir / template_cfg["template"]).exists():
+            templated.add(tool_dir / template_cfg["target"])
+
+    actions: list[LinkAction] = []
+    for symlink in tool_config.get("symlinks", []):
+        source = tool_dir / symlink["source"]
+        target = config_dir / symlink["target"]
+        source_exists = True if source in templated else None
+        actions.append(plan_symlink(source, target, symlink["source"], source_exists))
+
+    if "skills_symlink" in tool_config:
+        target_dir = config_dir / tool_config["skills_symlink"]["target"]
+        skills_dirs = get_skills_dirs(tool_config, ai_root)
+        actions.extend(plan_skill_links(skills_dirs, target_dir, catalog))
+
+    return actions
+
+
+def setup_tool(
+    tool_id: str,
+    tool_config: ToolConfig,
+    ai_root: Path,
+    force: bool = False,
+    dry_run: bool = False,
+    catalog: Optional[SkillCatalog] = None,
+) -> bool:
     name = tool_config["name"]
     config_dir = Path(os.path.expanduser(tool_config["config_dir"]))
     tool_dir = ai_root / tool_config["tool_dir"]
@@ -421,6 +1477,33 @@ def setup_tool(tool_id: str, tool_config: ToolConfig, ai_root: Path) -> bool:
         print_colored(f"  Warning: Tool directory {tool_dir} not found, skipping", Colors.YELLOW)
         return False
 
+    if "skills_symlink" in tool_config:
+        for skills_dir in get_skills_dirs(tool_config, ai_root):
+            if not skills_dir.exists():
+                print_colored(f"  Info: skills dir {skills_dir} not found, skipping", Colors.YELLOW)
+
+    catalog = catalog or SkillCatalog()
+
+    if dry_run:
+        print_plan(plan_tool_links(tool_config, ai_root, catalog))
+        if "skills_generate" in tool_config:
+            skills_cfg = tool_config["skills_generate"]
+            generate_skills(
+                ai_root / skills_cfg["source"],
+                config_dir / skills_cfg["target"],
+                skills_cfg.get("format", "md"),
+                force=force,
+                dry_run=True,
+                catalog=catalog,
+            )
+        if "memory_generate" in tool_config:
+            mem_cfg = tool_config["memory_generate"]
+            if not memory_is_current(
+                ai_root / mem_cfg["source"], config_dir, mem_cfg["target"], mem_cfg["mode"]
+            ):
+                print(f"  Would regenerate memory {mem_cfg['target']}")
+        return True
+
     if not config_dir.exists():
         print_colored(f"  Creating config directory: {config_dir}", Colors.YELLOW)
         config_dir.mkdir(parents=True)
@@ -431,37 +1514,16 @@ def setup_tool(tool_id: str, tool_config: ToolConfig, ai_root: Path) -> bool:
     if "settings_template" in tool_config:
         ensure_settings_from_template(tool_dir, tool_config["settings_template"])
 
-    for symlink in tool_config.get("symlinks", []):
-        source = tool_dir / symlink["source"]
-        target = config_dir / symlink["target"]
-
-        if not create_symlink(source, target, symlink["source"]):
-            success = False
-
-    if "skills_symlink" in tool_config:
-        skills_cfg = tool_config["skills_symlink"]
-        source_dir = ai_root / skills_cfg["source"]
-        target_dir = config_dir / skills_cfg["target"]
-
-        backup_if_exists(target_dir)
-        target_dir.mkdir(parents=True, exist_ok=True)
-
-        skills_dirs = [source_dir]
-        for extra_dir_str in tool_config.get("extra_skills_dirs", []):
-            if extra_dir_str.startswith("~"):
-                skills_dirs.append(Path(os.path.expanduser(extra_dir_str)))
-            else:
-                skills_dirs.append(ai_root / extra_dir_str)
-
-        if not symlink_skills_to_config(skills_dirs, target_dir, "skills"):
-            success = False
+    actions = plan_tool_links(tool_config, ai_root, catalog)
+    if not apply_plan(actions):
+        success = False
 
     if "skills_generate" in tool_config:
         skills_cfg = tool_config["skills_generate"]
         source = ai_root / skills_cfg["source"]
         target = config_dir / skills_cfg["target"]
         fmt = skills_cfg.get("format", "md")
-        if not generate_skills(source, target, fmt):
+        if not generate_skills(source, target, fmt, force=force, catalog=catalog):
             success = False
 
     if "memory_generate" in tool_config:
@@ -471,10 +1533,387 @@ def setup_tool(tool_id: str, tool_config: ToolConfig, ai_root: Path) -> bool:
             success = False
 
     setup_shell_alias(tool_id)
+    InstallManifest().record(tool_manifest_records(tool_id, tool_config, actions, config_dir))
 
     return success
 
 
+class ThreadOutput(io.TextIOBase):
+    """Stand-in for sys.stdout that diverts writes from capturing threads into buffers.
+
+    Threads that call capture() get their prints collected into a private buffer;
+    every other thread (including the main one) writes straight through.
+    """
+
+    def __init__(self, stream: TextIO) -> None:
+        self.stream = stream
+        self._local = threading.local()
+
+    def capture(self, buffer: Optional[io.StringIO]) -> None:
+        self._local.buffer = buffer
+
+    def write(self, text: str) -> int:
+        buffer: Optional[io.StringIO] = getattr(self._local, "buffer", None)
+        if buffer is not None:
+            return buffer.write(text)
+        return self.stream.write(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+def _setup_tool_captured(
+    output: ThreadOutput,
+    tool_id: str,
+    tool_config: ToolConfig,
+    ai_root: Path,
+    force: bool,
+    dry_run: bool,
+    catalog: SkillCatalog,
+) -> tuple[bool, str]:
+    buffer = io.StringIO()
+    output.capture(buffer)
+    try:
+        success = setup_tool(
+            tool_id, tool_config, ai_root, force=force, dry_run=dry_run, catalog=catalog
+        )
+    except Exception as e:
+        print_colored(f"  Error: {tool_config['name']} setup failed: {e}", Colors.RED)
+        success = False
+    finally:
+        output.capture(None)
+    return success, buffer.getvalue()
+
+
+def setup_tools(
+    tools: dict[str, ToolConfig],
+    ai_root: Path,
+    jobs: int = 1,
+    force: bool = False,
+    dry_run: bool = False,
+    catalog: Optional[SkillCatalog] = None,
+) -> dict[str, bool]:
+    """Set up each tool, optionally overlapping their work on a thread pool.
+
+    With more than one job, each tool's output is buffered and printed in the
+    order the tools were requested, and an exception in one tool marks only that
+    tool as failed instead of aborting the rest.
+
+    Args:
+        tools: Mapping of tool id to its tools.json configuration, in setup order.
+        ai_root: Root of the repo's ai/ directory.
+        jobs: Number of tools to set up concurrently (1 runs them sequentially).
+        force: Regenerate all skill commands instead of only changed ones.
+        dry_run: Print each tool's plan instead of changing anything.
+        catalog: Skill index shared by every tool; an in-memory one is used if omitted.
+
+    Returns:
+        Mapping of tool id to whether its setup fully succeeded, in setup order.
+    """
+    catalog = catalog or SkillCatalog()
+
+    if jobs <= 1:
+        return {
+            tool_id: setup_tool(
+                tool_id, tool_config, ai_root, force=force, dry_run=dry_run, catalog=catalog
+            )
+            for tool_id, tool_config in tools.items()
+        }
+
+    original_stdout = sys.stdout
+    output = ThreadOutput(original_stdout)
+    sys.stdout = cast(TextIO, output)
+    results: dict[str, bool] = {}
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = {
+                tool_id: pool.submit(
+                    _setup_tool_captured,
+                    output,
+                    tool_id,
+                    tool_config,
+                    ai_root,
+                    force,
+                    dry_run,
+                    catalog,
+                )
+                for tool_id, tool_config in tools.items()
+            }
+            for tool_id, future in futures.items():
+                success, captured = future.result()
+                output.stream.write(captured)
+                output.stream.flush()
+                results[tool_id] = success
+    finally:
+        sys.stdout = original_stdout
+
+    return results
+
+
+WATCH_DEBOUNCE_SECONDS = 0.2
+WATCH_POLL_INTERVAL_SECONDS = 0.5
+
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_ISDIR = 0x40000000
+INOTIFY_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+)
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """Linux inotify watcher over directory trees, driven through libc via ctypes.
+
+    inotify is not recursive, so every directory under the roots gets its own
+    watch, and directories created later are added as their events arrive.
+
+    Args:
+        roots: Directories to watch, including everything below them.
+
+    Raises:
+        OSError: If inotify is unavailable (non-Linux, or out of watches).
+    """
+
+    def __init__(self, roots: list[Path]) -> None:
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd: int = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._dirs: dict[int, Path] = {}
+        for root in roots:
+            self._add_tree(root)
+
+    def _add_tree(self, root: Path, strict: bool = True) -> set[Path]:
+        """Watch root and every directory below, returning the files already there.
+
+        With strict=False a directory that cannot be watched is warned about and
+        skipped, so a running watch does not die over one directory.
+        """
+        existing: set[Path] = set()
+        for dirpath, _dirnames, filenames in os.walk(root):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), INOTIFY_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                error = OSError(errno, os.strerror(errno), dirpath)
+                if strict:
+                    raise error
+                print_colored(f"  Warning: not watching {dirpath}: {error.strerror}", Colors.YELLOW)
+                continue
+            self._dirs[wd] = Path(dirpath)
+            existing.update(Path(dirpath) / filename for filename in filenames)
+        return existing
+
+    def poll(self, timeout: Optional[float]) -> set[Path]:
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        changed: set[Path] = set()
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = INOTIFY_EVENT.unpack_from(data, offset)
+                start = offset + INOTIFY_EVENT.size
+                name = data[start : start + length].rstrip(b"\0")
+                offset = start + length
+
+                parent = self._dirs.get(wd)
+                if parent is None:
+                    continue
+                path = parent / os.fsdecode(name) if name else parent
+                changed.add(path)
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files may land in a new directory before its watch exists
+                    changed |= self._add_tree(path, strict=False)
+        return changed
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Portable fallback that diffs (mtime, size) snapshots of the watched trees.
+
+    Args:
+        roots: Directories to watch, including everything below them.
+        interval: Seconds between snapshots.
+    """
+
+    def __init__(self, roots: list[Path], interval: float = WATCH_POLL_INTERVAL_SECONDS) -> None:
+        self._roots = roots
+        self._interval = interval
+        self._snapshot = self._take_snapshot()
+
+    def _take_snapshot(self) -> dict[Path, tuple[int, int]]:
+        snapshot: dict[Path, tuple[int, int]] = {}
+        for root in self._roots:
+            for dirpath, _dirnames, filenames in os.walk(root):
+                for filename in filenames:
+                    path = Path(dirpath) / filename
+                    try:
+                        stat = path.stat()
+                    except OSError:
+                        continue
+                    snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def poll(self, timeout: Optional[float]) -> set[Path]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            current = self._take_snapshot()
+            changed = {
+                path
+                for path in current.keys() | self._snapshot.keys()
+                if current.get(path) != self._snapshot.get(path)
+            }
+            self._snapshot = current
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            wait = self._interval
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.monotonic(), 0))
+            time.sleep(wait)
+
+    def close(self) -> None:
+        pass
+
+
+def make_watcher(roots: list[Path]) -> InotifyWatcher | PollingWatcher:
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(roots)
+        except OSError as e:
+            print_colored(f"  inotify unavailable ({e}), falling back to polling", Colors.YELLOW)
+    return PollingWatcher(roots)
+
+
+def get_watch_sources(tool_config: ToolConfig, ai_root: Path) -> dict[str, list[Path]]:
+    sources: dict[str, list[Path]] = {}
+    if "skills_symlink" in tool_config:
+        sources["skills_symlink"] = get_skills_dirs(tool_config, ai_root)
+    if "skills_generate" in tool_config:
+        sources["skills_generate"] = [ai_root / tool_config["skills_generate"]["source"]]
+    if "memory_generate" in tool_config:
+        sources["memory_generate"] = [ai_root / tool_config["memory_generate"]["source"]]
+    return sources
+
+
+def _touches(changed: set[Path], source_dirs: list[Path]) -> bool:
+    return any(
+        path == source_dir or source_dir in path.parents
+        for path in changed
+        for source_dir in source_dirs
+    )
+
+
+def refresh_changed(
+    changed: set[Path],
+    tools: dict[str, ToolConfig],
+    ai_root: Path,
+    catalog: SkillCatalog,
+) -> list[str]:
+    """Regenerate only the tool outputs whose sources include a changed path.
+
+    Args:
+        changed: Paths reported by the watcher since the last refresh.
+        tools: Mapping of tool id to its tools.json configuration.
+        ai_root: Root of the repo's ai/ directory.
+        catalog: Skill index shared across refreshes.
+
+    Returns:
+        Ids of the tools that had at least one output refreshed.
+    """
+    for source_dir in {Path(key) for key in catalog.touched_dirs()}:
+        if _touches(changed, [source_dir]):
+            catalog.invalidate(source_dir)
+
+    refreshed: list[str] = []
+    for tool_id, tool_config in tools.items():
+        config_dir = Path(os.path.expanduser(tool_config["config_dir"]))
+        sources = get_watch_sources(tool_config, ai_root)
+        affected = [kind for kind, dirs in sources.items() if _touches(changed, dirs)]
+        if not affected:
+            continue
+
+        print_colored(f"\n{tool_config['name']}: refreshing {', '.join(affected)}", Colors.BLUE)
+        if "skills_symlink" in affected:
+            target_dir = config_dir / tool_config["skills_symlink"]["target"]
+            apply_plan(plan_skill_links(sources["skills_symlink"], target_dir, catalog))
+        if "skills_generate" in affected:
+            skills_cfg = tool_config["skills_generate"]
+            generate_skills(
+                sources["skills_generate"][0],
+                config_dir / skills_cfg["target"],
+                skills_cfg.get("format", "md"),
+                catalog=catalog,
+            )
+        if "memory_generate" in affected:
+            mem_cfg = tool_config["memory_generate"]
+            generate_memory(
+                sources["memory_generate"][0], config_dir, mem_cfg["target"], mem_cfg["mode"]
+            )
+        refreshed.append(tool_id)
+
+    return refreshed
+
+
+def watch(tools: dict[str, ToolConfig], ai_root: Path, catalog: SkillCatalog) -> None:
+    """Watch skill and memory sources and regenerate affected outputs until interrupted.
+
+    Bursts of events (editor save sequences, git checkouts) are debounced into a
+    single refresh once the sources have been quiet for WATCH_DEBOUNCE_SECONDS.
+
+    Args:
+        tools: Mapping of tool id to its tools.json configuration.
+        ai_root: Root of the repo's ai/ directory.
+        catalog: Skill index shared across refreshes.
+    """
+    roots = sorted(
+        {
+            source_dir
+            for tool_config in tools.values()
+            for dirs in get_watch_sources(tool_config, ai_root).values()
+            for source_dir in dirs
+            if source_dir.is_dir()
+        }
+    )
+    if not roots:
+        print_colored("Nothing to watch: no skill or memory sources configured", Colors.YELLOW)
+        return
+
+    watcher = make_watcher(roots)
+    kind = "inotify" if isinstance(watcher, InotifyWatcher) else "polling"
+    print_colored(f"\nWatching {len(roots)} source dir(s) ({kind}), Ctrl-C to stop", Colors.BOLD)
+    for root in roots:
+        print(f"  {root}")
+
+    try:
+        while True:
+            changed = watcher.poll(None)
+            while more := watcher.poll(WATCH_DEBOUNCE_SECONDS):
+                changed |= more
+            print_colored(f"\nDetected {len(changed)} changed path(s)", Colors.YELLOW)
+            refresh_changed(changed, tools, ai_root, catalog)
+            catalog.save()
+    except KeyboardInterrupt:
+        print_colored("\nStopped watching", Colors.GREEN)
+    finally:
+        watcher.close()
+
+
 def list_tools(config: ToolsConfig) -> None:
     print_colored("\nAvailable tools:", Colors.BOLD)
     print_colored("-" * 40, Colors.BLUE)
@@ -500,6 +1939,10 @@ Examples:
   python setup.py gemini       # Setup only Gemini CLI
   python setup.py claude gemini  # Setup specific tools
   python setup.py --list       # List available tools
+  python setup.py --force      # Regenerate all skill commands
+  python setup.py --jobs 4     # Setup up to 4 tools concurrently
+  python setup.py --dry-run    # Show what would change without touching anything
+  python setup.py --watch      # Keep regenerating outputs as skills/memory change
         """,
     )
     parser.add_argument(
@@ -513,6 +1956,31 @@ Examples:
         action="store_true",
         help="List available tools and exit",
     )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Regenerate all skill commands instead of only changed ones",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Number of tools to setup concurrently (default: 1)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        "-n",
+        action="store_true",
+        help="Print the planned changes without applying them",
+    )
+    parser.add_argument(
+        "--watch",
+        "-w",
+        action="store_true",
+        help="After setup, watch skill and memory sources and regenerate on change",
+    )
 
     args = parser.parse_args()
 
@@ -550,9 +2018,18 @@ Examples:
         print_colored("No valid tools to setup", Colors.RED)
         sys.exit(1)
 
-    results = {}
-    for tool_id, tool_config in tools_to_setup.items():
-        results[tool_id] = setup_tool(tool_id, tool_config, ai_root)
+    catalog = SkillCatalog(get_cache_dir() / "skill-catalog.json")
+    results = setup_tools(
+        tools_to_setup,
+        ai_root,
+        jobs=args.jobs,
+        force=args.force,
+        dry_run=args.dry_run,
+        catalog=catalog,
+    )
+    if not args.dry_run:
+        catalog.save()
+        BackupStore().prune(keep=BACKUP_KEEP)
 
     print_colored(f"\n{'=' * 50}", Colors.BLUE)
     print_colored("Setup Summary", Colors.BOLD)
@@ -564,9 +2041,15 @@ Examples:
         print(f"  {name}: {status}")
 
     print_colored(f"\n{'=' * 50}", Colors.GREEN)
-    print_colored("Setup complete!", Colors.GREEN)
+    if args.dry_run:
+        print_colored("Dry run complete, nothing was changed", Colors.GREEN)
+    else:
+        print_colored("Setup complete!", Colors.GREEN)
     print_colored(f"{'=' * 50}", Colors.GREEN)
 
+    if args.watch and not args.dry_run:
+        watch(tools_to_setup, ai_root, catalog)
+
 
 if __name__ == "__main__":
     main()
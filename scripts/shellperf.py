@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Cold-start statistics for shell startup
+
+shellperf --runs N (shell/.zsh/shellperf.zsh) calls this to start N fresh
+interactive shells. Each one profiles its own startup and, as it exits, writes
+its timings (hand-placed tags, every sourced file and timed eval, the ~/.zshrc
+tool block and the top zsh/zprof functions) to the file named by
+$SHELLPERF_SINK, one "tag<TAB>description<TAB>ms" line each. The runs are then
+summarized per tag, so a change in startup time can be told apart from noise.
+
+Every result, cold or warm (shellperf re-sourcing ~/.zshrc in place), is
+appended to $XDG_STATE_HOME/dotfiles/shellperf.jsonl with the time, repo
+commit and hostname, so inv shellperf-report can show trends and find the
+commit where a tag regressed.
+
+Usage:
+    python -m scripts.shellperf --runs 20            # Summarize 20 cold starts
+    python -m scripts.shellperf --runs 20 --json     # Print the summary as JSON
+    python -m scripts.shellperf --record sink.tsv    # Record a warm run's timings
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from itertools import pairwise
+from pathlib import Path
+from typing import Optional, TypedDict
+
+from scripts.fsutil import get_state_dir
+from scripts.setup import Colors, get_repo_root, print_colored, repo_commit
+
+SHELL_COMMAND = ["zsh", "-i", "-c", "exit"]
+SHELL_TIMEOUT_SECONDS = 30.0
+# Key of the loader-to-exit time in a run's timings
+TOTAL_KEY = "total"
+SHELLPERF_HISTORY = "shellperf.jsonl"
+# Startup time inv shellperf-report fails over, in ms
+SHELLPERF_BUDGET_MS = 200.0
+# A tag regressed if it got this much slower (as a fraction) from one commit to the next...
+REGRESSION_THRESHOLD = 0.2
+# ...by at least this many ms, below which differences are noise
+NOISE_FLOOR_MS = 2.0
+
+
+class ShellperfRun(TypedDict):
+    # Process start to exit, in ms
+    wall: float
+    # "tag::description" and "tag" (sum of the tag's entries) and TOTAL_KEY, in ms
+    timings: dict[str, float]
+
+
+class TimingStats(TypedDict):
+    runs: int
+    mean: float
+    p50: float
+    p95: float
+    stddev: float
+
+
+class ShellperfEntry(TypedDict):
+    time: float
+    commit: str
+    host: str
+    # cold (shellperf --runs) or warm (shellperf, re-sourcing ~/.zshrc in place)
+    mode: str
+    runs: int
+    # Startup time in ms, the mean over the runs for cold starts
+    total: float
+    # ms by tag and "tag::description", means over the runs for cold starts
+    timings: dict[str, float]
+
+
+class CommitTrend(TypedDict):
+    commit: str
+    # When the commit was first measured
+    time: float
+    entries: int
+    # Median over the commit's entries, by tag and TOTAL_KEY
+    timings: dict[str, float]
+
+
+class Regression(TypedDict):
+    key: str
+    commit: str
+    previous_commit: str
+    before: float
+    after: float
+
+
+def parse_sink(text: str) -> dict[str, float]:
+    """Read the timings one shell wrote to its sink.
+
+    Args:
+        text: Sink content, one "tag<TAB>description<TAB>ms" line per timing.
+
+    Returns:
+        Milliseconds by "tag::description", by tag (summed over its entries),
+        and the total startup time under TOTAL_KEY.
+    """
+    timings: dict[str, float] = {}
+    for line in text.splitlines():
+        parts = line.split("\t")
+        if len(parts) != 3:
+            continue
+        tag, description, value = parts
+        try:
+            ms = float(value)
+        except ValueError:
+            continue
+        if tag == TOTAL_KEY:
+            timings[TOTAL_KEY] = ms
+            continue
+        timings[f"{tag}::{description}"] = ms
+        timings[tag] = timings.get(tag, 0.0) + ms
+    return timings
+
+
+def run_cold(
+    runs: int,
+    command: list[str] = SHELL_COMMAND,
+    timeout: float = SHELL_TIMEOUT_SECONDS,
+) -> list[ShellperfRun]:
+    """Start fresh shells one after another and collect their timings.
+
+    Args:
+        runs: Number of shells to start.
+        command: Command that starts one shell and exits.
+        timeout: Seconds each shell may take.
+
+    Returns:
+        One result per shell, in the order they ran.
+
+    Raises:
+        RuntimeError: If a shell exits non-zero or writes no timings.
+    """
+    results: list[ShellperfRun] = []
+    with tempfile.TemporaryDirectory(prefix="shellperf-") as tmp:
+        for index in range(runs):
+            sink = Path(tmp) / f"run-{index}.tsv"
+            sink.touch()
+            start = time.perf_counter()
+            result = subprocess.run(
+                command,
+                env={**os.environ, "SHELLPERF_SINK": str(sink)},
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                text=True,
+                timeout=timeout,
+            )
+            wall = (time.perf_counter() - start) * 1000
+            if result.returncode != 0:
+                raise RuntimeError(
+                    f"{' '.join(command)} exited {result.returncode}: {result.stderr.strip()}"
+                )
+            timings = parse_sink(sink.read_text())
+            if not timings:
+                raise RuntimeError(f"{' '.join(command)} wrote no timings to $SHELLPERF_SINK")
+            results.append({"wall": wall, "timings": timings})
+    return results
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Interpolated percentile of values (fraction 0.95 for p95)."""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def timing_stats(values: list[float]) -> TimingStats:
+    return {
+        "runs": len(values),
+        "mean": statistics.fmean(values),
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+        "stddev": statistics.stdev(values) if len(values) > 1 else 0.0,
+    }
+
+
+def summarize(runs: list[ShellperfRun]) -> dict[str, TimingStats]:
+    """Summarize every timing across runs.
+
+    A timing only some runs recorded (e.g. behind a condition) is summarized
+    over those runs.
+
+    Returns:
+        Stats by timing key, plus "wall" for the process wall time.
+    """
+    values: dict[str, list[float]] = {}
+    for run in runs:
+        for key, ms in run["timings"].items():
+            values.setdefault(key, []).append(ms)
+        values.setdefault("wall", []).append(run["wall"])
+    return {key: timing_stats(samples) for key, samples in values.items()}
+
+
+def get_history_path() -> Path:
+    return get_state_dir() / SHELLPERF_HISTORY
+
+
+def make_entry(mode: str, runs: int, total: float, timings: dict[str, float]) -> ShellperfEntry:
+    return {
+        "time": time.time(),
+        "commit": repo_commit(get_repo_root()),
+        "host": platform.node(),
+        "mode": mode,
+        "runs": runs,
+        "total": total,
+        "timings": {key: ms for key, ms in timings.items() if key != TOTAL_KEY},
+    }
+
+
+def append_history(entry: ShellperfEntry, path: Optional[Path] = None) -> None:
+    """Append one result to the history, a JSON object per line."""
+    path = path or get_history_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def load_history(path: Optional[Path] = None) -> list[ShellperfEntry]:
+    """Read every recorded result, oldest first, skipping lines that do not parse."""
+    path = path or get_history_path()
+    if not path.exists():
+        return []
+    entries: list[ShellperfEntry] = []
+    for line in path.read_text().splitlines():
+        try:
+            entries.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return sorted(entries, key=lambda entry: entry["time"])
+
+
+def commit_trends(entries: list[ShellperfEntry]) -> list[CommitTrend]:
+    """Group results by repo commit, in the order the commits were first measured.
+
+    Each commit gets the median over its results of the total and of every tag
+    (per-description timings are left out).
+    """
+    grouped: dict[str, list[ShellperfEntry]] = {}
+    for entry in sorted(entries, key=lambda entry: entry["time"]):
+        grouped.setdefault(entry["commit"], []).append(entry)
+
+    trends: list[CommitTrend] = []
+    for commit, group in grouped.items():
+        values: dict[str, list[float]] = {TOTAL_KEY: [entry["total"] for entry in group]}
+        for entry in group:
+            for key, ms in entry["timings"].items():
+                if "::" not in key:
+                    values.setdefault(key, []).append(ms)
+        trends.append(
+            {
+                "commit": commit,
+                "time": group[0]["time"],
+                "entries": len(group),
+                "timings": {key: statistics.median(samples) for key, samples in values.items()},
+            }
+        )
+    return trends
+
+
+def find_regressions(
+    trends: list[CommitTrend],
+    threshold: float = REGRESSION_THRESHOLD,
+    noise_floor: float = NOISE_FLOOR_MS,
+) -> list[Regression]:
+    """Find the commits where the total or a tag got slower than the commit before.
+
+    Args:
+        trends: Per-commit medians, in the order the commits were measured.
+        threshold: Slowdown that counts, as a fraction (0.2 means 20% slower).
+        noise_floor: Smallest slowdown in ms that counts.
+
+    Returns:
+        One entry per key and commit that regressed, oldest first.
+    """
+    regressions: list[Regression] = []
+    for previous, current in pairwise(trends):
+        for key, after in current["timings"].items():
+            before = previous["timings"].get(key)
+            if before is None:
+                continue
+            if after > before * (1 + threshold) and after - before >= noise_floor:
+                regressions.append(
+                    {
+                        "key": key,
+                        "commit": current["commit"],
+                        "previous_commit": previous["commit"],
+                        "before": before,
+                        "after": after,
+                    }
+                )
+    return regressions
+
+
+def _stats_row(label: str, stats: TimingStats) -> str:
+    return (
+        f"{label:<40} {stats['mean']:>8.1f} {stats['p50']:>8.1f} "
+        f"{stats['p95']:>8.1f} {stats['stddev']:>8.1f}"
+    )
+
+
+def print_report(stats: dict[str, TimingStats], runs: int) -> None:
+    rule = "━" * 76
+    print(rule)
+    print(f"Shell Startup Performance over {runs} cold starts (ms)")
+    print(rule)
+    print(f"{'':<40} {'mean':>8} {'p50':>8} {'p95':>8} {'stddev':>8}")
+
+    tags = sorted(key for key in stats if "::" not in key and key not in (TOTAL_KEY, "wall"))
+    for tag in tags:
+        print_colored(_stats_row(f"[{tag}]", stats[tag]), Colors.BOLD)
+        # Most expensive first
+        entries = [key for key in stats if key.startswith(f"{tag}::")]
+        for key in sorted(entries, key=lambda key: -stats[key]["mean"]):
+            print(_stats_row(f"  └─ {key.split('::', 1)[1]}", stats[key]))
+
+    print(rule)
+    if TOTAL_KEY in stats:
+        print(_stats_row("Total startup time", stats[TOTAL_KEY]))
+    print(_stats_row("Process wall time", stats["wall"]))
+    print(rule)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Summarize cold shell startup times")
+    parser.add_argument("--runs", type=int, default=10, help="Shells to start (default: 10)")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    parser.add_argument(
+        "--record",
+        type=Path,
+        default=None,
+        help="Record a warm run's sink file in the history instead of starting shells",
+    )
+    args = parser.parse_args()
+
+    if args.record is not None:
+        timings = parse_sink(args.record.read_text())
+        if TOTAL_KEY not in timings:
+            print_colored(f"shellperf: no total in {args.record}", Colors.RED)
+            sys.exit(1)
+        append_history(make_entry("warm", 1, timings[TOTAL_KEY], timings))
+        return
+
+    if not args.json:
+        print(f"\n🔍 Starting {args.runs} fresh shells...\n")
+    try:
+        runs = run_cold(args.runs)
+    except (OSError, RuntimeError, subprocess.TimeoutExpired) as e:
+        print_colored(f"shellperf: {e}", Colors.RED)
+        sys.exit(1)
+
+    stats = summarize(runs)
+    means = {key: stat["mean"] for key, stat in stats.items() if key != "wall"}
+    append_history(make_entry("cold", len(runs), means.get(TOTAL_KEY, 0.0), means))
+    if args.json:
+        print(json.dumps({"runs": len(runs), "stats": stats}, indent=2))
+    else:
+        print_report(stats, len(runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Line-by-line startup profile from a timestamped zsh xtrace
+
+shellperf --trace (shell/.zsh/shellperf.zsh) calls this to start a cold
+interactive zsh with xtrace on and PS4 set to
+"+$EPOCHREALTIME<TAB>%N<TAB>%i<TAB>%e<TAB>", so every traced line carries when
+it ran, the file or function it is in, its line number there and its
+evaluation depth. Each line is charged the time until the next traced line and
+nested under the line that sourced, evaluated or called it. The result is
+written as a speedscope profile (https://www.speedscope.app) or as collapsed
+stacks for flamegraph.pl, and the slowest lines are printed.
+
+Usage:
+    python -m scripts.shelltrace run                          # Trace a cold start
+    python -m scripts.shelltrace run --format collapsed       # Write collapsed stacks
+    python -m scripts.shelltrace fold startup.trace -o out.json  # Fold an existing trace
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from itertools import pairwise
+from pathlib import Path
+from typing import Optional, TypedDict
+
+from scripts.fsutil import get_state_dir
+from scripts.setup import Colors, print_colored
+from scripts.shellperf import SHELL_COMMAND, SHELL_TIMEOUT_SECONDS
+
+FORMATS = {"speedscope": ".speedscope.json", "collapsed": ".collapsed"}
+DEFAULT_TOP = 15
+
+# Sourced as $ZDOTDIR/.zshenv from a temporary ZDOTDIR: turns tracing on, then
+# points ZDOTDIR back so the real startup files are read as usual
+TRACE_SHIM = """\
+zmodload zsh/datetime
+setopt promptsubst
+PS4=$'+${EPOCHREALTIME}\\t%N\\t%i\\t%e\\t'
+if [[ -n "$SHELLTRACE_ZDOTDIR" ]]; then
+    ZDOTDIR=$SHELLTRACE_ZDOTDIR
+else
+    unset ZDOTDIR
+fi
+unset SHELLTRACE_ZDOTDIR
+setopt xtrace
+if [[ -f "${ZDOTDIR:-$HOME}/.zshenv" ]]; then
+    source "${ZDOTDIR:-$HOME}/.zshenv"
+fi
+"""
+
+# A trace line as PS4 prints it; continuation lines of multi-line commands and
+# anything else the shell wrote to stderr do not match
+TRACE_LINE = re.compile(r"^\+(\d+(?:\.\d+)?)\t([^\t]*)\t(\d+)\t(\d+)\t(.*)$")
+
+
+class TraceLine(TypedDict):
+    time: float
+    # File or function the line is in (%N)
+    name: str
+    line: int
+    # Evaluation depth (%e): sourced files, functions and evals each add one
+    depth: int
+    command: str
+
+
+class TraceSample(TypedDict):
+    # "file:line" frames, outermost first; the last is the line that ran
+    stack: list[str]
+    command: str
+    micros: int
+
+
+class SlowLine(TypedDict):
+    frame: str
+    micros: int
+    # The line's command as first traced
+    command: str
+
+
+def parse_trace(text: str) -> list[TraceLine]:
+    """Read the traced lines out of a zsh xtrace written with our PS4."""
+    lines: list[TraceLine] = []
+    for raw in text.splitlines():
+        match = TRACE_LINE.match(raw)
+        if match:
+            time, name, line, depth, command = match.groups()
+            lines.append(
+                {
+                    "time": float(time),
+                    "name": name,
+                    "line": int(line),
+                    "depth": int(depth),
+                    "command": command,
+                }
+            )
+    return lines
+
+
+def _frame(line: TraceLine, home: str) -> str:
+    name = line["name"]
+    if home and (name == home or name.startswith(home + "/")):
+        name = "~" + name[len(home) :]
+    return f"{name}:{line['line']}"
+
+
+def fold_trace(lines: list[TraceLine], home: Optional[str] = None) -> list[TraceSample]:
+    """Charge each traced line its time and nest it under its caller.
+
+    A line runs until the next traced line starts, so the last line (which has
+    no successor) is dropped. A line's caller is the latest line before it at
+    a lower evaluation depth, i.e. the source, eval or function call it is in.
+
+    Args:
+        lines: Traced lines, in the order they ran.
+        home: Home directory to shorten to ~ in frame names; defaults to $HOME.
+
+    Returns:
+        One sample per traced line, in the order they ran.
+    """
+    home = os.environ.get("HOME", "") if home is None else home
+    samples: list[TraceSample] = []
+    frames: list[tuple[int, str]] = []
+    for current, following in pairwise(lines):
+        while frames and frames[-1][0] >= current["depth"]:
+            frames.pop()
+        frames.append((current["depth"], _frame(current, home)))
+        samples.append(
+            {
+                "stack": [frame for _, frame in frames],
+                "command": current["command"],
+                "micros": max(0, round((following["time"] - current["time"]) * 1_000_000)),
+            }
+        )
+    return samples
+
+
+def to_collapsed(samples: list[TraceSample]) -> str:
+    """Collapsed stacks ("frame;frame;frame micros" per line) for flamegraph.pl."""
+    totals: dict[str, int] = {}
+    for sample in samples:
+        key = ";".join(frame.replace(";", ",") for frame in sample["stack"])
+        totals[key] = totals.get(key, 0) + sample["micros"]
+    return "".join(f"{stack} {micros}\n" for stack, micros in totals.items() if micros > 0)
+
+
+def to_speedscope(samples: list[TraceSample], name: str = "zsh startup") -> dict[str, object]:
+    """A speedscope sampled profile, one sample per traced line in time order."""
+    frame_index: dict[str, int] = {}
+    stacks: list[list[int]] = []
+    for sample in samples:
+        stacks.append(
+            [frame_index.setdefault(frame, len(frame_index)) for frame in sample["stack"]]
+        )
+    weights = [sample["micros"] for sample in samples]
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "scripts/shelltrace.py",
+        "shared": {"frames": [{"name": frame} for frame in frame_index]},
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": name,
+                "unit": "microseconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": stacks,
+                "weights": weights,
+            }
+        ],
+    }
+
+
+def slowest_lines(samples: list[TraceSample], count: int = DEFAULT_TOP) -> list[SlowLine]:
+    """Lines by their own time summed over every run of them, slowest first."""
+    by_frame: dict[str, SlowLine] = {}
+    for sample in samples:
+        frame = sample["stack"][-1]
+        entry = by_frame.setdefault(
+            frame, {"frame": frame, "micros": 0, "command": sample["command"]}
+        )
+        entry["micros"] += sample["micros"]
+    return sorted(by_frame.values(), key=lambda entry: -entry["micros"])[:count]
+
+
+def run_trace(
+    trace_path: Path,
+    command: list[str] = SHELL_COMMAND,
+    timeout: float = SHELL_TIMEOUT_SECONDS,
+) -> None:
+    """Start a cold shell with tracing on and write its trace to trace_path.
+
+    The shell is started with ZDOTDIR pointing at a temporary directory whose
+    .zshenv turns xtrace on before handing back to the real startup files.
+
+    Raises:
+        RuntimeError: If the shell exits non-zero.
+    """
+    trace_path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="shelltrace-") as zdotdir:
+        (Path(zdotdir) / ".zshenv").write_text(TRACE_SHIM)
+        env = {
+            **os.environ,
+            "ZDOTDIR": zdotdir,
+            "SHELLTRACE_ZDOTDIR": os.environ.get("ZDOTDIR", ""),
+        }
+        with open(trace_path, "w") as trace:
+            result = subprocess.run(
+                command,
+                env=env,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=trace,
+                timeout=timeout,
+            )
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} exited {result.returncode}, see {trace_path}")
+
+
+def write_profile(samples: list[TraceSample], output: Path, fmt: str) -> None:
+    output.parent.mkdir(parents=True, exist_ok=True)
+    if fmt == "collapsed":
+        output.write_text(to_collapsed(samples))
+    else:
+        output.write_text(json.dumps(to_speedscope(samples)) + "\n")
+
+
+def print_slowest(samples: list[TraceSample], count: int) -> None:
+    total = sum(sample["micros"] for sample in samples)
+    print_colored(f"Traced {len(samples)} lines, {total / 1000:.1f}ms in total", Colors.BOLD)
+    for entry in slowest_lines(samples, count):
+        command = entry["command"]
+        if len(command) > 60:
+            command = command[:57] + "..."
+        print(f"{entry['micros'] / 1000:>8.2f}ms  {entry['frame']}  {command}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Profile shell startup line by line")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Trace a cold zsh startup and fold it")
+    fold_parser = commands.add_parser("fold", help="Fold an existing trace")
+    fold_parser.add_argument("trace", type=Path, help="Trace written with our PS4")
+    for sub in (run_parser, fold_parser):
+        sub.add_argument("-o", "--output", type=Path, default=None, help="Profile to write")
+        sub.add_argument(
+            "--format", choices=sorted(FORMATS), default="speedscope", help="Profile format"
+        )
+        sub.add_argument(
+            "--top", type=int, default=DEFAULT_TOP, help="Slowest lines to print (default: 15)"
+        )
+    args = parser.parse_args()
+
+    if args.command == "run":
+        trace_path = get_state_dir() / "traces" / f"startup-{datetime.now():%Y%m%d-%H%M%S}.trace"
+        print(f"\n🔍 Tracing a cold zsh startup into {trace_path}...\n")
+        try:
+            run_trace(trace_path)
+        except (OSError, RuntimeError, subprocess.TimeoutExpired) as e:
+            print_colored(f"shelltrace: {e}", Colors.RED)
+            sys.exit(1)
+    else:
+        trace_path = args.trace
+
+    samples = fold_trace(parse_trace(trace_path.read_text(errors="replace")))
+    if not samples:
+        print_colored(f"shelltrace: no traced lines in {trace_path}", Colors.RED)
+        sys.exit(1)
+    output: Path = args.output or trace_path.with_suffix(FORMATS[args.format])
+    write_profile(samples, output, args.format)
+
+    print_slowest(samples, args.top)
+    print_colored(f"\nWrote {output}", Colors.GREEN)
+    if args.format == "speedscope":
+        print("Open it at https://www.speedscope.app or with `npx speedscope`")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Snapshots of everything setup manages in $HOME, for instant rollback
+
+inv setup and inv reset take a snapshot before they change anything and roll
+back to it if they fail; inv snapshot and inv rollback do the same by hand.
+Symlinks are recorded by target and files are reflinked where the filesystem
+supports it (copied otherwise), so taking a snapshot costs next to nothing.
+Files are never hardlinked: setup appends to ~/.zshrc and rewrites generated
+files in place, which would change the snapshot along with them.
+"""
+
+import json
+import os
+import secrets
+import shutil
+import subprocess
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, TypedDict
+
+from scripts.fsutil import clone_file, get_state_dir
+
+SNAPSHOT_KEEP = 10
+
+
+class SnapshotPath(TypedDict):
+    path: str
+    # symlink, file, dir, or missing (did not exist, so rollback removes it)
+    type: str
+    target: str
+    mode: int
+
+
+class Snapshot(TypedDict):
+    id: str
+    created: float
+    reason: str
+    roots: list[str]
+    paths: list[SnapshotPath]
+    gitconfig: dict[str, list[str]]
+
+
+def _git_values(key: str) -> list[str]:
+    result = subprocess.run(
+        ["git", "config", "--global", "--get-all", key], capture_output=True, text=True
+    )
+    return result.stdout.splitlines() if result.returncode == 0 else []
+
+
+class SnapshotStore:
+    """Directory of snapshots, one subdirectory each.
+
+    <id>/snapshot.json describes every captured path and git config key, and
+    <id>/files/<n> holds the content of the n-th captured file. A snapshot is
+    assembled under a temporary name and renamed into place, so a half-written
+    one is never listed.
+
+    Args:
+        root: Snapshot directory; defaults to $XDG_STATE_HOME/dotfiles/snapshots.
+    """
+
+    def __init__(self, root: Optional[Path] = None) -> None:
+        self.root = root or get_state_dir() / "snapshots"
+
+    def create(self, paths: list[Path], git_keys: list[str], reason: str = "") -> Snapshot:
+        """Capture the current state of paths and git config keys.
+
+        Args:
+            paths: Managed paths; directories are captured with their content, and
+                paths that do not exist are recorded as missing.
+            git_keys: Global git config keys to capture every value of.
+            reason: What the snapshot was taken for, shown when listing.
+
+        Returns:
+            The new snapshot.
+        """
+        snapshot_id = f"{datetime.now():%Y%m%d-%H%M%S}-{secrets.token_hex(2)}"
+        tmp_dir = self.root / f".{snapshot_id}.tmp"
+        (tmp_dir / "files").mkdir(parents=True)
+
+        # A path inside another captured directory is captured with it
+        unique = sorted({str(path) for path in paths})
+        roots = [
+            path
+            for path in unique
+            if not any(path.startswith(other + os.sep) for other in unique if other != path)
+        ]
+
+        entries: list[SnapshotPath] = []
+        for root in roots:
+            self._capture(Path(root), tmp_dir / "files", entries)
+
+        snapshot: Snapshot = {
+            "id": snapshot_id,
+            "created": time.time(),
+            "reason": reason,
+            "roots": roots,
+            "paths": entries,
+            "gitconfig": {key: _git_values(key) for key in dict.fromkeys(git_keys)},
+        }
+        (tmp_dir / "snapshot.json").write_text(json.dumps(snapshot, indent=2) + "\n")
+        os.rename(tmp_dir, self.root / snapshot_id)
+        return snapshot
+
+    def _capture(self, path: Path, files_dir: Path, entries: list[SnapshotPath]) -> None:
+        entry: SnapshotPath = {"path": str(path), "type": "missing", "target": "", "mode": 0}
+        if path.is_symlink():
+            entry["type"] = "symlink"
+            entry["target"] = os.readlink(path)
+        elif path.is_dir():
+            entry["type"] = "dir"
+            entry["mode"] = path.stat().st_mode & 0o7777
+        elif path.is_file():
+            stored = files_dir / str(len(entries))
+            clone_file(path, stored, allow_hardlink=False)
+            entry["type"] = "file"
+            entry["target"] = stored.name
+            entry["mode"] = path.stat().st_mode & 0o7777
+        entries.append(entry)
+
+        if entry["type"] == "dir":
+            for child in sorted(path.iterdir()):
+                self._capture(child, files_dir, entries)
+
+    def snapshots(self) -> list[Snapshot]:
+        """Return every complete snapshot, oldest first."""
+        if not self.root.is_dir():
+            return []
+        found: list[Snapshot] = []
+        for entry in sorted(self.root.iterdir()):
+            if not entry.name.startswith(".") and (entry / "snapshot.json").is_file():
+                with open(entry / "snapshot.json") as f:
+                    found.append(json.load(f))
+        return sorted(found, key=lambda snapshot: snapshot["created"])
+
+    def get(self, snapshot_id: Optional[str] = None) -> Snapshot:
+        """Look up a snapshot by id, or the latest one.
+
+        Raises:
+            KeyError: If there is no such snapshot.
+        """
+        snapshots = self.snapshots()
+        if snapshot_id is None:
+            if not snapshots:
+                raise KeyError("no snapshots")
+            return snapshots[-1]
+        for snapshot in snapshots:
+            if snapshot["id"] == snapshot_id:
+                return snapshot
+        raise KeyError(snapshot_id)
+
+    def restore(self, snapshot_id: Optional[str] = None) -> Snapshot:
+        """Put every path and git config key back the way the snapshot found it.
+
+        Each captured path is first rebuilt next to where it belongs, then
+        swapped in with renames, so no path is ever left half restored.
+
+        Args:
+            snapshot_id: Snapshot to restore; the latest if None.
+
+        Returns:
+            The restored snapshot.
+
+        Raises:
+            KeyError: If there is no such snapshot.
+        """
+        snapshot = self.get(snapshot_id)
+        files_dir = self.root / snapshot["id"] / "files"
+
+        by_root: dict[str, list[SnapshotPath]] = {root: [] for root in snapshot["roots"]}
+        for entry in snapshot["paths"]:
+            for root in by_root:
+                if entry["path"] == root or entry["path"].startswith(root + os.sep):
+                    by_root[root].append(entry)
+                    break
+
+        for root, entries in by_root.items():
+            self._restore_root(Path(root), entries, files_dir)
+
+        for key, values in snapshot["gitconfig"].items():
+            if _git_values(key) == values:
+                continue
+            subprocess.run(["git", "config", "--global", "--unset-all", key], capture_output=True)
+            for value in values:
+                subprocess.run(["git", "config", "--global", "--add", key, value], check=True)
+
+        return snapshot
+
+    @staticmethod
+    def _restore_root(root: Path, entries: list[SnapshotPath], files_dir: Path) -> None:
+        staged = root.with_name(f".{root.name}.rollback")
+        old = root.with_name(f".{root.name}.rollback-old")
+        for leftover in (staged, old):
+            _remove(leftover)
+
+        if entries[0]["type"] != "missing":
+            root.parent.mkdir(parents=True, exist_ok=True)
+            for entry in entries:
+                path = staged / Path(entry["path"]).relative_to(root)
+                if entry["type"] == "symlink":
+                    path.symlink_to(entry["target"])
+                elif entry["type"] == "dir":
+                    path.mkdir()
+                    path.chmod(entry["mode"])
+                elif entry["type"] == "file":
+                    clone_file(files_dir / entry["target"], path, allow_hardlink=False)
+                    path.chmod(entry["mode"])
+
+        if root.is_symlink() or root.exists():
+            os.rename(root, old)
+        if entries[0]["type"] != "missing":
+            os.rename(staged, root)
+        _remove(old)
+
+    def prune(self, keep: int = SNAPSHOT_KEEP) -> int:
+        """Delete all but the newest keep snapshots.
+
+        Returns:
+            How many snapshots were deleted.
+        """
+        snapshots = self.snapshots()
+        stale = snapshots[: max(0, len(snapshots) - keep)]
+        for snapshot in stale:
+            shutil.rmtree(self.root / snapshot["id"])
+        return len(stale)
+
+
+def _remove(path: Path) -> None:
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path)
+    elif path.is_symlink() or path.exists():
+        path.unlink()
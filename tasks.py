@@ -1,21 +1,144 @@
+import contextlib
+import fcntl
+import functools
+import hashlib
 import json
 import os
 import platform
+import re
 import shutil
 import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Optional, TypedDict
 
 from invoke.context import Context
 from invoke.tasks import task
 
+from scripts.artifacts import ArtifactCache, artifacts_for, prefetch
+from scripts.backups import BackupStore
+from scripts.bundle import BundleError, create_bundle, extract_bundle, home_state_dir
+from scripts.doctor import (
+    DOCTOR_TIMEOUT_SECONDS,
+    Probe,
+    check_binary,
+    check_git_key,
+    check_record,
+    check_tool,
+    run_probes,
+)
+from scripts.fsutil import get_cache_dir, get_state_dir, hash_file
+from scripts.setup import (
+    MANIFEST_KINDS,
+    InstallManifest,
+    ManifestRecord,
+    SkillCatalog,
+    ToolsConfig,
+    repo_commit,
+)
+from scripts.shellperf import (
+    REGRESSION_THRESHOLD,
+    SHELLPERF_BUDGET_MS,
+    TOTAL_KEY,
+    commit_trends,
+    find_regressions,
+    load_history,
+)
+from scripts.snapshots import Snapshot, SnapshotStore
+
 REPO_DIR = Path(__file__).parent
 
 ZSHRC_TOOL_MARKER = "# Tools install themselves below this line"
 
 COMPONENTS = ["terminal", "direnv", "git", "lazygit", "rectangle", "shell"]
 
+# What each component needs to have finished before it starts. Everything else
+# only needs the platform bootstrap, so it runs concurrently with the rest.
+COMPONENT_DEPS: dict[str, list[str]] = {
+    "terminal": [],
+    "direnv": [],
+    "git": [],
+    "lazygit": [],
+    "rectangle": [],
+    # ~/.zshrc hooks starship, fnm and direnv, so install those first
+    "shell": ["terminal", "direnv"],
+}
+
+# scripts/setup.py, scheduled with the components once shell has run
+AI_SETUP = "ai"
+
+
+class ComponentProbe(TypedDict):
+    binaries: list[str]
+    paths: list[str]
+
+
+# What each component installs or links, checked without spawning anything: a
+# binary's resolved path and mtime, and each $HOME path's link target or mtime.
+COMPONENT_PROBES: dict[str, ComponentProbe] = {
+    "terminal": {
+        "binaries": ["uv", "fnm", "pnpm", "starship", "ghostty", "terminal-notifier", "mole"],
+        "paths": [".config/ghostty", ".config/starship.toml"],
+    },
+    "direnv": {"binaries": ["direnv"], "paths": [".config/direnv/direnvrc"]},
+    "git": {"binaries": ["git"], "paths": [".gitignore_global", ".gitconfig"]},
+    "lazygit": {"binaries": ["lazygit"], "paths": []},
+    "rectangle": {
+        "binaries": [],
+        "paths": ["Library/Preferences/com.knollsoft.Rectangle.plist"],
+    },
+    "shell": {"binaries": ["zsh"], "paths": [".zprofile", ".zshrc"]},
+}
+
+
+class ComponentPackages(TypedDict):
+    brew: list[str]
+    cask: list[str]
+    apt: list[str]
+    # Not in every Debian/Ubuntu release, so skipped when apt has no candidate
+    apt_optional: list[str]
+
+
+# System packages each component needs. inv setup installs the ones missing for
+# every component it is about to run in one transaction, so the component
+# scripts find them already installed instead of each refreshing the apt index
+# or calling brew on their own. Anything from a third-party source (ghostty on
+# Linux) or an upstream installer stays in the component script.
+COMPONENT_PACKAGES: dict[str, ComponentPackages] = {
+    "terminal": {
+        "brew": ["fnm", "starship", "zsh-completions", "terminal-notifier", "mole"],
+        "cask": ["ghostty"],
+        "apt": [],
+        "apt_optional": ["zsh-completions"],
+    },
+    "direnv": {"brew": ["direnv"], "cask": [], "apt": ["direnv"], "apt_optional": []},
+    "lazygit": {"brew": ["lazygit"], "cask": [], "apt": [], "apt_optional": []},
+    "rectangle": {"brew": [], "cask": ["rectangle"], "apt": [], "apt_optional": []},
+    "shell": {"brew": [], "cask": [], "apt": ["zsh"], "apt_optional": []},
+}
+
+PROGRESS_INTERVAL_SECONDS = 0.5
+LOG_TAIL_LINES = 20
+
+
+def _load_tools_config() -> ToolsConfig:
+    with open(REPO_DIR / "ai" / "tools.json") as f:
+        config: ToolsConfig = json.load(f)
+    return config
+
 
 def _load_ai_tool_paths() -> list[str]:
     """Derive all managed AI tool paths from ai/tools.json.
@@ -26,9 +149,7 @@ def _load_ai_tool_paths() -> list[str]:
     Returns:
         List of paths relative to $HOME (e.g. ".claude/CLAUDE.md").
     """
-    config_path = REPO_DIR / "ai" / "tools.json"
-    with open(config_path) as f:
-        config = json.load(f)
+    config = _load_tools_config()
 
     paths: list[str] = []
     for tool in config.get("tools", {}).values():
@@ -130,111 +251,751 @@ def _setup_platform(ctx: Context) -> None:
     print()
 
 
-def _run_component(ctx: Context, component: str) -> None:
+def _collect_packages(components: list[str]) -> ComponentPackages:
+    """Merge the system packages the given components need, without duplicates.
+
+    Args:
+        components: Component names; ones without COMPONENT_PACKAGES are ignored.
+
+    Returns:
+        Every package per kind, in component order.
+    """
+    merged: ComponentPackages = {"brew": [], "cask": [], "apt": [], "apt_optional": []}
+    for component in components:
+        packages = COMPONENT_PACKAGES.get(component)
+        if packages is None:
+            continue
+        for kind in ("brew", "cask", "apt", "apt_optional"):
+            merged[kind] += [name for name in packages[kind] if name not in merged[kind]]
+    merged["apt_optional"] = [name for name in merged["apt_optional"] if name not in merged["apt"]]
+    return merged
+
+
+def _installed_apt_packages(names: list[str]) -> set[str]:
+    # dpkg-query exits non-zero when any name is unknown, but still lists the rest
+    result = subprocess.run(
+        ["dpkg-query", "-W", "-f=${Package} ${Status}\\n", *names],
+        capture_output=True,
+        text=True,
+    )
+    return {
+        line.split()[0]
+        for line in result.stdout.splitlines()
+        if line.endswith("install ok installed")
+    }
+
+
+def _installed_brew_packages(cask: bool) -> set[str]:
+    result = subprocess.run(
+        ["brew", "list", "--cask" if cask else "--formula", "-1"],
+        capture_output=True,
+        text=True,
+    )
+    return set(result.stdout.split())
+
+
+def _distro_key() -> str:
+    try:
+        release = platform.freedesktop_os_release()
+    except OSError:
+        return f"unknown-{platform.machine()}"
+    return f"{release.get('ID', 'linux')}-{release.get('VERSION_ID', '')}-{platform.machine()}"
+
+
+def _load_unavailable_apt_packages() -> set[str]:
+    """Optional apt packages this distro is known not to have.
+
+    Recorded per distro release and architecture, so they are looked up again
+    after an upgrade. Delete apt-unavailable.json in the state dir to recheck
+    sooner, e.g. after adding a repository.
+    """
+    try:
+        with open(get_state_dir() / "apt-unavailable.json") as f:
+            state: dict[str, list[str]] = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    return set(state.get(_distro_key(), []))
+
+
+def _save_unavailable_apt_packages(names: set[str]) -> None:
+    path = get_state_dir() / "apt-unavailable.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps({_distro_key(): sorted(names)}, indent=2) + "\n")
+    tmp_path.replace(path)
+
+
+def _install_packages(ctx: Context, components: list[str]) -> None:
+    """Install the system packages of the given components in one transaction.
+
+    On Linux that is a single apt-get update followed by a single apt-get
+    install; on macOS a single brew bundle. Failures only warn: the component
+    scripts still install what they need themselves if it is missing. Optional
+    apt packages the distro does not have are remembered, so they do not
+    trigger an index refresh on every run.
+
+    Args:
+        ctx: Invoke context for running shell commands.
+        components: Components about to run.
+    """
+    packages = _collect_packages(components)
+    system = platform.system()
+
+    if system == "Linux":
+        wanted = packages["apt"] + packages["apt_optional"]
+        if not wanted:
+            return
+        installed = _installed_apt_packages(wanted)
+        missing = [name for name in packages["apt"] if name not in installed]
+        unavailable = _load_unavailable_apt_packages()
+        optional = [
+            name
+            for name in packages["apt_optional"]
+            if name not in installed and name not in unavailable
+        ]
+        if not missing and not optional:
+            print("✓ System packages already installed")
+            print()
+            return
+
+        print(f"📦 Installing system packages: {' '.join(missing + optional)}")
+        update = ctx.run("sudo apt-get update -qq", pty=True, warn=True)
+        # Component scripts skip their own index refresh (see apt_install)
+        os.environ["DOTFILES_APT_UPDATED"] = "1"
+        without_candidate = []
+        for name in optional:
+            result = ctx.run(f"apt-cache show {name}", hide=True, warn=True)
+            if result is not None and result.ok:
+                missing.append(name)
+            else:
+                without_candidate.append(name)
+        # A failed refresh says nothing about what the distro has
+        if without_candidate and update is not None and update.ok:
+            _save_unavailable_apt_packages(unavailable | set(without_candidate))
+        if missing:
+            result = ctx.run(f"sudo apt-get install -y {' '.join(missing)}", pty=True, warn=True)
+            if result is None or not result.ok:
+                print("  ⚠️  Package install failed, components will retry on their own")
+        print()
+
+    elif system == "Darwin":
+        if not packages["brew"] and not packages["cask"]:
+            return
+        formulae = _installed_brew_packages(cask=False) if packages["brew"] else set()
+        casks = _installed_brew_packages(cask=True) if packages["cask"] else set()
+        brewfile = [f'brew "{name}"' for name in packages["brew"] if name not in formulae]
+        brewfile += [f'cask "{name}"' for name in packages["cask"] if name not in casks]
+        if not brewfile:
+            print("✓ System packages already installed")
+            print()
+            return
+
+        print(f"📦 Installing {len(brewfile)} Homebrew package(s)...")
+        with tempfile.NamedTemporaryFile("w", suffix=".Brewfile") as f:
+            f.write("\n".join(brewfile) + "\n")
+            f.flush()
+            result = ctx.run(f"brew bundle --file={f.name}", pty=True, warn=True)
+        if result is None or not result.ok:
+            print("  ⚠️  brew bundle failed, components will retry on their own")
+        print()
+
+
+def _component_env(offline: bool = False) -> dict[str, str]:
+    env = {"REPO_DIR": str(REPO_DIR), "DOTFILES_PYTHON": sys.executable}
+    if offline:
+        env["DOTFILES_OFFLINE"] = "1"
+    return env
+
+
+def _run_component(ctx: Context, component: str, offline: bool = False) -> bool:
+    if component == AI_SETUP:
+        print()
+        print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+        print("AI CLI Tools Setup")
+        print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+        print()
+        result = ctx.run("python scripts/setup.py", pty=True, warn=True)
+        return result is not None and result.ok
+
     script = REPO_DIR / component / "setup"
     if not script.exists():
         print(f"Warning: {script} not found, skipping")
-        return
-    ctx.run(str(script), env={"REPO_DIR": str(REPO_DIR)}, pty=True)
+        return True
+    result = ctx.run(str(script), env=_component_env(offline), pty=True, warn=True)
+    return result is not None and result.ok
+
+
+def _probe_path(path: Path) -> str:
+    try:
+        st = path.lstat()
+    except OSError:
+        return "missing"
+    if path.is_symlink():
+        return f"link:{os.readlink(path)}"
+    return f"{st.st_mode:o}:{st.st_size}:{st.st_mtime_ns}"
+
 
+def _component_fingerprint(component: str, commit: str) -> str:
+    """Summarize everything that decides whether a component needs to run again.
 
-def _teardown() -> None:
+    Covers the repo commit, the content of the component's files and
+    lib/platform.sh, the resolved path and mtime of each binary it installs,
+    and the state of each path it manages in $HOME. Only stat/read calls are
+    made, so this is cheap enough to run for every component on every setup.
+
+    Args:
+        component: Component name (a key of COMPONENT_PROBES).
+        commit: The repo's checked-out commit.
+
+    Returns:
+        A hex digest that changes whenever any of those inputs change.
+    """
+    digest = hashlib.sha256(f"{platform.system()}\0{commit}\0".encode())
+
+    component_dir = REPO_DIR / component
+    files = sorted(path for path in component_dir.rglob("*") if path.is_file())
+    for path in [REPO_DIR / "lib" / "platform.sh", *files]:
+        digest.update(f"{path.relative_to(REPO_DIR)}\0".encode())
+        digest.update(path.read_bytes() if path.is_file() else b"missing")
+
+    probe = COMPONENT_PROBES.get(component, {"binaries": [], "paths": []})
+    for binary in probe["binaries"]:
+        resolved = shutil.which(binary)
+        digest.update(f"{binary}\0{resolved}\0".encode())
+        if resolved:
+            digest.update(_probe_path(Path(resolved).resolve()).encode())
     home = Path.home()
+    for rel_path in probe["paths"]:
+        digest.update(f"{rel_path}\0{_probe_path(home / rel_path)}\0".encode())
 
-    print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
-    print("Removing existing configurations")
-    print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    return digest.hexdigest()
+
+
+def _load_component_state() -> dict[str, str]:
+    try:
+        with open(get_state_dir() / "components.json") as f:
+            state: dict[str, str] = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state
+
+
+def _save_component_state(state: dict[str, str]) -> None:
+    path = get_state_dir() / "components.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(state, indent=2, sort_keys=True) + "\n")
+    tmp_path.replace(path)
+
+
+def _component_command(component: str) -> list[str]:
+    if component == AI_SETUP:
+        return [sys.executable, str(REPO_DIR / "scripts" / "setup.py")]
+    return [str(REPO_DIR / component / "setup")]
+
+
+def _run_component_logged(component: str, log_path: Path, offline: bool = False) -> bool:
+    """Run a component with its output captured to a log file instead of the terminal.
+
+    Args:
+        component: Component name, or AI_SETUP for scripts/setup.py.
+        log_path: File to write the component's stdout and stderr to.
+        offline: Have the component install only from the artifact cache.
+
+    Returns:
+        True if the component exited successfully.
+    """
+    command = _component_command(component)
+    if not Path(command[-1]).exists():
+        log_path.write_text(f"Warning: {command[-1]} not found, skipping\n")
+        return True
+    with open(log_path, "w") as log:
+        result = subprocess.run(
+            command,
+            cwd=REPO_DIR,
+            env={**os.environ, **_component_env(offline)},
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+    return result.returncode == 0
+
+
+def _prefetch_artifacts(components: list[str]) -> None:
+    """Download the installers and releases the given components need, concurrently.
+
+    Failures are only reported here; the component that needs the artifact
+    retries the download itself and fails if it still cannot get it.
+
+    Args:
+        components: Components about to run.
+    """
+    names = artifacts_for(components)
+    if not names:
+        return
+    print(f"📦 Prefetching {len(names)} installer(s) and release(s)...")
+    for name, error in prefetch(ArtifactCache(), names).items():
+        print(f"  ⚠️  {name}: {error}")
     print()
 
-    zprofile = home / ".zprofile"
-    if zprofile.exists() or zprofile.is_symlink():
-        print(f"  → Removing {zprofile}")
-        zprofile.unlink()
-
-    zshrc = home / ".zshrc"
-    if zshrc.is_file() and not zshrc.is_symlink():
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup = home / f".zshrc.backup.{timestamp}"
-        print(f"  → Backing up {zshrc} to {backup}")
-        shutil.copy2(zshrc, backup)
-    if zshrc.exists() or zshrc.is_symlink():
-        zshrc.unlink()
-
-    direnvrc = home / ".config" / "direnv" / "direnvrc"
-    if direnvrc.exists() or direnvrc.is_symlink():
-        print(f"  → Removing {direnvrc}")
-        direnvrc.unlink()
-
-    gitignore = home / ".gitignore_global"
-    if gitignore.exists() or gitignore.is_symlink():
-        print(f"  → Removing {gitignore}")
-        gitignore.unlink()
-
-    print("  → Resetting git global config")
-    subprocess.run(
-        ["git", "config", "--global", "--unset", "core.excludesfile"],
-        capture_output=True,
-    )
-    subprocess.run(
-        ["git", "config", "--global", "--unset", "include.path"],
-        capture_output=True,
-    )
 
-    ghostty = home / ".config" / "ghostty"
-    if ghostty.is_symlink():
-        print(f"  → Removing {ghostty} symlink")
-        ghostty.unlink()
-    elif ghostty.is_dir():
-        print(f"  → Removing {ghostty} directory")
-        shutil.rmtree(ghostty)
+def _topological_order(deps: dict[str, list[str]]) -> list[str]:
+    """Order components so each comes after everything it depends on.
 
-    starship = home / ".config" / "starship.toml"
-    if starship.exists() or starship.is_symlink():
-        print(f"  → Removing {starship}")
-        starship.unlink()
+    Components keep their declaration order wherever dependencies allow it.
+
+    Args:
+        deps: Map of component name to the components it depends on.
 
+    Returns:
+        Component names in a valid run order.
+
+    Raises:
+        ValueError: If a dependency is unknown or the dependencies form a cycle.
+    """
+    for name, needs in deps.items():
+        unknown = [need for need in needs if need not in deps]
+        if unknown:
+            raise ValueError(f"{name} depends on unknown component(s): {', '.join(unknown)}")
+
+    order: list[str] = []
+    remaining = list(deps)
+    while remaining:
+        ready = [name for name in remaining if all(need in order for need in deps[name])]
+        if not ready:
+            raise ValueError(f"Dependency cycle between: {', '.join(remaining)}")
+        order.extend(ready)
+        remaining = [name for name in remaining if name not in ready]
+    return order
+
+
+class SetupProgress:
+    """Prints component start/finish events and, on a terminal, a live status line.
+
+    Args:
+        log_dir: Where component logs are written, for pointing at failures.
+        quiet: Components whose start/finish should not be reported.
+    """
+
+    def __init__(self, log_dir: Optional[Path] = None, quiet: Optional[set[str]] = None) -> None:
+        self.log_dir = log_dir
+        self.quiet = quiet or set()
+        self.live = sys.stdout.isatty()
+        self._started: dict[str, float] = {}
+        self._running: list[str] = []
+
+    def _print(self, line: str) -> None:
+        if self.live:
+            print("\r\033[K", end="")
+        print(line)
+
+    def start(self, name: str) -> None:
+        if name in self.quiet:
+            return
+        self._started[name] = time.monotonic()
+        self._running.append(name)
+        self._print(f"  ▶ {name}")
+
+    def finish(self, name: str, status: str) -> None:
+        if name in self.quiet:
+            return
+        elapsed = time.monotonic() - self._started.get(name, time.monotonic())
+        if name in self._running:
+            self._running.remove(name)
+
+        if status == "ok":
+            self._print(f"  ✓ {name} ({elapsed:.1f}s)")
+        elif status == "failed":
+            self._print(f"  ✗ {name} failed after {elapsed:.1f}s")
+            if self.log_dir is not None:
+                log_path = self.log_dir / f"{name}.log"
+                lines = (
+                    log_path.read_text(errors="replace").splitlines() if log_path.exists() else []
+                )
+                for line in lines[-LOG_TAIL_LINES:]:
+                    print(f"      {line}")
+                print(f"      Full log: {log_path}")
+        elif status == "skipped":
+            self._print(f"  ↷ {name} skipped (a dependency failed)")
+        else:
+            self._print(f"  ↷ {name} not started (stopping after failure)")
+
+    def tick(self) -> None:
+        if not self.live or not self._running:
+            return
+        now = time.monotonic()
+        running = ", ".join(f"{name} {now - self._started[name]:.0f}s" for name in self._running)
+        print(f"\r\033[K  ⏳ {running}", end="", flush=True)
+
+
+def _run_graph(
+    deps: dict[str, list[str]],
+    run: Callable[[str], bool],
+    jobs: int = 1,
+    keep_going: bool = False,
+    progress: Optional[SetupProgress] = None,
+) -> dict[str, str]:
+    """Run components as soon as their dependencies succeed, up to jobs at a time.
+
+    Args:
+        deps: Map of component name to the components it depends on.
+        run: Runs one component and returns whether it succeeded.
+        jobs: Maximum number of components running at once.
+        keep_going: Keep starting independent components after a failure instead
+            of stopping once the running ones finish.
+        progress: Receives start/finish events, if given.
+
+    Returns:
+        Status of every component: "ok", "failed", "skipped" (a dependency did
+        not succeed) or "cancelled" (not started because of an earlier failure).
+    """
+    pending = _topological_order(deps)
+    status: dict[str, str] = {}
+    running: dict[Future[bool], str] = {}
+    stopping = False
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while pending or running:
+            for name in list(pending):
+                needs = deps[name]
+                if any(status.get(need, "ok") != "ok" for need in needs if need in status):
+                    status[name] = "skipped"
+                elif stopping:
+                    status[name] = "cancelled"
+                elif len(running) < max(1, jobs) and all(status.get(n) == "ok" for n in needs):
+                    if progress is not None:
+                        progress.start(name)
+                    running[pool.submit(run, name)] = name
+                else:
+                    continue
+                pending.remove(name)
+                if name in status and progress is not None:
+                    progress.finish(name, status[name])
+
+            if not running:
+                continue
+            done, _ = wait(running, timeout=PROGRESS_INTERVAL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    ok = future.result()
+                except Exception as e:
+                    print(f"  ⚠️  {name}: {e}")
+                    ok = False
+                status[name] = "ok" if ok else "failed"
+                stopping = stopping or (not ok and not keep_going)
+                if progress is not None:
+                    progress.finish(name, status[name])
+            if not done and progress is not None:
+                progress.tick()
+
+    return status
+
+
+class SetupSteps:
+    """The setup steps of one $HOME: every component plus the AI tools setup.
+
+    Components whose fingerprint matches the one recorded after their last
+    successful run are cached and skipped; the rest run in dependency order,
+    and their new fingerprints are saved once the run is over.
+
+    Args:
+        force: Treat every component as changed.
+    """
+
+    def __init__(self, force: bool = False) -> None:
+        self.commit = repo_commit(REPO_DIR)
+        self.state = _load_component_state()
+        # scripts/setup.py appends its aliases to the ~/.zshrc that shell writes
+        self.deps = {**COMPONENT_DEPS, AI_SETUP: ["shell"]}
+        self.cached: set[str] = set()
+        if not force:
+            self.cached = {
+                name
+                for name in COMPONENT_DEPS
+                if self.state.get(name) == _component_fingerprint(name, self.commit)
+            }
+        self._lock = threading.Lock()
+
+    def to_run(self) -> list[str]:
+        return [name for name in self.deps if name not in self.cached]
+
+    def run(
+        self,
+        run: Callable[[str], bool],
+        jobs: int = 1,
+        keep_going: bool = False,
+        progress: Optional[SetupProgress] = None,
+    ) -> dict[str, str]:
+        """Run every step that is not cached, then record the new fingerprints.
+
+        Args:
+            run: Runs one component (or AI_SETUP) and returns whether it succeeded.
+            jobs: Maximum number of steps running at once.
+            keep_going: After a failure, keep running steps that do not depend on it.
+            progress: Receives start/finish events, if given.
+
+        Returns:
+            Status of every step, as returned by _run_graph(); cached steps are "ok".
+        """
+
+        def run_step(name: str) -> bool:
+            if name in self.cached:
+                return True
+            ok = run(name)
+            if ok and name in COMPONENT_DEPS:
+                fingerprint = _component_fingerprint(name, self.commit)
+                with self._lock:
+                    self.state[name] = fingerprint
+            return ok
+
+        status = _run_graph(
+            self.deps, run_step, jobs=jobs, keep_going=keep_going, progress=progress
+        )
+        _save_component_state(self.state)
+        InstallManifest().compact()
+        return status
+
+
+TEARDOWN_JOBS = 8
+
+# Paths the component scripts manage, relative to $HOME, for installs that
+# predate the install manifest and for snapshots taken before the first setup
+DEFAULT_COMPONENT_PATHS = {
+    ".zprofile": "shell",
+    ".zshrc": "shell",
+    ".config/direnv/direnvrc": "direnv",
+    ".gitignore_global": "git",
+    ".config/ghostty": "terminal",
+    ".config/starship.toml": "terminal",
+    "Library/Preferences/com.knollsoft.Rectangle.plist": "rectangle",
+}
+
+SNAPSHOT_GIT_KEYS = ["include.path", "core.excludesfile"]
+
+
+def _ai_component(tool_id: str) -> str:
+    # Install manifest component of an AI tool (see tool_manifest_records)
+    return f"{AI_SETUP}:{tool_id}"
+
+
+def _legacy_manifest_records() -> list[ManifestRecord]:
+    """Describe a default install, for setups that predate the install manifest.
+
+    Returns:
+        Records for the well-known component paths and the AI tool paths from
+        ai/tools.json that currently exist, and for the git config keys.
+    """
+    home = Path.home()
+    components = dict(DEFAULT_COMPONENT_PATHS)
+    tool_dirs = {
+        tool_id: tool["config_dir"].removeprefix("~/") + "/"
+        for tool_id, tool in _load_tools_config().get("tools", {}).items()
+    }
     for rel_path in _load_ai_tool_paths():
+        tool_id = next((t for t, d in tool_dirs.items() if rel_path.startswith(d)), "")
+        components[rel_path] = _ai_component(tool_id)
+
+    records: list[ManifestRecord] = []
+    for rel_path, component in components.items():
         path = home / rel_path
         if path.is_symlink():
-            print(f"  → Removing AI symlink: {path}")
-            path.unlink()
+            kind, expected = "symlink", os.readlink(path)
         elif path.is_dir():
-            print(f"  → Removing AI config: {path}")
-            shutil.rmtree(path)
+            kind, expected = "tree", ""
         elif path.is_file():
-            print(f"  → Removing AI config: {path}")
+            kind, expected = "file", "" if rel_path == ".zshrc" else hash_file(path)
+        else:
+            continue
+        records.append(
+            {"kind": kind, "path": str(path), "expected": expected, "component": component}
+        )
+
+    for key in ("core.excludesfile", "include.path"):
+        records.append({"kind": "gitconfig", "path": key, "expected": "", "component": "git"})
+    return records
+
+
+def _remove_artifact(record: ManifestRecord, store: BackupStore) -> str:
+    """Remove one installed artifact, if it is still what setup left there.
+
+    Args:
+        record: Manifest record of the artifact (any kind but gitconfig).
+        store: Backup store for files that changed since setup wrote them.
+
+    Returns:
+        What was done, for printing; empty if the artifact was already gone.
+    """
+    path = Path(record["path"])
+    kind = record["kind"]
+    try:
+        if path.is_symlink():
+            if kind != "symlink":
+                return f"  ⚠️  Leaving {path}: replaced by a symlink"
+            if os.readlink(path) != record["expected"]:
+                return f"  ⚠️  Leaving {path}: now points to {os.readlink(path)}"
+            path.unlink()
+        elif not path.exists():
+            return ""
+        elif kind == "file":
+            if not record["expected"] or hash_file(path) != record["expected"]:
+                entry = store.backup(path)
+                return f"  → Backed up {path} to backup store ({entry['id']})"
             path.unlink()
+        elif kind == "tree":
+            # Older manifests did not record what in a generated directory setup
+            # wrote, so keep all of it rather than delete a user's files with it
+            entry = store.backup(path)
+            return f"  → Backed up {path} to backup store ({entry['id']})"
+        elif kind == "dir":
+            try:
+                path.rmdir()
+            except OSError:
+                return f"  ⚠️  Leaving {path}: contains files setup did not create"
+        else:
+            return f"  ⚠️  Leaving {path}: no longer a {kind}"
+    except FileNotFoundError:
+        return ""
+    return f"  → Removing {path}"
 
-    print("  ✓ All configurations removed")
+
+def _teardown(selected: Optional[set[str]] = None) -> None:
+    """Remove everything setup installed, as recorded in the install manifest.
+
+    Links and legacy generated trees (which are backed up whole) are handled
+    concurrently, skipping records that sit inside such a tree. Files are then
+    removed (or backed up, if they changed since setup wrote them), directories
+    removed once empty, deepest first, and git config values unset one by one,
+    since git locks the config file on every write. Anything that no longer matches its
+    record was replaced by someone else and is left alone.
+
+    Args:
+        selected: Manifest components to remove (component names, and
+            "ai:<tool_id>" for AI tools); everything if None. Records of other
+            components stay in the manifest.
+    """
+    print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    print("Removing existing configurations")
+    print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+    print()
+
+    manifest = InstallManifest()
+    records = manifest.records()
+    if not records:
+        print("  ℹ️  No install manifest, removing the default paths")
+        records = _legacy_manifest_records()
+    kept: list[ManifestRecord] = []
+    if selected is not None:
+        kept = [record for record in records if record["component"] not in selected]
+        records = [record for record in records if record["component"] in selected]
+
+    trees = [Path(r["path"]) for r in records if r["kind"] == "tree"]
+    by_kind: dict[str, list[ManifestRecord]] = {kind: [] for kind in MANIFEST_KINDS}
+    for record in records:
+        path = Path(record["path"])
+        if record["kind"] != "gitconfig" and any(tree in path.parents for tree in trees):
+            continue
+        by_kind[record["kind"]].append(record)
+
+    store = BackupStore()
+    concurrent = by_kind["symlink"] + by_kind["tree"]
+    with ThreadPoolExecutor(max_workers=TEARDOWN_JOBS) as pool:
+        messages = list(pool.map(lambda record: _remove_artifact(record, store), concurrent))
+    messages += [_remove_artifact(record, store) for record in by_kind["file"]]
+    dirs = sorted(by_kind["dir"], key=lambda record: -len(Path(record["path"]).parts))
+    messages += [_remove_artifact(record, store) for record in dirs]
+    for message in messages:
+        if message:
+            print(message)
+
+    if by_kind["gitconfig"]:
+        print("  → Resetting git global config")
+    for record in by_kind["gitconfig"]:
+        command = ["git", "config", "--global", "--unset-all", record["path"]]
+        if record["expected"]:
+            command += ["--fixed-value", record["expected"]]
+        subprocess.run(command, capture_output=True)
+
+    manifest.rewrite(kept)
+    print("  ✓ All configurations removed" if selected is None else "  ✓ Configurations removed")
     print()
 
 
 @task
-def setup(ctx: Context) -> None:
+def setup(
+    ctx: Context,
+    jobs: int = 4,
+    keep_going: bool = False,
+    force: bool = False,
+    offline: bool = False,
+    rollback: bool = True,
+) -> None:
     """Run full development environment setup.
 
-    Detects the platform, runs each component setup script (terminal, direnv,
-    git, lazygit, shell), then configures AI CLI tools via scripts/setup.py.
+    Detects the platform, then runs the component setup scripts (terminal,
+    direnv, git, lazygit, rectangle, shell) and the AI CLI tools setup
+    (scripts/setup.py). Components start as soon as the ones they depend on
+    (COMPONENT_DEPS) have finished, up to jobs at a time. With more than one
+    job, each component's output goes to its own log under the state dir.
+
+    A component is skipped when its fingerprint (repo commit, component files,
+    installed binaries and managed paths) matches the one recorded after its
+    last successful run. Installers and release downloads the remaining
+    components need are prefetched concurrently into the artifact cache first,
+    and their system packages (COMPONENT_PACKAGES) installed in one apt or brew
+    transaction.
+
+    Every managed path is snapshotted first, and restored if setup fails.
 
     Args:
         ctx: Invoke context for running shell commands.
+        jobs: Maximum number of components to run at once; 1 runs them in
+            order with their output streamed to the terminal.
+        keep_going: After a failure, keep running components that do not depend
+            on the failed one.
+        force: Run every component even if nothing changed since its last run.
+        offline: Install only from the artifact cache, without downloading anything
+            or running the batched package install.
+        rollback: Snapshot managed paths first and roll back to them on failure.
     """
     print("======================================")
     print("Development Environment Setup")
     print("======================================")
     print()
 
-    _setup_platform(ctx)
-
-    for component in COMPONENTS:
-        _run_component(ctx, component)
+    with _rollback_on_failure("setup", rollback):
+        _setup_platform(ctx)
+
+        steps = SetupSteps(force)
+        if steps.cached:
+            cached = ", ".join(n for n in COMPONENT_DEPS if n in steps.cached)
+            print(f"✓ Already up to date: {cached}")
+            print()
+
+        to_run = steps.to_run()
+        if not offline:
+            _install_packages(ctx, to_run)
+            _prefetch_artifacts(to_run)
+
+        if jobs > 1:
+            log_dir = get_state_dir() / "logs"
+            log_dir.mkdir(parents=True, exist_ok=True)
+            if platform.system() == "Linux" and sys.stdin.isatty() and len(to_run) > 1:
+                # Ask for the sudo password once, before output is captured to logs
+                ctx.run("sudo -v", pty=True, warn=True)
+            print(f"Running {len(to_run)} setup steps, up to {jobs} at a time (logs in {log_dir})")
+            status = steps.run(
+                lambda n: _run_component_logged(n, log_dir / f"{n}.log", offline),
+                jobs=jobs,
+                keep_going=keep_going,
+                progress=SetupProgress(log_dir, quiet=steps.cached),
+            )
+        else:
+            status = steps.run(lambda n: _run_component(ctx, n, offline), keep_going=keep_going)
 
-    print()
-    print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
-    print("AI CLI Tools Setup")
-    print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
-    print()
-    ctx.run("python scripts/setup.py", pty=True)
+        failed = [name for name, result in status.items() if result == "failed"]
+        if failed:
+            raise SystemExit(f"⚠️  Setup failed: {', '.join(failed)}")
 
     print()
     print("======================================")
@@ -244,25 +1005,146 @@ def setup(ctx: Context) -> None:
     print("Please restart your terminal or run: source ~/.zshrc")
 
 
+def _managed_paths() -> tuple[list[Path], list[str]]:
+    """Everything setup manages or is about to create, for snapshots.
+
+    Returns:
+        Paths from the install manifest, the default component and AI tool
+        paths, and setup's own state files; and the global git config keys.
+    """
+    home = Path.home()
+    records = InstallManifest().records()
+    paths = {Path(r["path"]) for r in records if r["kind"] != "gitconfig"}
+    paths.update(home / rel_path for rel_path in DEFAULT_COMPONENT_PATHS)
+    paths.update(home / rel_path for rel_path in _load_ai_tool_paths())
+    state_dir = get_state_dir()
+    paths.update([state_dir / "manifest.tsv", state_dir / "components.json"])
+
+    git_keys = SNAPSHOT_GIT_KEYS + [r["path"] for r in records if r["kind"] == "gitconfig"]
+    return sorted(paths), list(dict.fromkeys(git_keys))
+
+
+def _take_snapshot(reason: str) -> Snapshot:
+    store = SnapshotStore()
+    paths, git_keys = _managed_paths()
+    snapshot = store.create(paths, git_keys, reason=reason)
+    store.prune()
+    print(f"📸 Snapshot {snapshot['id']} ({len(snapshot['paths'])} paths)")
+    print()
+    return snapshot
+
+
+@contextlib.contextmanager
+def _rollback_on_failure(reason: str, enabled: bool = True) -> Iterator[None]:
+    """Snapshot every managed path, and restore the snapshot if the block fails.
+
+    Args:
+        reason: What is about to run, recorded with the snapshot.
+        enabled: Run the block without a snapshot if False.
+    """
+    if not enabled:
+        yield
+        return
+
+    snapshot = _take_snapshot(reason)
+    try:
+        yield
+    except BaseException:
+        print()
+        print(f"↩️  {reason} failed, rolling back to snapshot {snapshot['id']}")
+        SnapshotStore().restore(snapshot["id"])
+        raise
+
+
+def _parse_reset_selection(only: str) -> tuple[list[str], list[str]]:
+    """Split a reset --only value into components and AI tool ids.
+
+    Args:
+        only: Comma-separated component names, AI tool ids, or "ai" for all tools.
+
+    Returns:
+        Selected components in dependency order, and selected AI tool ids.
+
+    Raises:
+        SystemExit: If a name is neither a component nor an AI tool.
+    """
+    tools = list(_load_tools_config().get("tools", {}))
+    names = [name.strip() for name in only.split(",") if name.strip()]
+    for name in names:
+        if name not in COMPONENT_DEPS and name not in tools and name != AI_SETUP:
+            raise SystemExit(
+                f"⚠️  Unknown component or AI tool: {name} "
+                f"(choose from {', '.join([*COMPONENT_DEPS, AI_SETUP, *tools])})"
+            )
+    components = [name for name in _topological_order(COMPONENT_DEPS) if name in names]
+    tool_ids = [tool_id for tool_id in tools if tool_id in names or AI_SETUP in names]
+    return components, tool_ids
+
+
+def _rebuild(ctx: Context, components: list[str], tool_ids: list[str]) -> None:
+    """Set up just the given components and AI tools again, in dependency order.
+
+    Args:
+        ctx: Invoke context for running shell commands.
+        components: Components to run, already in dependency order.
+        tool_ids: AI tools to pass to scripts/setup.py.
+
+    Raises:
+        SystemExit: If any of them fails.
+    """
+    commit = repo_commit(REPO_DIR)
+    state = _load_component_state()
+    failed = []
+    for component in components:
+        if _run_component(ctx, component):
+            state[component] = _component_fingerprint(component, commit)
+        else:
+            failed.append(component)
+    _save_component_state(state)
+
+    if tool_ids:
+        result = ctx.run(f"python scripts/setup.py {' '.join(tool_ids)}", pty=True, warn=True)
+        if result is None or not result.ok:
+            failed.append(AI_SETUP)
+    InstallManifest().compact()
+
+    if failed:
+        raise SystemExit(f"⚠️  Reset failed: {', '.join(failed)}")
+
+
 @task
-def reset(ctx: Context, yes: bool = False, keep: bool = False) -> None:
+def reset(
+    ctx: Context, yes: bool = False, keep: bool = False, only: str = "", rollback: bool = True
+) -> None:
     """Remove all managed configs and symlinks, then re-run setup from scratch.
 
+    With only, just the selected components and AI tools are torn down and set
+    up again; the platform bootstrap, package install and every other component
+    are left alone.
+
     Args:
         ctx: Invoke context for running shell commands.
         yes: Skip the interactive confirmation prompt.
         keep: Preserve tool-installed lines in ~/.zshrc across the reset.
+        only: Comma-separated components (e.g., shell,git), AI tool ids from
+            ai/tools.json (e.g., claude), or "ai" for every AI tool.
+        rollback: Snapshot managed paths first and roll back to them on failure.
     """
     print("======================================")
     print("Development Environment Reset")
     print("======================================")
     print()
 
+    components, tool_ids = _parse_reset_selection(only) if only else ([], [])
+
     if not yes:
         print("⚠️  This will:")
-        print("  - Remove all config symlinks and files")
-        print("  - Reset git global configuration")
-        print("  - Re-run full setup from scratch")
+        if only:
+            print(f"  - Remove and recreate the configs of: {', '.join(components + tool_ids)}")
+        else:
+            print("  - Remove all config symlinks and files")
+            print("  - Reset git global configuration")
+            print("  - Re-run full setup from scratch")
         if keep:
             print("  - PRESERVE tool-installed lines in ~/.zshrc")
         print()
@@ -280,11 +1162,424 @@ def reset(ctx: Context, yes: bool = False, keep: bool = False) -> None:
             print("  → No tool-installed content found to preserve")
 
     print()
-    _teardown()
-    setup(ctx)
+    with _rollback_on_failure("reset", rollback):
+        if only:
+            _teardown({*components, *(_ai_component(tool_id) for tool_id in tool_ids)})
+            _rebuild(ctx, components, tool_ids)
+        else:
+            _teardown()
+            setup(ctx, force=True, rollback=False)
+
+        if preserved_content:
+            _restore_zshrc_tool_content(preserved_content)
+
+
+@task
+def snapshot(ctx: Context) -> None:
+    """Snapshot every managed path and git config key, for inv rollback.
+
+    Args:
+        ctx: Invoke context for running shell commands.
+    """
+    _take_snapshot("manual")
+
+
+@task
+def rollback(ctx: Context, to: str = "", list_: bool = False) -> None:
+    """Restore managed paths and git config keys from a snapshot.
+
+    inv setup and inv reset take a snapshot before changing anything, so this
+    undoes the last of them (or the last inv snapshot).
+
+    Args:
+        ctx: Invoke context for running shell commands.
+        to: Snapshot id to restore; defaults to the latest.
+        list_: List the snapshots instead of restoring one.
+    """
+    store = SnapshotStore()
+    if list_:
+        for snap in store.snapshots():
+            created = datetime.fromtimestamp(snap["created"]).strftime("%Y-%m-%d %H:%M:%S")
+            print(f"  {snap['id']}  {created}  {snap['reason']:<8} {len(snap['paths'])} paths")
+        return
+
+    try:
+        restored = store.restore(to or None)
+    except KeyError:
+        raise SystemExit(f"⚠️  No snapshot {to}" if to else "⚠️  No snapshots yet") from None
+    print(f"✓ Rolled back to snapshot {restored['id']} ({restored['reason']})")
+
+
+PROVISION_LOCK = "provision.lock"
+
+
+class ProvisionResult(TypedDict):
+    home: str
+    # Step name -> ok, failed, skipped, cancelled or cached
+    status: dict[str, str]
+    seconds: float
+    error: str
+
+
+def _read_homes(homes: list[str], homes_from: str = "") -> list[Path]:
+    """Collect the target homes of inv provision, without duplicates.
+
+    Args:
+        homes: Paths given with --home.
+        homes_from: File with one path per line; blank lines and # comments
+            are ignored.
+
+    Returns:
+        Absolute home paths, in the order given.
+    """
+    names = list(homes)
+    if homes_from:
+        with open(homes_from) as f:
+            names += [line.split("#", 1)[0].strip() for line in f]
+    paths = [Path(os.path.expanduser(name)).absolute() for name in names if name]
+    return list(dict.fromkeys(paths))
+
+
+def _home_env(home: Path, cache_home: str) -> dict[str, str]:
+    return {
+        "HOME": str(home),
+        "XDG_CONFIG_HOME": str(home / ".config"),
+        "XDG_STATE_HOME": str(home / ".local" / "state"),
+        # Shared by every home, so they all install from the one prefetched cache
+        "XDG_CACHE_HOME": cache_home,
+        # inv provision installed the system packages up front
+        "DOTFILES_APT_UPDATED": "1",
+    }
+
+
+def _home_owner(home: Path) -> Optional[tuple[int, int]]:
+    """Return the uid and gid that should own what provisioning writes in home.
+
+    None when the home does not exist yet or already belongs to this process,
+    in which case nothing needs handing over.
+    """
+    try:
+        st = home.stat()
+    except FileNotFoundError:
+        return None
+    if st.st_uid == os.geteuid():
+        return None
+    return st.st_uid, st.st_gid
+
+
+def _chown_created(home: Path, owner: tuple[int, int], since: float) -> None:
+    """Hand what this process created or changed in home since `since` to owner.
+
+    Only entries owned by this process and changed after `since` are touched,
+    so files the home's user left owned by someone else keep their owner.
+    Symlinks are changed themselves, never followed.
+    """
+    uid = os.geteuid()
+    for root, dirs, files in os.walk(home):
+        for name in dirs + files:
+            path = os.path.join(root, name)
+            st = os.lstat(path)
+            if st.st_uid == uid and st.st_ctime >= since:
+                os.lchown(path, *owner)
+
+
+def _provision_home(
+    home: str, cache_home: str, force: bool, offline: bool, rollback: bool
+) -> ProvisionResult:
+    """Run every setup step against one home, in a worker process of inv provision.
+
+    The worker points HOME and the XDG directories at the home, for itself and
+    every component it runs, so the home gets its own install manifest,
+    component fingerprints, snapshots and logs. A lock file in the home's
+    state dir keeps two runs from provisioning the same home at once. When
+    the home belongs to another user (inv provision usually runs as root),
+    everything the run creates in it is handed to the home's owner.
+
+    Args:
+        home: Home directory to provision; created if missing.
+        cache_home: XDG_CACHE_HOME shared by every home.
+        force: Run every component even if nothing changed since its last run.
+        offline: Have the components install only from the artifact cache.
+        rollback: Snapshot the home first and roll back to it on failure.
+
+    Returns:
+        What happened to each step.
+    """
+    start = time.monotonic()
+    result: ProvisionResult = {"home": home, "status": {}, "seconds": 0.0, "error": ""}
+    owner = _home_owner(Path(home))
+    # Whole seconds: file timestamps come from a coarser clock than time.time()
+    since = float(int(time.time()))
+    os.environ.update(_home_env(Path(home), cache_home))
+    log_dir = get_state_dir() / "logs"
+    try:
+        log_dir.mkdir(parents=True, exist_ok=True)
+        with (
+            open(get_state_dir() / PROVISION_LOCK, "w") as lock,
+            open(log_dir / "provision.log", "w") as log,
+            contextlib.redirect_stdout(log),
+        ):
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            with _rollback_on_failure("provision", rollback):
+                steps = SetupSteps(force)
+                status = steps.run(
+                    lambda n: _run_component_logged(n, log_dir / f"{n}.log", offline)
+                )
+                result["status"] = {
+                    name: "cached" if name in steps.cached else step_status
+                    for name, step_status in status.items()
+                }
+                failed = [name for name, step_status in status.items() if step_status == "failed"]
+                if failed:
+                    raise SystemExit(f"failed: {', '.join(failed)} (logs in {log_dir})")
+    except (OSError, SystemExit) as e:
+        result["error"] = str(e)
+    if owner is not None:
+        try:
+            _chown_created(Path(home), owner, since)
+        except OSError as e:
+            result["error"] = result["error"] or f"could not hand the home to its owner: {e}"
+    result["seconds"] = time.monotonic() - start
+    return result
+
+
+def _format_provision_result(result: ProvisionResult) -> str:
+    if result["error"]:
+        return f"  ✗ {result['home']}: {result['error']}"
+    ran = [name for name, status in result["status"].items() if status == "ok"]
+    cached = [name for name, status in result["status"].items() if status == "cached"]
+    parts = [f"{result['seconds']:.1f}s"]
+    if ran:
+        parts.append(f"ran {', '.join(ran)}")
+    if cached:
+        parts.append(f"cached {', '.join(cached)}")
+    return f"  ✓ {result['home']} ({'; '.join(parts)})"
+
+
+@task(iterable=["home"])
+def provision(
+    ctx: Context,
+    home: Optional[list[str]] = None,
+    homes_from: str = "",
+    jobs: int = 0,
+    force: bool = False,
+    offline: bool = False,
+    rollback: bool = True,
+) -> None:
+    """Apply the full setup to many home directories at once.
+
+    System packages are installed and installers prefetched once for every
+    home, then each home is set up in its own worker process, as if setup ran
+    with $HOME pointed at it. Every home has its own install manifest,
+    component fingerprints, snapshots and logs under its .local/state.
+
+    Args:
+        ctx: Invoke context for running shell commands.
+        home: Home directory to provision; repeat for several.
+        homes_from: File listing home directories, one per line.
+        jobs: Maximum number of homes to provision at once; defaults to the
+            number of CPUs.
+        force: Run every component even if nothing changed since its last run.
+        offline: Install only from the artifact cache, without downloading anything
+            or running the batched package install.
+        rollback: Snapshot each home first and roll it back on failure.
+    """
+    homes = _read_homes(home or [], homes_from)
+    if not homes:
+        raise SystemExit("⚠️  No homes given, pass --home PATH or --homes-from FILE")
+    jobs = min(jobs or os.cpu_count() or 1, len(homes))
+
+    print("======================================")
+    print("Development Environment Provisioning")
+    print("======================================")
+    print()
+
+    _setup_platform(ctx)
+    steps = [*COMPONENT_DEPS, AI_SETUP]
+    if not offline:
+        if platform.system() == "Linux" and sys.stdin.isatty():
+            # Ask for the sudo password once, before output is captured to logs
+            ctx.run("sudo -v", pty=True, warn=True)
+        _install_packages(ctx, steps)
+        _prefetch_artifacts(steps)
+
+    print(f"Provisioning {len(homes)} home(s), up to {jobs} at a time")
+    start = time.monotonic()
+    cache_home = str(get_cache_dir().parent)
+    results: dict[Path, ProvisionResult] = {}
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(_provision_home, str(path), cache_home, force, offline, rollback): path
+            for path in homes
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                results[path] = future.result()
+            except Exception as e:
+                results[path] = {"home": str(path), "status": {}, "seconds": 0.0, "error": str(e)}
+            print(_format_provision_result(results[path]))
+
+    failed = [path for path in homes if results[path]["error"]]
+    print()
+    print(
+        f"{len(homes) - len(failed)} of {len(homes)} home(s) provisioned "
+        f"in {time.monotonic() - start:.1f}s"
+    )
+    if failed:
+        raise SystemExit(f"⚠️  Provisioning failed: {', '.join(map(str, failed))}")
+
+
+@task
+def bundle(ctx: Context, output: str = "", home: str = "") -> None:
+    """Pack everything setup installed in a home into one relocatable archive.
+
+    The archive holds the symlinks into the repo, the generated skill commands
+    and memory, the ~/.zshrc loader and the component configs, with repo and
+    home paths replaced by placeholders. inv unbundle (or python -m
+    scripts.bundle extract, for containers without invoke) unpacks it into any
+    home against any checkout of the repo, without running setup.
+
+    Args:
+        ctx: Invoke context for running shell commands.
+        output: Archive to write; .tar.zst (if zstd is installed) or .tar.gz
+            in the current directory by default.
+        home: Home to bundle; defaults to $HOME.
+    """
+    home_path = Path(home).absolute() if home else Path.home()
+    records = InstallManifest(home_state_dir(home_path) / "manifest.tsv").records()
+    if not records:
+        raise SystemExit(f"⚠️  Nothing installed in {home_path} yet, run inv setup first")
+    suffix = ".tar.zst" if shutil.which("zstd") else ".tar.gz"
+    output_path = Path(output or f"dotfiles-bundle{suffix}")
 
-    if preserved_content:
-        _restore_zshrc_tool_content(preserved_content)
+    try:
+        manifest = create_bundle(records, output_path, home_path, REPO_DIR)
+    except BundleError as e:
+        raise SystemExit(f"⚠️  {e}") from None
+    size = output_path.stat().st_size
+    print(f"✓ Bundled {len(manifest['records'])} records into {output_path} ({size} bytes)")
+
+
+@task
+def unbundle(ctx: Context, archive: str, home: str = "", repo_dir: str = "") -> None:
+    """Unpack an inv bundle archive into a home in one pass.
+
+    Symlinks point into repo_dir, existing files in the way are backed up, and
+    the bundle's records are added to the home's install manifest, so inv
+    doctor and inv reset work on the result as if setup had run.
+
+    Args:
+        ctx: Invoke context for running shell commands.
+        archive: Archive written by inv bundle.
+        home: Home to unpack into; defaults to $HOME.
+        repo_dir: Repo checkout the symlinks should point into; defaults to this one.
+    """
+    home_path = Path(home).absolute() if home else Path.home()
+    start = time.perf_counter()
+    try:
+        manifest = extract_bundle(
+            Path(archive), home_path, Path(repo_dir).absolute() if repo_dir else REPO_DIR
+        )
+    except BundleError as e:
+        raise SystemExit(f"⚠️  {e}") from None
+    elapsed = time.perf_counter() - start
+    print(f"✓ Unpacked {len(manifest['records'])} records into {home_path} in {elapsed:.2f}s")
+
+
+# Installed by Homebrew only, so never expected on Linux
+DARWIN_ONLY_BINARIES = {"terminal-notifier", "mole"}
+
+
+def _doctor_probes(timeout: float, versions: bool) -> dict[str, Probe]:
+    """Work out what inv doctor checks, from the install manifest.
+
+    Args:
+        timeout: Seconds each subprocess may take.
+        versions: Run each binary's --version instead of only looking it up.
+
+    Returns:
+        Probes by name: one per installed path, git config key, AI tool and binary.
+    """
+    records = InstallManifest().records() or _legacy_manifest_records()
+
+    probes: dict[str, Probe] = {}
+    git_keys: dict[str, list[str]] = {}
+    tool_ids: set[str] = set()
+    for record in records:
+        component = record["component"]
+        if component.startswith(f"{AI_SETUP}:"):
+            # check_tool covers these the way setup.py sees them
+            tool_ids.add(component.removeprefix(f"{AI_SETUP}:"))
+        elif record["kind"] == "gitconfig":
+            git_keys.setdefault(record["path"], []).append(record["expected"])
+        else:
+            probes[f"manifest:{record['path']}"] = functools.partial(check_record, record)
+
+    for key, expected in git_keys.items():
+        probes[f"gitconfig:{key}"] = functools.partial(check_git_key, key, expected, timeout)
+
+    ai_root = REPO_DIR / "ai"
+    catalog = SkillCatalog(get_cache_dir() / "skill-catalog.json")
+    for tool_id, tool_config in _load_tools_config().get("tools", {}).items():
+        if tool_id in tool_ids:
+            probes[f"tool:{tool_id}"] = functools.partial(
+                check_tool, tool_id, tool_config, ai_root, catalog
+            )
+
+    components = set(_load_component_state()) or set(COMPONENT_PROBES)
+    for component, probe in COMPONENT_PROBES.items():
+        if component not in components:
+            continue
+        for binary in probe["binaries"]:
+            if platform.system() != "Darwin" and binary in DARWIN_ONLY_BINARIES:
+                continue
+            probes[f"binary:{binary}"] = functools.partial(
+                check_binary, binary, timeout, version=versions
+            )
+
+    return probes
+
+
+@task
+def doctor(
+    ctx: Context,
+    json_: bool = False,
+    verbose: bool = False,
+    versions: bool = True,
+    timeout: float = DOCTOR_TIMEOUT_SECONDS,
+) -> None:
+    """Check that everything setup manages is still in place, without changing anything.
+
+    Compares every install manifest record, each installed AI tool's links and
+    generated skills and memory, the global git config keys setup sets and the
+    components' binaries against what setup would leave there. Checks run
+    concurrently, each with its own timeout. Exits non-zero on any drift, so it
+    can run from a login hook or cron job.
+
+    Args:
+        ctx: Invoke context for running shell commands.
+        json_: Print every check as JSON instead of a report.
+        verbose: List passing checks too.
+        versions: Report each binary's version (skip for the fastest check).
+        timeout: Seconds each check may take.
+    """
+    start = time.perf_counter()
+    checks = run_probes(_doctor_probes(timeout, versions), timeout=timeout)
+    failed = [check for check in checks if check["status"] != "ok"]
+
+    if json_:
+        print(json.dumps(checks, indent=2))
+    else:
+        for check in checks if verbose else failed:
+            mark = {"ok": "✓", "drift": "✗"}.get(check["status"], "?")
+            detail = f": {check['detail']}" if check["detail"] else ""
+            print(f"  {mark} {check['check']:<9} {check['subject']}{detail}")
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{len(checks)} checks, {len(failed)} failing ({elapsed:.0f} ms)")
+
+    if failed:
+        raise SystemExit(1)
 
 
 @task
@@ -329,77 +1624,323 @@ def lint(ctx: Context, fix: bool = False) -> None:
     ctx.run(cmd, pty=True)
 
 
-def _find_ai_backup_files() -> list[Path]:
-    """Find timestamped backup files in AI tool config directories.
+BACKUP_NAME = re.compile(r"^(?P<original>.+)\.backup(?:\.(?P<stamp>\d{8}_\d{6}))?$")
+
+AGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+class BackupRoot(TypedDict):
+    path: Path
+    depth: int
+    originals: Optional[set[str]]
+
+
+class FoundBackup(TypedDict):
+    path: Path
+    original: Path
+    created: float
+    is_dir: bool
+
+
+def _backup_roots() -> list[BackupRoot]:
+    """List every directory that can hold backups left behind by setup.
 
-    Reads tools.json to discover config directories, then searches each for
-    backup files created by scripts/setup.py's backup_if_exists() function.
-    These follow the pattern: {name}.backup.{YYYYMMDD_HHMMSS}
+    Shell backups (lib/platform.sh and legacy ~/.zshrc backups) only count for
+    the files setup manages, so unrelated *.backup files in $HOME are left
+    alone. AI tool config dirs are scanned one level deep, matching what
+    scripts/setup.py used to back up there.
 
     Returns:
-        List of paths to backup files/directories found in AI config dirs.
+        Roots to scan, with how deep to descend and which originals to match.
     """
-    config_path = REPO_DIR / "ai" / "tools.json"
-    with open(config_path) as f:
-        config = json.load(f)
-
-    backups: list[Path] = []
-    for tool in config.get("tools", {}).values():
+    home = Path.home()
+    roots: list[BackupRoot] = [
+        {"path": home, "depth": 0, "originals": {".zprofile", ".gitignore_global", ".zshrc"}},
+        {"path": home / ".config", "depth": 0, "originals": {"starship.toml", "ghostty"}},
+        {"path": home / ".config" / "direnv", "depth": 0, "originals": {"direnvrc"}},
+    ]
+    for tool in _load_tools_config().get("tools", {}).values():
         config_dir = Path(os.path.expanduser(tool["config_dir"]))
-        if not config_dir.exists():
-            continue
+        roots.append({"path": config_dir, "depth": 1, "originals": None})
+    return roots
+
+
+def _scan_backup_root(path: Path, depth: int, originals: Optional[set[str]]) -> list[FoundBackup]:
+    found: list[FoundBackup] = []
+    try:
+        entries = os.scandir(path)
+    except OSError:
+        return found
+
+    with entries:
+        for entry in entries:
+            match = BACKUP_NAME.match(entry.name)
+            if match and (originals is None or match["original"] in originals):
+                stamp = match["stamp"]
+                if stamp:
+                    created = datetime.strptime(stamp, "%Y%m%d_%H%M%S").timestamp()
+                else:
+                    created = entry.stat(follow_symlinks=False).st_mtime
+                found.append(
+                    {
+                        "path": Path(entry.path),
+                        "original": path / match["original"],
+                        "created": created,
+                        "is_dir": entry.is_dir(follow_symlinks=False),
+                    }
+                )
+            elif depth > 0 and entry.is_dir(follow_symlinks=False):
+                found.extend(_scan_backup_root(Path(entry.path), depth - 1, originals))
+    return found
+
+
+def _find_backups(roots: list[BackupRoot]) -> list[FoundBackup]:
+    """Scan all backup roots with one os.scandir() walk each, concurrently.
 
-        backups.extend(config_dir.glob("*.backup.*"))
+    Args:
+        roots: Directories to scan, as returned by _backup_roots().
 
-        for child in config_dir.iterdir():
-            if child.is_dir() and not child.is_symlink():
-                backups.extend(child.glob("*.backup.*"))
+    Returns:
+        Every backup found, sorted by path. Roots listed twice are scanned once.
+    """
+    unique = list({root["path"]: root for root in roots}.values())
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(unique)))) as pool:
+        results = pool.map(
+            lambda root: _scan_backup_root(root["path"], root["depth"], root["originals"]),
+            unique,
+        )
+        found = [backup for result in results for backup in result]
+    return sorted(found, key=lambda backup: backup["path"])
 
-    return backups
+
+def _select_backups(
+    found: list[FoundBackup], keep: Optional[int], max_age: Optional[float], now: float
+) -> list[FoundBackup]:
+    """Apply the retention policy to scanned backups.
+
+    Args:
+        found: Backups returned by _find_backups().
+        keep: Keep this many of the newest backups of each original, or None.
+        max_age: Only remove backups older than this many seconds, or None.
+        now: Current time, for comparing against max_age.
+
+    Returns:
+        The backups to remove, in the order they were given.
+    """
+    newest_first = sorted(found, key=lambda backup: backup["created"], reverse=True)
+    rank: dict[Path, int] = {}
+    remove: set[Path] = set()
+    for backup in newest_first:
+        index = rank.get(backup["original"], 0)
+        rank[backup["original"]] = index + 1
+        if (keep is not None and index >= keep) or (
+            max_age is not None and now - backup["created"] > max_age
+        ):
+            remove.add(backup["path"])
+    return [backup for backup in found if backup["path"] in remove]
+
+
+def _parse_age(value: str) -> float:
+    match = re.fullmatch(r"(\d+)([smhdw]?)", value.strip())
+    if not match:
+        raise SystemExit(f"⚠️  Invalid --older-than value: {value} (expected e.g. 30d, 12h, 2w)")
+    return int(match[1]) * AGE_UNITS[match[2] or "s"]
+
+
+def _path_size(path: Path) -> int:
+    try:
+        entries = os.scandir(path)
+    except NotADirectoryError:
+        return path.lstat().st_size
+    except OSError:
+        return 0
+
+    total = 0
+    with entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                total += _path_size(Path(entry.path))
+            else:
+                total += entry.stat(follow_symlinks=False).st_size
+    return total
+
+
+def _remove_backup(backup: FoundBackup, dry_run: bool) -> int:
+    size = _path_size(backup["path"])
+    if not dry_run:
+        if backup["is_dir"]:
+            shutil.rmtree(backup["path"])
+        else:
+            backup["path"].unlink()
+    return size
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if size < 1024 or unit == "GiB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
 
 
 @task
-def cleanup(ctx: Context) -> None:
-    """Remove backup files left behind by setup scripts.
+def cleanup(
+    ctx: Context,
+    keep: Optional[int] = None,
+    older_than: str = "",
+    all_: bool = False,
+    dry_run: bool = False,
+) -> None:
+    """Remove backups left behind by setup scripts.
 
     Setup scripts create .backup files when replacing existing configs with
-    symlinks. This task finds and removes those stale backups from three sources:
-    shell scripts (lib/platform.sh), the reset task (_teardown), and the AI
-    tools setup script (scripts/setup.py).
+    symlinks. This task finds them in a single scan of $HOME, ~/.config and
+    every AI tool config dir, and prunes the backup store that scripts/setup.py
+    and the reset task write to. Without --keep or --older-than every .backup
+    file is removed, but the backup store is only emptied with --all.
 
     Args:
         ctx: Invoke context for running shell commands.
+        keep: Keep this many of the newest backups of each file (0 keeps none).
+        older_than: Only remove backups older than this (e.g. 30d, 12h, 2w).
+        all_: Also empty the backup store when no --keep or --older-than is given.
+        dry_run: List what would be removed without deleting anything.
     """
-    home = Path.home()
+    max_age = _parse_age(older_than) if older_than else None
+    # invoke hands over options without a typed default as strings
+    try:
+        keep_count = None if keep is None else int(keep)
+    except ValueError:
+        raise SystemExit(f"⚠️  Invalid --keep value: {keep} (expected a number)") from None
+    policy = keep_count is not None or max_age is not None
+    if not policy:
+        keep_count = 0
+
+    found = _find_backups(_backup_roots())
+    selected = _select_backups(found, keep_count, max_age, time.time())
+    store = BackupStore()
+    store_count = store_bytes = 0
+    if policy or all_:
+        store_count, store_bytes = store.prune(keep=keep_count, max_age=max_age, dry_run=dry_run)
+    elif kept := len(store.entries()):
+        print(f"  Keeping {kept} backup(s) in the backup store (use --all to remove them too)")
+
+    if not selected and not store_count and not store_bytes:
+        print("✓ No backup files found — nothing to clean up.")
+        return
 
-    shell_backups = [
-        home / ".zprofile.backup",
-        home / ".gitignore_global.backup",
-        home / ".config" / "starship.toml.backup",
-        home / ".config" / "ghostty.backup",
-        home / ".config" / "direnv" / "direnvrc.backup",
-    ]
+    verb = "Would remove" if dry_run else "Removing"
+    reclaimed = store_bytes
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(selected)))) as pool:
+        sizes = pool.map(lambda backup: _remove_backup(backup, dry_run), selected)
+        for backup, size in zip(selected, sizes, strict=True):
+            suffix = "/" if backup["is_dir"] else ""
+            print(f"  → {verb} {backup['path']}{suffix} ({_format_bytes(size)})")
+            reclaimed += size
+
+    if store_count or store_bytes:
+        print(f"  → {verb} {store_count} backup(s) from the backup store")
+
+    total = len(selected) + store_count
+    if dry_run:
+        print(f"  Would remove {total} backup(s), reclaiming {_format_bytes(reclaimed)}")
+    else:
+        print(f"  ✓ Removed {total} backup(s), reclaimed {_format_bytes(reclaimed)}")
 
-    zshrc_backups = list(home.glob(".zshrc.backup.*"))
 
-    ai_backups = _find_ai_backup_files()
+@task
+def bench(
+    ctx: Context, sizes: str = "10,1000,10000", save: bool = False, threshold: float = 0.25
+) -> None:
+    """Benchmark the scripts/setup.py hot paths against the saved baseline.
 
-    all_backups = shell_backups + zshrc_backups + ai_backups
-    found = [p for p in all_backups if p.exists() or p.is_dir()]
+    Fails if any benchmark is slower than the baseline by more than threshold.
 
-    if not found:
-        print("✓ No backup files found — nothing to clean up.")
+    Args:
+        ctx: Invoke context for running shell commands.
+        sizes: Comma-separated synthetic tree sizes to benchmark.
+        save: Save this run as the new baseline instead of comparing.
+        threshold: Allowed slowdown as a fraction (0.25 means 25% slower).
+    """
+    cmd = f"uv run python -m scripts.bench --sizes {sizes} --threshold {threshold}"
+    if save:
+        cmd += " --save"
+    ctx.run(cmd, pty=True)
+
+
+@task
+def shellperf_report(
+    ctx: Context,
+    budget: float = SHELLPERF_BUDGET_MS,
+    mode: str = "cold",
+    last: int = 10,
+    threshold: float = REGRESSION_THRESHOLD,
+    all_hosts: bool = False,
+    json_: bool = False,
+) -> None:
+    """Show shell startup trends from the shellperf history and check the budget.
+
+    Every shellperf run is recorded in $XDG_STATE_HOME/dotfiles/shellperf.jsonl.
+    Results are grouped by repo commit, and each commit where the total or a tag
+    got slower than the commit before is reported. Exits non-zero if the latest
+    commit's median startup time is over budget.
+
+    Args:
+        ctx: Invoke context for running shell commands.
+        budget: Startup time in ms to fail over.
+        mode: Which results to use: cold (shellperf --runs) or warm (shellperf).
+        last: Number of most recent commits to show.
+        threshold: Slowdown from one commit to the next that counts as a regression,
+            as a fraction (0.2 means 20% slower).
+        all_hosts: Include results from other machines too.
+        json_: Print the trends and regressions as JSON instead of a report.
+    """
+    host = platform.node()
+    entries = [
+        entry
+        for entry in load_history()
+        if entry["mode"] == mode and (all_hosts or entry["host"] == host)
+    ]
+    if not entries:
+        print(f"No {mode} shellperf results recorded yet; run shellperf in a shell first")
         return
 
-    for path in found:
-        if path.is_dir():
-            print(f"  → Removing {path}/")
-            shutil.rmtree(path)
+    trends = commit_trends(entries)
+    regressions = find_regressions(trends, threshold)
+    latest = trends[-1]["timings"][TOTAL_KEY]
+
+    if json_:
+        print(json.dumps({"trends": trends, "regressions": regressions}, indent=2))
+    else:
+        print(f"Shell startup ({mode}) by commit, median of each commit's runs:")
+        previous: Optional[float] = None
+        for index, trend in enumerate(trends):
+            total = trend["timings"][TOTAL_KEY]
+            if index >= len(trends) - last:
+                date = datetime.fromtimestamp(trend["time"]).strftime("%Y-%m-%d %H:%M")
+                change = f" ({total - previous:+.1f})" if previous is not None else ""
+                commit = trend["commit"][:10] or "(unknown)"
+                print(
+                    f"  {commit:<10}  {date}  {trend['entries']:>3} run(s)  {total:7.1f} ms{change}"
+                )
+            previous = total
+
+        if regressions:
+            print(f"\nRegressions past {threshold:.0%}:")
+            for regression in regressions:
+                print(
+                    f"  {regression['key']}: {regression['before']:.1f} ms -> "
+                    f"{regression['after']:.1f} ms at {regression['commit'][:10]} "
+                    f"(after {regression['previous_commit'][:10]})"
+                )
+
+        if latest > budget:
+            print(f"\n✗ Startup takes {latest:.1f} ms, over the {budget:g} ms budget")
         else:
-            print(f"  → Removing {path}")
-            path.unlink()
+            print(f"\n✓ Startup takes {latest:.1f} ms, within the {budget:g} ms budget")
 
-    print(f"  ✓ Removed {len(found)} backup file(s)")
+    if latest > budget:
+        raise SystemExit(1)
 
 
 @task
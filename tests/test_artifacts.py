@@ -0,0 +1,241 @@
+import hashlib
+import json
+import threading
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from scripts.artifacts import (
+    ArtifactCache,
+    ArtifactError,
+    artifacts_for,
+    fetch_named,
+    prefetch,
+)
+
+
+class FakeServer:
+    """Serves files from a dict, with ETags, and counts requests per path."""
+
+    def __init__(self) -> None:
+        self.files: dict[str, bytes] = {}
+        self.requests: dict[str, int] = {}
+        self.not_modified = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                server.requests[self.path] = server.requests.get(self.path, 0) + 1
+                body = server.files.get(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+                if self.headers.get("If-None-Match") == etag:
+                    server.not_modified += 1
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: object) -> None:
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self) -> None:
+        threading.Thread(target=self.httpd.serve_forever, args=(0.01,), daemon=True).start()
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server() -> Iterator[FakeServer]:
+    fake = FakeServer()
+    fake.start()
+    yield fake
+    fake.stop()
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.time = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.time
+
+
+@pytest.fixture
+def clock() -> Clock:
+    return Clock()
+
+
+@pytest.fixture
+def cache(tmp_path: Path, clock: Clock) -> ArtifactCache:
+    return ArtifactCache(tmp_path / "artifacts", now=clock)
+
+
+class TestArtifactCache:
+    def test_fetch_uses_cache_within_ttl(self, server: FakeServer, cache: ArtifactCache) -> None:
+        server.files["/install.sh"] = b"echo hi\n"
+
+        first = cache.fetch(f"{server.url}/install.sh", ttl=60)
+        second = cache.fetch(f"{server.url}/install.sh", ttl=60)
+
+        assert first == second
+        assert first.read_bytes() == b"echo hi\n"
+        assert first.name == hashlib.sha256(b"echo hi\n").hexdigest()
+        assert server.requests["/install.sh"] == 1
+
+    def test_fetch_revalidates_stale_copy(
+        self, server: FakeServer, cache: ArtifactCache, clock: Clock
+    ) -> None:
+        server.files["/install.sh"] = b"echo hi\n"
+        cache.fetch(f"{server.url}/install.sh", ttl=60)
+
+        clock.time += 120
+        path = cache.fetch(f"{server.url}/install.sh", ttl=60)
+
+        assert path.read_bytes() == b"echo hi\n"
+        assert server.not_modified == 1
+
+        # The 304 refreshed the entry, so it is fresh again
+        cache.fetch(f"{server.url}/install.sh", ttl=60)
+        assert server.requests["/install.sh"] == 2
+
+    def test_fetch_picks_up_changed_content(
+        self, server: FakeServer, cache: ArtifactCache, clock: Clock
+    ) -> None:
+        server.files["/install.sh"] = b"v1\n"
+        cache.fetch(f"{server.url}/install.sh", ttl=60)
+
+        server.files["/install.sh"] = b"v2\n"
+        clock.time += 120
+
+        assert cache.fetch(f"{server.url}/install.sh", ttl=60).read_bytes() == b"v2\n"
+
+    def test_fetch_falls_back_to_stale_copy_when_unreachable(
+        self, server: FakeServer, cache: ArtifactCache, clock: Clock
+    ) -> None:
+        server.files["/install.sh"] = b"echo hi\n"
+        url = f"{server.url}/install.sh"
+        cache.fetch(url, ttl=60)
+
+        server.stop()
+        clock.time += 120
+
+        assert cache.fetch(url, ttl=60).read_bytes() == b"echo hi\n"
+
+    def test_fetch_offline(self, server: FakeServer, tmp_path: Path, clock: Clock) -> None:
+        server.files["/install.sh"] = b"echo hi\n"
+        url = f"{server.url}/install.sh"
+        ArtifactCache(tmp_path / "artifacts", now=clock).fetch(url, ttl=60)
+        offline = ArtifactCache(tmp_path / "artifacts", offline=True, now=clock)
+
+        clock.time += 120
+        assert offline.fetch(url, ttl=60).read_bytes() == b"echo hi\n"
+        with pytest.raises(ArtifactError, match="not cached"):
+            offline.fetch(f"{server.url}/other.sh")
+        assert server.requests == {"/install.sh": 1}
+
+    def test_fetch_rejects_corrupted_object(self, server: FakeServer, cache: ArtifactCache) -> None:
+        server.files["/install.sh"] = b"echo hi\n"
+        path = cache.fetch(f"{server.url}/install.sh")
+        path.write_bytes(b"tampered")
+
+        assert cache.fetch(f"{server.url}/install.sh").read_bytes() == b"echo hi\n"
+        assert server.requests["/install.sh"] == 2
+
+    def test_fetch_checksum_mismatch(self, server: FakeServer, cache: ArtifactCache) -> None:
+        server.files["/tool.tar.gz"] = b"payload"
+
+        with pytest.raises(ArtifactError, match="expected sha256"):
+            cache.fetch(f"{server.url}/tool.tar.gz", sha256="0" * 64)
+        assert cache.entries() == {}
+
+    def test_fetch_http_error(self, server: FakeServer, cache: ArtifactCache) -> None:
+        with pytest.raises(ArtifactError, match="HTTP 404"):
+            cache.fetch(f"{server.url}/missing")
+
+
+def _publish_release(server: FakeServer, payload: bytes, listed_hash: str = "") -> str:
+    asset = "tool_1.2.3_Linux_x86_64.tar.gz"
+    server.files[f"/download/{asset}"] = payload
+    digest = listed_hash or hashlib.sha256(payload).hexdigest()
+    server.files["/download/checksums.txt"] = f"{digest}  {asset}\n".encode()
+    server.files["/api/latest"] = json.dumps(
+        {
+            "tag_name": "v1.2.3",
+            "assets": [
+                {"name": name, "browser_download_url": f"{server.url}/download/{name}"}
+                for name in (asset, "checksums.txt")
+            ],
+        }
+    ).encode()
+    return f"{server.url}/api/latest"
+
+
+class TestFetchRelease:
+    def test_fetch_release(self, server: FakeServer, cache: ArtifactCache) -> None:
+        api_url = _publish_release(server, b"tarball")
+
+        path = cache.fetch_release(
+            api_url, "tool_{version}_Linux_{arch}.tar.gz", "checksums.txt", arch="x86_64"
+        )
+        again = cache.fetch_release(
+            api_url, "tool_{version}_Linux_{arch}.tar.gz", "checksums.txt", arch="x86_64"
+        )
+
+        assert path == again
+        assert path.read_bytes() == b"tarball"
+        assert server.requests["/download/tool_1.2.3_Linux_x86_64.tar.gz"] == 1
+        assert server.requests["/api/latest"] == 1
+
+    def test_fetch_release_checksum_mismatch(
+        self, server: FakeServer, cache: ArtifactCache
+    ) -> None:
+        api_url = _publish_release(server, b"tarball", listed_hash="f" * 64)
+
+        with pytest.raises(ArtifactError, match="expected sha256"):
+            cache.fetch_release(
+                api_url, "tool_{version}_Linux_{arch}.tar.gz", "checksums.txt", arch="x86_64"
+            )
+
+    def test_fetch_release_missing_asset(self, server: FakeServer, cache: ArtifactCache) -> None:
+        api_url = _publish_release(server, b"tarball")
+
+        with pytest.raises(ArtifactError, match="no asset"):
+            cache.fetch_release(api_url, "tool_{version}_Linux_{arch}.tar.gz", arch="riscv64")
+
+
+def test_artifacts_for() -> None:
+    assert artifacts_for(["lazygit"], system="Linux") == ["lazygit"]
+    assert artifacts_for(["lazygit"], system="Darwin") == []
+    assert "fnm-installer" not in artifacts_for(["terminal"], system="Darwin")
+    assert "uv-installer" in artifacts_for(["terminal"], system="Darwin")
+    assert artifacts_for(["git"], system="Linux") == []
+
+
+def test_fetch_named_unknown(cache: ArtifactCache) -> None:
+    with pytest.raises(ArtifactError, match="Unknown artifact"):
+        fetch_named(cache, "nope")
+
+
+def test_prefetch(server: FakeServer, cache: ArtifactCache) -> None:
+    for i in range(5):
+        server.files[f"/file-{i}"] = f"content {i}".encode()
+    names = [f"{server.url}/file-{i}" for i in range(5)] + [f"{server.url}/missing"]
+
+    errors = prefetch(cache, names, jobs=3)
+
+    assert list(errors) == [f"{server.url}/missing"]
+    assert len(cache.entries()) == 5
@@ -0,0 +1,154 @@
+import json
+import threading
+from pathlib import Path
+
+import pytest
+
+from scripts.backups import BackupStore
+
+
+def test_backup_store_dedups_identical_content(tmp_path: Path) -> None:
+    store = BackupStore(tmp_path / "store")
+    config = tmp_path / "CLAUDE.md"
+    for _ in range(3):
+        config.write_text("same")
+        store.backup(config)
+
+    assert not config.exists()
+    assert len(store.entries()) == 3
+    assert len(list(store.objects_dir.glob("*/*"))) == 1
+
+
+def test_backup_store_reuses_hash_for_unchanged_file(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    store = BackupStore(tmp_path / "store")
+    config = tmp_path / "CLAUDE.md"
+    config.write_text("same")
+    store.backup(config)
+    store.restore(store.entries()[0]["id"])
+
+    def fail_hash(_path: Path) -> str:
+        raise AssertionError("unchanged file was hashed again")
+
+    monkeypatch.setattr("scripts.backups.hash_file", fail_hash)
+    store.backup(config)
+
+    assert store.entries()[0]["files"] == store.entries()[1]["files"]
+
+
+def test_backup_store_keeps_shared_inode_intact(tmp_path: Path) -> None:
+    store = BackupStore(tmp_path / "store")
+    original = tmp_path / "memory.md"
+    original.write_text("shared")
+    copy = tmp_path / "copy.md"
+    copy.hardlink_to(original)
+
+    entry = store.backup(copy)
+
+    assert not store.object_path(entry["files"]["."]["hash"]).samefile(original)
+
+
+def test_backup_store_restores_directory(tmp_path: Path) -> None:
+    store = BackupStore(tmp_path / "store")
+    skills = tmp_path / "skills"
+    (skills / "nested" / "empty").mkdir(parents=True)
+    (skills / "nested" / "a.md").write_text("a")
+    (skills / "link").symlink_to("nested/a.md")
+
+    entry = store.backup(skills)
+    assert not skills.exists()
+    store.restore(entry["id"])
+
+    assert (skills / "nested" / "a.md").read_text() == "a"
+    assert (skills / "nested" / "empty").is_dir()
+    assert (skills / "link").readlink() == Path("nested/a.md")
+
+
+def test_backup_store_skips_truncated_index_line(tmp_path: Path) -> None:
+    store = BackupStore(tmp_path / "store")
+    config = tmp_path / "CLAUDE.md"
+    config.write_text("old")
+    store.backup(config)
+    with open(store.index_path, "a") as f:
+        f.write('{"id": "cut-short", "sou')
+
+    assert len(store.entries()) == 1
+    config.write_text("new")
+    store.backup(config)
+    assert [entry["source"] for entry in store.entries()] == [str(config)] * 2
+    assert store.prune(keep=1) == (1, len("old"))
+    assert len(store.entries()) == 1
+
+
+@pytest.mark.parametrize("policy", ["keep", "max_age"])
+def test_backup_store_prune(tmp_path: Path, policy: str) -> None:
+    store = BackupStore(tmp_path / "store")
+    config = tmp_path / "CLAUDE.md"
+    for content in ["old", "new"]:
+        config.write_text(content)
+        store.backup(config)
+    if policy == "keep":
+        dropped, freed = store.prune(keep=1)
+    else:
+        entries = store.entries()
+        entries[0]["created"] -= 3600
+        store.index_path.write_text("".join(json.dumps(entry) + "\n" for entry in entries))
+        dropped, freed = store.prune(max_age=60)
+
+    assert (dropped, freed) == (1, len("old"))
+    assert len(store.entries()) == 1
+    store.restore(store.entries()[0]["id"])
+    assert config.read_text() == "new"
+
+
+def test_backup_store_backup_does_not_read_index(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    store = BackupStore(tmp_path / "store")
+    config = tmp_path / "CLAUDE.md"
+    config.write_text("same")
+    first = store.backup(config)
+    store.restore(first["id"])
+
+    def fail_entries() -> None:
+        raise AssertionError("backup read the whole index")
+
+    monkeypatch.setattr(store, "entries", fail_entries)
+    second = store.backup(config)
+
+    assert second["files"] == first["files"]
+    assert store.latest(str(config.absolute())) == second
+
+
+def test_backup_store_prune_drops_stale_latest_pointer(tmp_path: Path) -> None:
+    store = BackupStore(tmp_path / "store")
+    config = tmp_path / "CLAUDE.md"
+    config.write_text("old")
+    store.backup(config)
+
+    assert store.prune(keep=0) == (1, len("old"))
+    assert store.latest(str(config.absolute())) is None
+    assert not store.latest_path(str(config.absolute())).exists()
+
+
+def test_backup_store_prune_does_not_lose_concurrent_backups(tmp_path: Path) -> None:
+    store = BackupStore(tmp_path / "store")
+    sources = [tmp_path / f"config-{index}.md" for index in range(20)]
+
+    def back_up(path: Path) -> None:
+        path.write_text(path.name)
+        # A fresh instance per call, as separate inv setup runs would use
+        BackupStore(store.root).backup(path)
+
+    threads = [threading.Thread(target=back_up, args=(path,)) for path in sources]
+    for thread in threads:
+        thread.start()
+    for _ in range(20):
+        BackupStore(store.root).prune(keep=5)
+    for thread in threads:
+        thread.join()
+
+    entries = store.entries()
+    assert sorted(entry["source"] for entry in entries) == sorted(str(p) for p in sources)
+    assert all(store.object_path(entry["files"]["."]["hash"]).exists() for entry in entries)
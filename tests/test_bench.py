@@ -0,0 +1,31 @@
+from pathlib import Path
+
+from scripts.bench import BENCHMARKS, BenchResults, compare_results, make_tree, run_benchmarks
+
+
+def test_make_tree(tmp_path: Path) -> None:
+    tree = make_tree(tmp_path, 4)
+
+    assert len(tree["skill_files"]) == 4
+    assert len(list(tree["memory_dir"].glob("*.md"))) == 4
+    assert (tree["skills_dir"] / "skill-0" / "SKILL.md").exists()
+    assert (tree["skills_dir"] / "skill-1.md").exists()
+
+
+def test_run_benchmarks() -> None:
+    results = run_benchmarks([3], repeats=1)
+
+    assert set(results["results"]["3"]) == set(BENCHMARKS)
+    assert all(seconds >= 0 for seconds in results["results"]["3"].values())
+
+
+def _results(seconds: float) -> BenchResults:
+    return {"machine": "test", "python": "3.12", "results": {"10": {"bench": seconds}}}
+
+
+def test_compare_results() -> None:
+    baseline = _results(0.1)
+
+    assert compare_results(_results(0.12), baseline, threshold=0.25) == []
+    assert len(compare_results(_results(0.2), baseline, threshold=0.25)) == 1
+    assert compare_results(_results(0.004), _results(0.001), threshold=0.25) == []
@@ -0,0 +1,192 @@
+import io
+import json
+import os
+import shutil
+import tarfile
+from pathlib import Path
+
+import pytest
+
+from scripts.backups import BackupStore
+from scripts.bundle import (
+    BUNDLE_MANIFEST,
+    BundleError,
+    create_bundle,
+    extract_bundle,
+    relocate,
+    resolve,
+)
+from scripts.fsutil import hash_file
+from scripts.setup import SHELL_ALIASES, SKILLS_MANIFEST, InstallManifest, ManifestRecord
+
+
+def _record(kind: str, path: Path, expected: str = "", component: str = "shell") -> ManifestRecord:
+    return {"kind": kind, "path": str(path), "expected": expected, "component": component}
+
+
+@pytest.fixture
+def installed(tmp_path: Path) -> tuple[Path, Path, list[ManifestRecord]]:
+    """A repo checkout and a home set up from it, with a record of every kind."""
+    repo = tmp_path / "repo"
+    (repo / "shell").mkdir(parents=True)
+    (repo / "shell" / ".zshrc.loader").write_text("source __REPO_DIR__/shell/.zshrc\n")
+    (repo / "git").mkdir()
+    (repo / "git" / ".gitignore_global").write_text("*.pyc\n")
+
+    home = tmp_path / "home"
+    home.mkdir()
+    (home / ".gitignore_global").symlink_to(repo / "git" / ".gitignore_global")
+    (home / ".zshrc").write_text(
+        f"source {repo}/shell/.zshrc\neval $(host-only-tool)\n"
+        f"\n{SHELL_ALIASES['gemini']['comment']}\n{SHELL_ALIASES['gemini']['alias']}\n"
+    )
+    commands = home / ".gemini" / "commands"
+    commands.mkdir(parents=True)
+    (commands / "skill-a.toml").write_text('description = "A skill"\n')
+    (commands / SKILLS_MANIFEST).write_text(
+        json.dumps({"skills": {"skill-a": {"source": f"{repo}/ai/skills/skill-a/SKILL.md"}}})
+    )
+    rules = home / ".windsurf" / "rules.md"
+    rules.parent.mkdir()
+    rules.write_text("# Rules\n")
+    (home / ".claude" / "skills").mkdir(parents=True)
+
+    records = [
+        _record("symlink", home / ".gitignore_global", str(repo / "git" / ".gitignore_global")),
+        _record("file", home / ".zshrc"),
+        _record("dir", commands, component="ai:gemini"),
+        _record(
+            "file", commands / "skill-a.toml", hash_file(commands / "skill-a.toml"), "ai:gemini"
+        ),
+        _record(
+            "file",
+            commands / SKILLS_MANIFEST,
+            hash_file(commands / SKILLS_MANIFEST),
+            component="ai:gemini",
+        ),
+        _record("file", rules, hash_file(rules), component="ai:windsurf"),
+        _record("dir", home / ".claude" / "skills", component="ai:claude"),
+        _record("gitconfig", Path("include.path"), str(repo / "git" / ".gitconfig.shared"), "git"),
+    ]
+    return repo, home, records
+
+
+def test_relocate_and_resolve(tmp_path: Path) -> None:
+    home = tmp_path / "home"
+    repo = home / "dotfiles"
+
+    assert (
+        relocate(f"{repo}/git/.gitconfig.shared", home, repo)
+        == "__REPO_DIR__/git/.gitconfig.shared"
+    )
+    assert relocate(f"{home}/.gitignore_global", home, repo) == "__HOME__/.gitignore_global"
+    assert relocate(f"{home}-other/file", home, repo) == f"{home}-other/file"
+    assert resolve("__REPO_DIR__/git", Path("/h"), Path("/r")) == "/r/git"
+    assert resolve("__HOME__/.zshrc", Path("/h"), Path("/r")) == "/h/.zshrc"
+
+
+@pytest.mark.parametrize("suffix", [".tar.gz", ".tar.zst"])
+def test_bundle_round_trip(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    installed: tuple[Path, Path, list[ManifestRecord]],
+    suffix: str,
+) -> None:
+    if suffix == ".tar.zst" and shutil.which("zstd") is None:
+        pytest.skip("zstd is not installed")
+    monkeypatch.delenv("GIT_CONFIG_GLOBAL", raising=False)
+    repo, home, records = installed
+    archive = tmp_path / f"bundle{suffix}"
+
+    manifest = create_bundle(records, archive, home, repo)
+    assert manifest["templates"] == [".gemini/commands/.skills-manifest.json", ".zshrc"]
+
+    target_home = tmp_path / "container" / "root"
+    target_repo = Path("/opt/dotfiles")
+    extract_bundle(archive, target_home, target_repo)
+
+    link = target_home / ".gitignore_global"
+    assert os.readlink(link) == f"{target_repo}/git/.gitignore_global"
+    assert (target_home / ".zshrc").read_text() == (
+        f"source {target_repo}/shell/.zshrc\n"
+        f"\n{SHELL_ALIASES['gemini']['comment']}\n{SHELL_ALIASES['gemini']['alias']}\n"
+    )
+    assert (target_home / ".gemini" / "commands" / "skill-a.toml").exists()
+    skills_manifest = json.loads(
+        (target_home / ".gemini" / "commands" / SKILLS_MANIFEST).read_text()
+    )
+    assert skills_manifest["skills"]["skill-a"]["source"].startswith(f"{target_repo}/ai/")
+    assert (target_home / ".windsurf" / "rules.md").read_text() == "# Rules\n"
+    assert (target_home / ".claude" / "skills").is_dir()
+
+    state = target_home / ".local" / "state" / "dotfiles"
+    recorded = InstallManifest(state / "manifest.tsv").records()
+    assert [r["path"] for r in recorded][:2] == [str(link), str(target_home / ".zshrc")]
+    assert recorded[0]["expected"] == f"{target_repo}/git/.gitignore_global"
+    by_path = {r["path"]: r["expected"] for r in recorded}
+    for generated in [
+        target_home / ".windsurf" / "rules.md",
+        target_home / ".gemini" / "commands" / "skill-a.toml",
+        target_home / ".gemini" / "commands" / SKILLS_MANIFEST,
+    ]:
+        assert by_path[str(generated)] == hash_file(generated)
+    assert (target_home / ".gitconfig").read_text().count(
+        f"{target_repo}/git/.gitconfig.shared"
+    ) == 1
+
+    # Unpacking again replaces what is there without piling up git values
+    extract_bundle(archive, target_home, target_repo)
+    assert (target_home / ".gitconfig").read_text().count(".gitconfig.shared") == 1
+    assert len(InstallManifest(state / "manifest.tsv").records()) == len(records)
+
+
+def test_extract_backs_up_existing_files(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    installed: tuple[Path, Path, list[ManifestRecord]],
+) -> None:
+    monkeypatch.delenv("GIT_CONFIG_GLOBAL", raising=False)
+    repo, home, records = installed
+    archive = tmp_path / "bundle.tar.gz"
+    create_bundle(records, archive, home, repo)
+    target_home = tmp_path / "target"
+    target_home.mkdir()
+    (target_home / ".gitignore_global").write_text("mine\n")
+
+    extract_bundle(archive, target_home, repo)
+
+    assert (target_home / ".gitignore_global").is_symlink()
+    store = BackupStore(target_home / ".local" / "state" / "dotfiles" / "backups")
+    assert [entry["source"] for entry in store.entries()] == [
+        str(target_home / ".gitignore_global")
+    ]
+
+
+def test_create_rejects_paths_outside_home(tmp_path: Path) -> None:
+    outside = tmp_path / "elsewhere"
+    outside.write_text("x")
+
+    with pytest.raises(BundleError, match="outside"):
+        create_bundle([_record("file", outside)], tmp_path / "b.tar.gz", tmp_path / "home")
+
+
+def _write_tar(path: Path, members: dict[str, bytes]) -> None:
+    with tarfile.open(path, "w:gz") as tar:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+
+def test_extract_rejects_bad_archives(tmp_path: Path) -> None:
+    manifest = json.dumps({"version": 1, "created": 0, "records": [], "templates": []}).encode()
+    not_bundle = tmp_path / "plain.tar.gz"
+    _write_tar(not_bundle, {"file": b"x"})
+    escaping = tmp_path / "escaping.tar.gz"
+    _write_tar(escaping, {BUNDLE_MANIFEST: manifest, "../evil": b"x"})
+
+    with pytest.raises(BundleError, match="not a bundle"):
+        extract_bundle(not_bundle, tmp_path / "home")
+    with pytest.raises(BundleError, match="outside the home"):
+        extract_bundle(escaping, tmp_path / "home")
+    assert not (tmp_path / "evil").exists()
@@ -1,9 +1,10 @@
 import os
+import subprocess
 from pathlib import Path
 
 import pytest
 
-from tasks import COMPONENTS
+from tasks import COMPONENT_DEPS, COMPONENTS, _topological_order
 
 SYMLINK_SOURCES = [
     ("shell", "shell/.zprofile", "file"),
@@ -76,3 +77,66 @@ def test_copy_sources_exist(
 
 def test_platform_sh_exists(repo_root: Path) -> None:
     assert (repo_root / "lib" / "platform.sh").is_file()
+
+
+def test_component_deps_cover_components() -> None:
+    assert sorted(COMPONENT_DEPS) == sorted(COMPONENTS)
+    _topological_order(COMPONENT_DEPS)
+
+
+def test_with_package_lock(repo_root: Path, tmp_path: Path) -> None:
+    script = f"""
+        source "{repo_root}/lib/platform.sh"
+        log="{tmp_path}/log"
+        step() {{ echo "start $1" >> "$log"; sleep 0.2; echo "end $1" >> "$log"; }}
+        with_package_lock step a &
+        with_package_lock step b &
+        wait
+        with_package_lock false || echo "status $?" >> "$log"
+        mkdir "${{TMPDIR:-/tmp}}/dotfiles-package.lock"
+        echo 999999 > "${{TMPDIR:-/tmp}}/dotfiles-package.lock/pid"
+        with_package_lock step c
+    """
+    subprocess.run(["bash", "-c", script], check=True, env={**os.environ, "TMPDIR": str(tmp_path)})
+
+    lines = (tmp_path / "log").read_text().splitlines()
+    assert [line.split()[0] for line in lines[:4]] == ["start", "end", "start", "end"]
+    assert lines[4:] == ["status 1", "start c", "end c"]
+
+
+def test_apt_install_refreshes_index_once(repo_root: Path, tmp_path: Path) -> None:
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    sudo = bin_dir / "sudo"
+    sudo.write_text(f'#!/bin/bash\necho "$*" >> "{tmp_path}/log"\n')
+    sudo.chmod(0o755)
+    script = f"""
+        source "{repo_root}/lib/platform.sh"
+        with_package_lock apt_install zsh
+        with_package_lock apt_install direnv
+    """
+    env = {**os.environ, "TMPDIR": str(tmp_path), "PATH": f"{bin_dir}:{os.environ['PATH']}"}
+    subprocess.run(["bash", "-c", script], check=True, env=env)
+    subprocess.run(["bash", "-c", script], check=True, env={**env, "DOTFILES_APT_UPDATED": "1"})
+
+    assert (tmp_path / "log").read_text().splitlines() == [
+        "apt-get update -qq",
+        "apt-get install -y zsh",
+        "apt-get install -y direnv",
+        "apt-get install -y zsh",
+        "apt-get install -y direnv",
+    ]
+
+
+def test_ensure_symlink_records_artifact(repo_root: Path, tmp_path: Path) -> None:
+    script = f"""
+        source "{repo_root}/lib/platform.sh"
+        ensure_symlink "{repo_root}/shell/.zprofile" "{tmp_path}/.zprofile" ".zprofile"
+        ensure_symlink "{repo_root}/shell/.zprofile" "{tmp_path}/.zprofile" ".zprofile"
+    """
+    env = {**os.environ, "XDG_STATE_HOME": str(tmp_path / "state"), "DOTFILES_COMPONENT": "shell"}
+    subprocess.run(["bash", "-c", script], check=True, env=env, capture_output=True)
+
+    manifest = tmp_path / "state" / "dotfiles" / "manifest.tsv"
+    line = f"symlink\t{tmp_path}/.zprofile\t{repo_root}/shell/.zprofile\tshell"
+    assert manifest.read_text().splitlines() == [line, line]
@@ -0,0 +1,135 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from scripts.doctor import (
+    DoctorCheck,
+    check_binary,
+    check_git_key,
+    check_record,
+    check_tool,
+    run_probes,
+)
+from scripts.fsutil import hash_file
+from scripts.setup import ManifestRecord, SkillCatalog, ToolConfig, setup_tool
+
+
+def _record(kind: str, path: Path, expected: str = "") -> ManifestRecord:
+    return {"kind": kind, "path": str(path), "expected": expected, "component": "shell"}
+
+
+def test_check_record(tmp_path: Path) -> None:
+    source = tmp_path / "source"
+    source.write_text("content")
+    link = tmp_path / "link"
+    link.symlink_to(source)
+    file = tmp_path / "file"
+    file.write_text("generated")
+    tree = tmp_path / "tree"
+    tree.mkdir()
+
+    for record in [
+        _record("symlink", link, str(source)),
+        _record("file", file, hash_file(file)),
+        _record("file", file),
+        _record("tree", tree),
+    ]:
+        assert check_record(record)[0]["status"] == "ok"
+
+    file.write_text("edited")
+    drifted = {
+        "points to": _record("symlink", link, str(tmp_path / "elsewhere")),
+        "content changed": _record("file", file, hash_file(source)),
+        "missing": _record("dir", tmp_path / "gone"),
+        "replaced by a symlink": _record("file", link),
+        "no longer a symlink": _record("symlink", file, str(source)),
+        "no longer a directory": _record("tree", file),
+    }
+    for detail, record in drifted.items():
+        [check] = check_record(record)
+        assert check["status"] == "drift"
+        assert detail in check["detail"]
+
+
+def test_check_git_key(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    gitconfig = tmp_path / "gitconfig"
+    gitconfig.write_text("[include]\n\tpath = /repo/git/.gitconfig.shared\n")
+    monkeypatch.setenv("GIT_CONFIG_GLOBAL", str(gitconfig))
+
+    assert check_git_key("include.path", ["/repo/git/.gitconfig.shared"], 5)[0]["status"] == "ok"
+    assert check_git_key("include.path", [""], 5)[0]["status"] == "ok"
+    [moved] = check_git_key("include.path", ["/other/.gitconfig.shared"], 5)
+    assert moved["status"] == "drift"
+    assert "missing /other/.gitconfig.shared" in moved["detail"]
+    assert check_git_key("core.excludesfile", [""], 5)[0]["detail"] == "not set"
+
+
+def test_check_tool(tmp_path: Path) -> None:
+    ai_root = tmp_path / "ai"
+    (ai_root / "modules" / "demo").mkdir(parents=True)
+    (ai_root / "modules" / "demo" / "DEMO.md").write_text("# Demo")
+    (ai_root / "skills" / "skill-a").mkdir(parents=True)
+    (ai_root / "skills" / "skill-a" / "SKILL.md").write_text(
+        "---\nname: skill-a\ndescription: A skill\n---\n# skill-a"
+    )
+    (ai_root / "memory").mkdir()
+    (ai_root / "memory" / "base.md").write_text("# Base")
+    config_dir = tmp_path / "home" / ".demo"
+    tool_config: ToolConfig = {
+        "name": "Demo",
+        "config_dir": str(config_dir),
+        "tool_dir": "modules/demo",
+        "symlinks": [{"source": "DEMO.md", "target": "DEMO.md"}],
+        "skills_symlink": {"source": "skills", "target": "skills"},
+        "skills_generate": {"source": "skills", "target": "commands", "format": "toml"},
+        "memory_generate": {"source": "memory", "target": "rules.md", "mode": "single_file"},
+    }
+    setup_tool("demo", tool_config, ai_root)
+
+    checks = check_tool("demo", tool_config, ai_root, SkillCatalog())
+    assert [check["check"] for check in checks] == ["links", "skills", "memory"]
+    assert all(check["status"] == "ok" for check in checks)
+
+    (config_dir / "skills" / "skill-a").unlink()
+    (config_dir / "commands" / "skill-a.toml").write_text("edited")
+    (ai_root / "memory" / "python.md").write_text("# Python")
+    links, skills, memory = check_tool("demo", tool_config, ai_root, SkillCatalog())
+    assert links["detail"] == f"create {config_dir / 'skills' / 'skill-a'}"
+    assert skills["detail"] == "out of date: skill-a"
+    assert memory["status"] == "drift"
+
+
+def test_check_binary() -> None:
+    [python] = check_binary(sys.executable, timeout=10)
+    assert python["status"] == "ok"
+    assert python["detail"].startswith("Python")
+    assert check_binary("no-such-binary-xyz", timeout=10)[0]["detail"] == "not installed"
+
+
+def test_run_probes() -> None:
+    def slow() -> list[DoctorCheck]:
+        time.sleep(1)
+        return []
+
+    def broken() -> list[DoctorCheck]:
+        raise OSError("boom")
+
+    start = time.monotonic()
+    checks = run_probes(
+        {
+            "fast": lambda: check_binary("no-such-binary-xyz", timeout=1),
+            "slow": slow,
+            "broken": broken,
+        },
+        timeout=0.2,
+    )
+
+    assert time.monotonic() - start < 0.8
+    assert [(c["subject"], c["status"]) for c in checks] == [
+        ("no-such-binary-xyz", "drift"),
+        ("slow", "timeout"),
+        ("broken", "drift"),
+    ]
+    assert checks[2]["detail"] == "failed: boom"
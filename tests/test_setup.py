@@ -1,12 +1,36 @@
+import json
+import sys
+import time
 from pathlib import Path
 from textwrap import dedent
 
+import pytest
+
+import scripts.setup
+from scripts.backups import BackupStore
+from scripts.fsutil import clone_file, hash_file
 from scripts.setup import (
+    MEMORY_MANIFEST,
+    SKILLS_MANIFEST,
+    InotifyWatcher,
+    InstallManifest,
+    PollingWatcher,
+    SkillCatalog,
+    apply_plan,
     convert_md_to_toml,
     ensure_settings_from_template,
     find_skill_files,
     generate_memory,
+    generate_skills,
+    memory_is_current,
+    outdated_skills,
     parse_frontmatter,
+    plan_skill_links,
+    plan_symlink,
+    refresh_changed,
+    repo_commit,
+    setup_tool,
+    setup_tools,
 )
 
 
@@ -115,6 +139,200 @@ def test_find_skill_files_ignores_readme(tmp_path: Path) -> None:
     assert "my-skill" in names
 
 
+def _write_skill(skills_dir: Path, name: str, description: str = "A skill") -> Path:
+    skill_dir = skills_dir / name
+    skill_dir.mkdir(parents=True, exist_ok=True)
+    skill_file = skill_dir / "SKILL.md"
+    skill_file.write_text(f"---\nname: {name}\ndescription: {description}\n---\n# {name}")
+    return skill_file
+
+
+def test_generate_skills(tmp_path: Path) -> None:
+    skills_dir = tmp_path / "skills"
+    _write_skill(skills_dir, "skill-a")
+    _write_skill(skills_dir, "skill-b")
+    target_dir = tmp_path / "commands"
+
+    result = generate_skills(skills_dir, target_dir, "toml")
+
+    assert result is True
+    assert 'description = "A skill"' in (target_dir / "skill-a.toml").read_text()
+    assert (target_dir / "skill-b.toml").exists()
+    manifest = json.loads((target_dir / SKILLS_MANIFEST).read_text())
+    assert sorted(manifest["skills"]) == ["skill-a", "skill-b"]
+    assert manifest["format"] == "toml"
+
+
+def test_generate_skills_skips_unchanged(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    skills_dir = tmp_path / "skills"
+    _write_skill(skills_dir, "skill-a")
+    target_dir = tmp_path / "commands"
+    generate_skills(skills_dir, target_dir, "toml")
+
+    def fail_convert(_path: Path) -> str:
+        raise AssertionError("unchanged skill was regenerated")
+
+    monkeypatch.setattr("scripts.setup.convert_md_to_toml", fail_convert)
+
+    assert generate_skills(skills_dir, target_dir, "toml") is True
+    assert BackupStore().entries() == []
+
+
+def test_generate_skills_regenerates_changed(tmp_path: Path) -> None:
+    skills_dir = tmp_path / "skills"
+    skill_file = _write_skill(skills_dir, "skill-a")
+    _write_skill(skills_dir, "skill-b")
+    target_dir = tmp_path / "commands"
+    generate_skills(skills_dir, target_dir, "md")
+    untouched_mtime = (target_dir / "skill-b.md").stat().st_mtime_ns
+
+    skill_file.write_text("---\nname: skill-a\ndescription: Changed\n---\n# Changed body")
+    generate_skills(skills_dir, target_dir, "md")
+
+    assert "# Changed body" in (target_dir / "skill-a.md").read_text()
+    assert (target_dir / "skill-b.md").stat().st_mtime_ns == untouched_mtime
+
+
+def test_generate_skills_prunes_deleted(tmp_path: Path) -> None:
+    skills_dir = tmp_path / "skills"
+    _write_skill(skills_dir, "skill-a")
+    removed = _write_skill(skills_dir, "skill-b")
+    target_dir = tmp_path / "commands"
+    generate_skills(skills_dir, target_dir, "toml")
+
+    removed.unlink()
+    removed.parent.rmdir()
+    generate_skills(skills_dir, target_dir, "toml")
+
+    assert (target_dir / "skill-a.toml").exists()
+    assert not (target_dir / "skill-b.toml").exists()
+    manifest = json.loads((target_dir / SKILLS_MANIFEST).read_text())
+    assert list(manifest["skills"]) == ["skill-a"]
+
+
+def test_generate_skills_format_change_rewrites(tmp_path: Path) -> None:
+    skills_dir = tmp_path / "skills"
+    _write_skill(skills_dir, "skill-a")
+    target_dir = tmp_path / "commands"
+    generate_skills(skills_dir, target_dir, "toml")
+
+    generate_skills(skills_dir, target_dir, "md")
+
+    assert (target_dir / "skill-a.md").exists()
+    assert not (target_dir / "skill-a.toml").exists()
+
+
+def test_generate_skills_reads_each_skill_once(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    skills_dir = tmp_path / "skills"
+    for name in ["skill-a", "skill-b"]:
+        _write_skill(skills_dir, name)
+    reads: list[Path] = []
+    read_bytes = Path.read_bytes
+
+    def counting_read_bytes(self: Path) -> bytes:
+        reads.append(self)
+        return read_bytes(self)
+
+    monkeypatch.setattr(Path, "read_bytes", counting_read_bytes)
+    monkeypatch.setattr(Path, "read_text", lambda self: pytest.fail(f"read_text({self})"))
+
+    catalog = SkillCatalog()
+    for fmt in ["toml", "md", "json"]:
+        assert generate_skills(skills_dir, tmp_path / fmt, fmt, catalog=catalog) is True
+
+    assert sorted(path.parent.name for path in reads) == ["skill-a", "skill-b"]
+
+
+def test_generate_skills_json_index(tmp_path: Path) -> None:
+    skills_dir = tmp_path / "skills"
+    _write_skill(skills_dir, "skill-a", description="Does A")
+    target_dir = tmp_path / "commands"
+
+    generate_skills(skills_dir, target_dir, "json")
+
+    record = json.loads((target_dir / "skill-a.json").read_text())
+    assert record["description"] == "Does A"
+    assert record["prompt"] == "# skill-a"
+    index = json.loads((target_dir / "_index.json").read_text())
+    assert index == [{"name": "skill-a", "description": "Does A", "output": "skill-a.json"}]
+
+    generate_skills(skills_dir, target_dir, "toml")
+    assert not (target_dir / "_index.json").exists()
+    assert not (target_dir / "skill-a.json").exists()
+
+
+def test_generate_skills_keeps_index_setup_did_not_write(tmp_path: Path) -> None:
+    skills_dir = tmp_path / "skills"
+    _write_skill(skills_dir, "skill-a")
+    target_dir = tmp_path / "commands"
+    generate_skills(skills_dir, target_dir, "toml")
+    (target_dir / "_index.json").write_text("mine")
+
+    generate_skills(skills_dir, target_dir, "toml")
+
+    assert (target_dir / "_index.json").read_text() == "mine"
+
+
+def test_generate_skills_unknown_format(tmp_path: Path) -> None:
+    skills_dir = tmp_path / "skills"
+    _write_skill(skills_dir, "skill-a")
+
+    assert generate_skills(skills_dir, tmp_path / "commands", "yaml") is False
+
+
+@pytest.mark.parametrize("force", [False, True])
+def test_generate_skills_backs_up_unmanaged_dir(tmp_path: Path, force: bool) -> None:
+    skills_dir = tmp_path / "skills"
+    _write_skill(skills_dir, "skill-a")
+    target_dir = tmp_path / "commands"
+    if force:
+        generate_skills(skills_dir, target_dir, "toml")
+    else:
+        target_dir.mkdir()
+        (target_dir / "handwritten.toml").write_text("x")
+
+    generate_skills(skills_dir, target_dir, "toml", force=force)
+
+    assert [entry["source"] for entry in BackupStore().entries()] == [str(target_dir)]
+    assert (target_dir / "skill-a.toml").exists()
+    assert not (target_dir / "handwritten.toml").exists()
+
+
+def test_outdated_skills(tmp_path: Path) -> None:
+    skills_dir = tmp_path / "skills"
+    skill_file = _write_skill(skills_dir, "skill-a")
+    removed = _write_skill(skills_dir, "skill-b")
+    target_dir = tmp_path / "commands"
+
+    assert outdated_skills(skills_dir, target_dir, "toml") == ["skill-a", "skill-b"]
+    generate_skills(skills_dir, target_dir, "toml")
+    assert outdated_skills(skills_dir, target_dir, "toml") == []
+    assert outdated_skills(skills_dir, target_dir, "md") == ["skill-a", "skill-b"]
+
+    skill_file.write_text("---\nname: skill-a\ndescription: Changed\n---\n# Changed")
+    removed.unlink()
+    removed.parent.rmdir()
+    assert outdated_skills(skills_dir, target_dir, "toml") == ["skill-a", "skill-b"]
+
+
+@pytest.mark.parametrize("mode,target", [("single_file", "rules.md"), ("directory", "rules")])
+def test_memory_is_current(tmp_path: Path, mode: str, target: str) -> None:
+    memory_dir = tmp_path / "memory"
+    memory_dir.mkdir()
+    (memory_dir / "base.md").write_text("# Base Rules\n\nRule one.")
+    config_dir = tmp_path / "config"
+    config_dir.mkdir()
+
+    assert memory_is_current(memory_dir, config_dir, target, mode) is False
+    generate_memory(memory_dir, config_dir, target, mode)
+    assert memory_is_current(memory_dir, config_dir, target, mode) is True
+
+    (memory_dir / "python.md").write_text("# Python Rules")
+    assert memory_is_current(memory_dir, config_dir, target, mode) is False
+
+
 def test_generate_memory_single_file(tmp_path: Path) -> None:
     memory_dir = tmp_path / "memory"
     memory_dir.mkdir()
@@ -150,6 +368,142 @@ def test_generate_memory_directory(tmp_path: Path) -> None:
     assert rules_dir.is_dir()
     assert (rules_dir / "base.md").read_text() == "# Base Rules\n\nRule one."
     assert (rules_dir / "python.md").read_text() == "# Python Rules\n\nUse type hints."
+    assert not (rules_dir / "base.md").samefile(memory_dir / "base.md")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 64 * 1024])
+def test_generate_memory_single_file_streams(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, chunk_size: int
+) -> None:
+    monkeypatch.setattr(scripts.setup, "CHUNK_SIZE", chunk_size)
+    memory_dir = tmp_path / "memory"
+    memory_dir.mkdir()
+    parts = [
+        "\n\n  # Base\n\nRule  one.  \n\n",
+        "# Empty?\n",
+        " \t\n",
+        "\u00a0Caf\u00e9\r\nr\u00e8gle\u2028\u00a0\r\n",
+        "Last\t\n \n",
+    ]
+    for index, part in enumerate(parts):
+        (memory_dir / f"{index}.md").write_bytes(part.encode())
+
+    generate_memory(memory_dir, tmp_path, "rules.md", "single_file")
+
+    expected = "\n\n".join(path.read_text().strip() for path in sorted(memory_dir.iterdir()))
+    assert (tmp_path / "rules.md").read_bytes() == (expected + "\n").encode()
+    assert "\r" not in expected and "\u00a0" not in expected and "\u2028" not in expected
+
+
+def test_generate_memory_single_file_skips_unchanged(tmp_path: Path) -> None:
+    memory_dir = tmp_path / "memory"
+    memory_dir.mkdir()
+    (memory_dir / "base.md").write_text("Rule one.")
+    target = tmp_path / "rules.md"
+
+    generate_memory(memory_dir, tmp_path, "rules.md", "single_file")
+    inode = target.stat().st_ino
+    generate_memory(memory_dir, tmp_path, "rules.md", "single_file")
+    assert target.stat().st_ino == inode
+
+    (memory_dir / "base.md").write_text("Rule two.")
+    generate_memory(memory_dir, tmp_path, "rules.md", "single_file")
+    assert target.read_text() == "Rule two.\n"
+    assert target.stat().st_ino != inode
+    assert BackupStore().entries() == []
+
+
+def test_generate_memory_directory_skips_unchanged_and_prunes(tmp_path: Path) -> None:
+    memory_dir = tmp_path / "memory"
+    memory_dir.mkdir()
+    (memory_dir / "base.md").write_text("Rule one.")
+    (memory_dir / "old.md").write_text("Old rule.")
+    rules_dir = tmp_path / "rules"
+
+    generate_memory(memory_dir, tmp_path, "rules", "directory")
+    mtime = (rules_dir / "base.md").stat().st_mtime_ns
+    (memory_dir / "old.md").unlink()
+    generate_memory(memory_dir, tmp_path, "rules", "directory")
+
+    assert (rules_dir / "base.md").stat().st_mtime_ns == mtime
+    assert sorted(path.name for path in rules_dir.glob("*.md")) == ["base.md"]
+    assert BackupStore().entries() == []
+
+
+def test_generate_memory_directory_keeps_files_setup_did_not_write(tmp_path: Path) -> None:
+    memory_dir = tmp_path / "memory"
+    memory_dir.mkdir()
+    (memory_dir / "base.md").write_text("Rule one.")
+    (memory_dir / "old.md").write_text("Old rule.")
+    rules_dir = tmp_path / "rules"
+    rules_dir.mkdir()
+    (rules_dir / "mine.md").write_text("My own rule.")
+    (rules_dir / "base.md").write_text("Someone else's base.")
+
+    generate_memory(memory_dir, tmp_path, "rules", "directory")
+    (rules_dir / "old.md").write_text("Old rule, edited by hand.")
+    (memory_dir / "old.md").unlink()
+    generate_memory(memory_dir, tmp_path, "rules", "directory")
+
+    assert (rules_dir / "mine.md").read_text() == "My own rule."
+    assert (rules_dir / "base.md").read_text() == "Rule one."
+    assert not (rules_dir / "old.md").exists()
+    assert memory_is_current(memory_dir, tmp_path, "rules", "directory") is True
+    assert sorted(Path(entry["source"]).name for entry in BackupStore().entries()) == [
+        "base.md",
+        "old.md",
+    ]
+
+
+def test_generate_memory_single_file_backs_up_hand_edits(tmp_path: Path) -> None:
+    memory_dir = tmp_path / "memory"
+    memory_dir.mkdir()
+    (memory_dir / "base.md").write_text("Rule one.")
+    target = tmp_path / "rules.md"
+
+    generate_memory(memory_dir, tmp_path, "rules.md", "single_file")
+    target.write_text("Rule one.\nMy own addition.\n")
+    generate_memory(memory_dir, tmp_path, "rules.md", "single_file")
+
+    assert target.read_text() == "Rule one.\n"
+    (entry,) = BackupStore().entries()
+    assert entry["source"] == str(target)
+    BackupStore().restore(entry["id"], tmp_path / "restored.md")
+    assert (tmp_path / "restored.md").read_text() == "Rule one.\nMy own addition.\n"
+
+
+def test_repo_commit(tmp_path: Path) -> None:
+    git_dir = tmp_path / ".git"
+    (git_dir / "refs" / "heads").mkdir(parents=True)
+    (git_dir / "HEAD").write_text("ref: refs/heads/main\n")
+    (git_dir / "packed-refs").write_text("# pack-refs\nabc123 refs/heads/main\n")
+    assert repo_commit(tmp_path) == "abc123"
+
+    (git_dir / "refs" / "heads" / "main").write_text("def456\n")
+    assert repo_commit(tmp_path) == "def456"
+
+    worktree_git_dir = git_dir / "worktrees" / "wt"
+    worktree_git_dir.mkdir(parents=True)
+    (worktree_git_dir / "HEAD").write_text("ref: refs/heads/main\n")
+    (worktree_git_dir / "commondir").write_text("../..\n")
+    worktree = tmp_path / "wt"
+    worktree.mkdir()
+    (worktree / ".git").write_text(f"gitdir: {worktree_git_dir}\n")
+    assert repo_commit(worktree) == "def456"
+    assert repo_commit(tmp_path / "missing") == ""
+
+
+@pytest.mark.parametrize("allow_hardlink", [True, False])
+def test_clone_file(tmp_path: Path, allow_hardlink: bool) -> None:
+    source = tmp_path / "source.md"
+    source.write_text("content")
+    target = tmp_path / "target.md"
+
+    method = clone_file(source, target, allow_hardlink=allow_hardlink)
+
+    assert target.read_text() == "content"
+    assert (method == "hardlink") == allow_hardlink
+    assert target.samefile(source) == allow_hardlink
 
 
 def test_generate_memory_missing_source(tmp_path: Path) -> None:
@@ -192,3 +546,381 @@ def test_ensure_settings_from_template_creates_from_template(tmp_path: Path) ->
 
     assert result is True
     assert '"from": "template"' in (tmp_path / "settings.json").read_text()
+
+
+def _fake_setup_tool(tool_id: str, _tool_config: object, _ai_root: Path, **_kwargs: bool) -> bool:
+    if tool_id == "broken":
+        raise RuntimeError("boom")
+    time.sleep(0.05 if tool_id == "slow" else 0)
+    print(f"setting up {tool_id}")
+    return True
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_setup_tools(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+    jobs: int,
+) -> None:
+    monkeypatch.setattr("scripts.setup.setup_tool", _fake_setup_tool)
+    tools = {tool_id: {"name": tool_id} for tool_id in ["slow", "fast", "last"]}
+
+    results = setup_tools(tools, tmp_path, jobs=jobs)  # type: ignore[arg-type]
+
+    assert list(results) == ["slow", "fast", "last"]
+    assert all(results.values())
+    lines = capsys.readouterr().out.splitlines()
+    assert lines == ["setting up slow", "setting up fast", "setting up last"]
+
+
+def test_setup_tools_isolates_failures(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    monkeypatch.setattr("scripts.setup.setup_tool", _fake_setup_tool)
+    tools = {tool_id: {"name": tool_id} for tool_id in ["broken", "fast"]}
+
+    results = setup_tools(tools, tmp_path, jobs=2)  # type: ignore[arg-type]
+
+    assert results == {"broken": False, "fast": True}
+    out = capsys.readouterr().out
+    assert "broken setup failed: boom" in out
+    assert out.index("boom") < out.index("setting up fast")
+
+
+@pytest.mark.parametrize(
+    "scenario, expected",
+    [
+        ("missing_target", "create"),
+        ("correct_link", "skip"),
+        ("stale_link", "replace"),
+        ("real_file", "replace"),
+        ("missing_source", "missing"),
+    ],
+)
+def test_plan_symlink(tmp_path: Path, scenario: str, expected: str) -> None:
+    source = tmp_path / "source.md"
+    if scenario != "missing_source":
+        source.write_text("source")
+    target = tmp_path / "target.md"
+    if scenario == "correct_link":
+        target.symlink_to(source)
+    elif scenario == "stale_link":
+        target.symlink_to(tmp_path / "elsewhere.md")
+    elif scenario == "real_file":
+        target.write_text("real")
+
+    action = plan_symlink(source, target, "source.md")
+
+    assert action["action"] == expected
+
+
+def test_plan_skill_links(tmp_path: Path) -> None:
+    skills_dir = tmp_path / "skills"
+    _write_skill(skills_dir, "skill-a")
+    _write_skill(skills_dir, "skill-b")
+    target_dir = tmp_path / "config" / "skills"
+    assert apply_plan(plan_skill_links([skills_dir], target_dir)) is True
+
+    (skills_dir / "skill-b" / "SKILL.md").unlink()
+    (skills_dir / "skill-b").rmdir()
+    foreign = tmp_path / "foreign"
+    foreign.mkdir()
+    (target_dir / "foreign").symlink_to(foreign)
+
+    actions = plan_skill_links([skills_dir], target_dir)
+
+    assert {a["label"]: a["action"] for a in actions} == {
+        "skills": "skip",
+        "skill-a": "skip",
+        "skill-b": "prune",
+    }
+    apply_plan(actions)
+    assert not (target_dir / "skill-b").is_symlink()
+    assert (target_dir / "foreign").is_symlink()
+
+
+def _make_tool(tmp_path: Path) -> tuple[dict[str, object], Path]:
+    ai_root = tmp_path / "ai"
+    (ai_root / "modules" / "demo").mkdir(parents=True)
+    (ai_root / "modules" / "demo" / "DEMO.md").write_text("# Demo")
+    _write_skill(ai_root / "skills", "skill-a")
+    tool_config: dict[str, object] = {
+        "name": "Demo",
+        "config_dir": str(tmp_path / "home" / ".demo"),
+        "tool_dir": "modules/demo",
+        "symlinks": [{"source": "DEMO.md", "target": "DEMO.md"}],
+        "skills_symlink": {"source": "skills", "target": "skills"},
+        "skills_generate": {"source": "skills", "target": "commands", "format": "toml"},
+    }
+    return tool_config, ai_root
+
+
+def test_setup_tool_dry_run(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    tool_config, ai_root = _make_tool(tmp_path)
+
+    result = setup_tool("demo", tool_config, ai_root, dry_run=True)  # type: ignore[arg-type]
+
+    assert result is True
+    assert not (tmp_path / "home").exists()
+    out = capsys.readouterr().out
+    assert "create" in out
+    assert "skill-a.toml" in out
+
+
+def test_setup_tool_dry_run_reports_stale_memory_only(
+    tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    tool_config, ai_root = _make_tool(tmp_path)
+    (ai_root / "memory").mkdir()
+    (ai_root / "memory" / "a.md").write_text("# A")
+    tool_config["memory_generate"] = {
+        "source": "memory",
+        "target": "MEMORY.md",
+        "mode": "single_file",
+    }
+
+    setup_tool("demo", tool_config, ai_root, dry_run=True)  # type: ignore[arg-type]
+    assert "Would regenerate memory MEMORY.md" in capsys.readouterr().out
+
+    setup_tool("demo", tool_config, ai_root)  # type: ignore[arg-type]
+    capsys.readouterr()
+    setup_tool("demo", tool_config, ai_root, dry_run=True)  # type: ignore[arg-type]
+    assert "Would regenerate memory" not in capsys.readouterr().out
+
+
+def test_setup_tool_rerun_leaves_links_untouched(tmp_path: Path) -> None:
+    tool_config, ai_root = _make_tool(tmp_path)
+    setup_tool("demo", tool_config, ai_root)  # type: ignore[arg-type]
+    config_dir = tmp_path / "home" / ".demo"
+    before = {p: p.lstat().st_mtime_ns for p in config_dir.rglob("*")}
+
+    assert setup_tool("demo", tool_config, ai_root) is True  # type: ignore[arg-type]
+
+    assert {p: p.lstat().st_mtime_ns for p in config_dir.rglob("*")} == before
+    assert BackupStore().entries() == []
+
+
+def test_install_manifest(tmp_path: Path) -> None:
+    manifest = InstallManifest(tmp_path / "manifest.tsv")
+    manifest.record(
+        [
+            {"kind": "symlink", "path": "/h/.zprofile", "expected": "/old", "component": "shell"},
+            {"kind": "gitconfig", "path": "include.path", "expected": "/a", "component": "git"},
+            {"kind": "gitconfig", "path": "include.path", "expected": "/b", "component": "git"},
+        ]
+    )
+    manifest.record(
+        [{"kind": "symlink", "path": "/h/.zprofile", "expected": "/new", "component": "shell"}]
+    )
+    with open(manifest.path, "a") as f:
+        f.write("garbage line\n")
+
+    records = manifest.records()
+    assert [(r["path"], r["expected"]) for r in records] == [
+        ("/h/.zprofile", "/new"),
+        ("include.path", "/a"),
+        ("include.path", "/b"),
+    ]
+
+    manifest.compact()
+    assert len(manifest.path.read_text().splitlines()) == 3
+    assert manifest.records() == records
+
+
+def test_setup_tool_records_manifest(tmp_path: Path) -> None:
+    tool_config, ai_root = _make_tool(tmp_path)
+    config_dir = tmp_path / "home" / ".demo"
+
+    setup_tool("demo", tool_config, ai_root)  # type: ignore[arg-type]
+
+    commands = config_dir / "commands"
+    records = {(r["kind"], r["path"]): r["expected"] for r in InstallManifest().records()}
+    assert records == {
+        ("symlink", str(config_dir / "DEMO.md")): str(ai_root / "modules" / "demo" / "DEMO.md"),
+        ("dir", str(config_dir / "skills")): "",
+        ("symlink", str(config_dir / "skills" / "skill-a")): str(ai_root / "skills" / "skill-a"),
+        ("dir", str(commands)): "",
+        ("file", str(commands / "skill-a.toml")): hash_file(commands / "skill-a.toml"),
+        ("file", str(commands / SKILLS_MANIFEST)): hash_file(commands / SKILLS_MANIFEST),
+    }
+
+
+def test_setup_tool_records_generated_memory_files(tmp_path: Path) -> None:
+    tool_config, ai_root = _make_tool(tmp_path)
+    (ai_root / "memory").mkdir()
+    (ai_root / "memory" / "a.md").write_text("# A")
+    tool_config["memory_generate"] = {"source": "memory", "target": "rules", "mode": "directory"}
+    rules = tmp_path / "home" / ".demo" / "rules"
+
+    setup_tool("demo", tool_config, ai_root)  # type: ignore[arg-type]
+
+    records = {(r["kind"], r["path"]): r["expected"] for r in InstallManifest().records()}
+    assert records[("dir", str(rules))] == ""
+    assert records[("file", str(rules / "a.md"))] == hash_file(rules / "a.md")
+    assert ("file", str(rules / MEMORY_MANIFEST)) in records
+    assert not any(kind == "tree" for kind, _ in records)
+
+
+def test_skill_catalog(tmp_path: Path) -> None:
+    skills_dir = tmp_path / "skills"
+    _write_skill(skills_dir, "skill-a", description="First")
+    (skills_dir / "legacy.md").write_text("---\ndescription: Flat\n---\nBody")
+    (skills_dir / "README.md").write_text("# Readme")
+
+    skills = SkillCatalog().skills(skills_dir)
+
+    by_name = {skill["name"]: skill for skill in skills}
+    assert sorted(by_name) == ["legacy", "skill-a"]
+    assert by_name["skill-a"]["frontmatter"]["description"] == "First"
+    assert by_name["skill-a"]["flat"] is False
+    assert by_name["legacy"]["flat"] is True
+
+
+def test_skill_catalog_reuses_persisted_index(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    skills_dir = tmp_path / "skills"
+    _write_skill(skills_dir, "skill-a")
+    cache_path = tmp_path / "cache" / "catalog.json"
+    catalog = SkillCatalog(cache_path)
+    first = catalog.skills(skills_dir)
+    catalog.save()
+
+    def fail_scan(_source_dir: Path) -> None:
+        raise AssertionError("unchanged directory was rescanned")
+
+    monkeypatch.setattr("scripts.setup._scan_skills", fail_scan)
+    monkeypatch.setattr("scripts.setup.parse_frontmatter", fail_scan)
+
+    assert SkillCatalog(cache_path).skills(skills_dir) == first
+
+
+@pytest.mark.parametrize("change", ["edit_skill", "add_skill", "add_skill_file_later"])
+def test_skill_catalog_invalidated_by_changes(tmp_path: Path, change: str) -> None:
+    skills_dir = tmp_path / "skills"
+    skill_file = _write_skill(skills_dir, "skill-a")
+    (skills_dir / "skill-b").mkdir()
+    cache_path = tmp_path / "catalog.json"
+    catalog = SkillCatalog(cache_path)
+    catalog.skills(skills_dir)
+    catalog.save()
+
+    if change == "edit_skill":
+        skill_file.write_text("---\nname: skill-a\ndescription: Edited and longer\n---\n# A")
+    elif change == "add_skill":
+        _write_skill(skills_dir, "skill-c")
+    else:
+        (skills_dir / "skill-b" / "SKILL.md").write_text("---\ndescription: B\n---\n# B")
+
+    skills = {skill["name"]: skill for skill in SkillCatalog(cache_path).skills(skills_dir)}
+
+    if change == "edit_skill":
+        assert skills["skill-a"]["frontmatter"]["description"] == "Edited and longer"
+    elif change == "add_skill":
+        assert "skill-c" in skills
+    else:
+        assert "skill-b" in skills
+
+
+def test_skill_catalog_scans_once_per_run(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    skills_dir = tmp_path / "skills"
+    _write_skill(skills_dir, "skill-a")
+    calls: list[Path] = []
+    original_scan = scripts.setup._scan_skills
+
+    def counting_scan(source_dir: Path) -> tuple[list[tuple[str, Path]], dict[str, int]]:
+        calls.append(source_dir)
+        return original_scan(source_dir)
+
+    monkeypatch.setattr("scripts.setup._scan_skills", counting_scan)
+    catalog = SkillCatalog()
+
+    generate_skills(skills_dir, tmp_path / "gemini", "toml", catalog=catalog)
+    generate_skills(skills_dir, tmp_path / "cursor", "md", catalog=catalog)
+    apply_plan(plan_skill_links([skills_dir], tmp_path / "claude", catalog))
+
+    assert calls == [skills_dir]
+
+
+@pytest.mark.parametrize(
+    "watcher_cls",
+    [
+        PollingWatcher,
+        pytest.param(
+            InotifyWatcher,
+            marks=pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Linux only"),
+        ),
+    ],
+)
+def test_watcher(tmp_path: Path, watcher_cls: type[PollingWatcher]) -> None:
+    skill_file = _write_skill(tmp_path, "skill-a")
+    watcher = watcher_cls([tmp_path])
+
+    assert watcher.poll(0) == set()
+    skill_file.write_text("---\ndescription: Edited\n---\n# Edited")
+    new_skill = _write_skill(tmp_path, "skill-b")
+    changed: set[Path] = set()
+    while more := watcher.poll(1):
+        changed |= more
+        if skill_file in changed and new_skill in changed:
+            break
+    watcher.close()
+
+    assert skill_file in changed
+    assert new_skill in changed
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Linux only")
+def test_inotify_watcher_survives_unwatchable_directory(
+    tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    watcher = InotifyWatcher([tmp_path])
+    libc = watcher._libc
+
+    class FailingLibc:
+        def __getattr__(self, name: str) -> object:
+            return getattr(libc, name)
+
+        def inotify_add_watch(self, fd: int, path: bytes, mask: int) -> int:
+            return -1 if b"blocked" in path else int(libc.inotify_add_watch(fd, path, mask))
+
+    watcher._libc = FailingLibc()  # type: ignore[assignment]
+    (tmp_path / "blocked").mkdir()
+    (tmp_path / "fine").mkdir()
+    changed: set[Path] = set()
+    while more := watcher.poll(1):
+        changed |= more
+        if {tmp_path / "blocked", tmp_path / "fine"} <= changed:
+            break
+    (tmp_path / "fine" / "new.md").write_text("new")
+    changed = watcher.poll(1)
+    watcher.close()
+
+    assert tmp_path / "fine" / "new.md" in changed
+    assert f"not watching {tmp_path / 'blocked'}" in capsys.readouterr().out
+
+
+def test_refresh_changed(tmp_path: Path) -> None:
+    tool_config, ai_root = _make_tool(tmp_path)
+    other_config = {**tool_config, "name": "Other", "config_dir": str(tmp_path / "home" / ".o")}
+    del other_config["skills_symlink"], other_config["skills_generate"]
+    tools = {"demo": tool_config, "other": other_config}
+    catalog = SkillCatalog()
+    setup_tool("demo", tool_config, ai_root, catalog=catalog)  # type: ignore[arg-type]
+
+    skill_file = _write_skill(ai_root / "skills", "skill-a", description="Edited")
+    new_skill = _write_skill(ai_root / "skills", "skill-b")
+
+    refreshed = refresh_changed(
+        {skill_file, new_skill.parent},
+        tools,  # type: ignore[arg-type]
+        ai_root,
+        catalog,
+    )
+
+    commands = tmp_path / "home" / ".demo" / "commands"
+    assert refreshed == ["demo"]
+    assert 'description = "Edited"' in (commands / "skill-a.toml").read_text()
+    assert (commands / "skill-b.toml").exists()
+    assert (tmp_path / "home" / ".demo" / "skills" / "skill-b").is_symlink()
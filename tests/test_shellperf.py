@@ -0,0 +1,125 @@
+import platform
+from pathlib import Path
+
+import pytest
+
+from scripts.shellperf import (
+    ShellperfEntry,
+    ShellperfRun,
+    append_history,
+    commit_trends,
+    find_regressions,
+    load_history,
+    make_entry,
+    parse_sink,
+    percentile,
+    run_cold,
+    summarize,
+)
+
+SINK = "base\tLoaded base configs\t12.5\nbase\tLoaded Starship prompt\t7.5\ntotal\tstartup\t40\n"
+
+
+def test_parse_sink() -> None:
+    timings = parse_sink(SINK + "not a timing\nbase\tbroken\tfast\n")
+
+    assert timings == {
+        "base::Loaded base configs": 12.5,
+        "base::Loaded Starship prompt": 7.5,
+        "base": 20.0,
+        "total": 40.0,
+    }
+
+
+def test_percentile() -> None:
+    values = [float(n) for n in range(1, 101)]
+
+    assert percentile(values, 0.5) == pytest.approx(50.5)
+    assert percentile(values, 0.95) == pytest.approx(95.05)
+    assert percentile([3.0], 0.95) == 3.0
+
+
+def test_summarize() -> None:
+    runs: list[ShellperfRun] = [
+        {"wall": 50.0, "timings": {"base": 10.0, "total": 30.0}},
+        {"wall": 70.0, "timings": {"base": 20.0, "total": 40.0, "work": 5.0}},
+    ]
+
+    stats = summarize(runs)
+
+    assert stats["base"]["mean"] == 15.0
+    assert stats["base"]["p50"] == 15.0
+    assert stats["base"]["stddev"] == pytest.approx(7.0711, abs=1e-4)
+    assert stats["wall"]["runs"] == 2
+    assert stats["work"] == {"runs": 1, "mean": 5.0, "p50": 5.0, "p95": 5.0, "stddev": 0.0}
+
+
+def test_run_cold() -> None:
+    command = ["sh", "-c", f"printf '{SINK}' >> \"$SHELLPERF_SINK\""]
+
+    runs = run_cold(3, command=command)
+
+    assert len(runs) == 3
+    assert all(run["timings"]["total"] == 40.0 for run in runs)
+    assert all(run["wall"] > 0 for run in runs)
+
+
+def test_run_cold_fails_without_timings() -> None:
+    with pytest.raises(RuntimeError, match="no timings"):
+        run_cold(1, command=["true"])
+    with pytest.raises(RuntimeError, match="exited 3"):
+        run_cold(1, command=["sh", "-c", "exit 3"])
+
+
+def _entry(commit: str, when: float, total: float, base: float) -> ShellperfEntry:
+    return {
+        "time": when,
+        "commit": commit,
+        "host": "host",
+        "mode": "cold",
+        "runs": 10,
+        "total": total,
+        "timings": {"base": base, "base::Loaded base configs": base},
+    }
+
+
+def test_history_round_trip(tmp_path: Path) -> None:
+    path = tmp_path / "shellperf.jsonl"
+    entry = make_entry("warm", 1, 40.0, parse_sink(SINK))
+    append_history(entry, path)
+    append_history(_entry("abc", 1.0, 50.0, 10.0), path)
+    with open(path, "a") as f:
+        f.write("{truncated\n")
+
+    history = load_history(path)
+
+    assert [item["total"] for item in history] == [50.0, 40.0]
+    assert history[1]["host"] == platform.node()
+    assert len(history[1]["commit"]) == 40
+    assert "total" not in history[1]["timings"]
+    assert load_history(tmp_path / "missing.jsonl") == []
+
+
+def test_commit_trends_and_regressions() -> None:
+    entries = [
+        _entry("a", 1.0, 100.0, 10.0),
+        _entry("a", 2.0, 110.0, 12.0),
+        _entry("b", 3.0, 104.0, 11.0),
+        _entry("c", 4.0, 150.0, 30.0),
+        _entry("c", 5.0, 152.0, 31.0),
+    ]
+
+    trends = commit_trends(entries)
+
+    assert [trend["commit"] for trend in trends] == ["a", "b", "c"]
+    assert trends[0]["entries"] == 2
+    assert trends[0]["timings"] == {"total": 105.0, "base": 11.0}
+
+    regressions = find_regressions(trends, threshold=0.2)
+
+    assert [(r["key"], r["commit"], r["previous_commit"]) for r in regressions] == [
+        ("total", "c", "b"),
+        ("base", "c", "b"),
+    ]
+    # Small absolute changes are noise however large they are relatively
+    assert find_regressions(trends, threshold=0.2, noise_floor=50.0) == []
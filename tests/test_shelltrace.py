@@ -0,0 +1,106 @@
+import json
+from pathlib import Path
+
+from scripts.shelltrace import (
+    fold_trace,
+    parse_trace,
+    run_trace,
+    slowest_lines,
+    to_collapsed,
+    to_speedscope,
+)
+
+# ~/.zshrc sources shell/.zshrc, which evals direnv's hook; the hook defines a function
+TRACE = """\
++100.000000\t/home/u/.zshrc\t1\t1\tzmodload zsh/datetime
++100.001000\t/home/u/.zshrc\t15\t1\tsource /home/u/dotfiles/shell/.zshrc
++100.002000\t/home/u/dotfiles/shell/.zshrc\t3\t2\ttimed_eval direnv hook zsh
++100.012000\t(eval)\t1\t3\t_direnv_hook () {
+  eval "$(direnv export zsh)"
+}
++100.013000\t/home/u/dotfiles/shell/.zshrc\t4\t2\tevaluated_cmds[starship]=1
++100.015000\t/home/u/.zshrc\t20\t1\texport FOO=1
+some unrelated stderr output
++100.016000\t/home/u/.zshrc\t21\t1\texit
+"""
+
+
+def test_parse_trace() -> None:
+    lines = parse_trace(TRACE)
+
+    assert len(lines) == 7
+    assert lines[2] == {
+        "time": 100.002,
+        "name": "/home/u/dotfiles/shell/.zshrc",
+        "line": 3,
+        "depth": 2,
+        "command": "timed_eval direnv hook zsh",
+    }
+
+
+def test_fold_trace_nests_lines_under_their_caller() -> None:
+    samples = fold_trace(parse_trace(TRACE), home="/home/u")
+
+    assert [sample["stack"] for sample in samples] == [
+        ["~/.zshrc:1"],
+        ["~/.zshrc:15"],
+        ["~/.zshrc:15", "~/dotfiles/shell/.zshrc:3"],
+        ["~/.zshrc:15", "~/dotfiles/shell/.zshrc:3", "(eval):1"],
+        ["~/.zshrc:15", "~/dotfiles/shell/.zshrc:4"],
+        ["~/.zshrc:20"],
+    ]
+    assert [sample["micros"] for sample in samples] == [1000, 1000, 10000, 1000, 2000, 1000]
+
+
+def test_slowest_lines() -> None:
+    samples = fold_trace(parse_trace(TRACE), home="/home/u")
+
+    slowest = slowest_lines(samples, 2)
+
+    assert slowest == [
+        {
+            "frame": "~/dotfiles/shell/.zshrc:3",
+            "micros": 10000,
+            "command": "timed_eval direnv hook zsh",
+        },
+        {"frame": "~/dotfiles/shell/.zshrc:4", "micros": 2000, "command": slowest[1]["command"]},
+    ]
+
+
+def test_to_collapsed() -> None:
+    samples = fold_trace(parse_trace(TRACE), home="/home/u")
+
+    collapsed = to_collapsed(samples).splitlines()
+
+    assert "~/.zshrc:15;~/dotfiles/shell/.zshrc:3 10000" in collapsed
+    assert "~/.zshrc:15;~/dotfiles/shell/.zshrc:3;(eval):1 1000" in collapsed
+    assert len(collapsed) == 6
+
+
+def test_to_speedscope() -> None:
+    samples = fold_trace(parse_trace(TRACE), home="/home/u")
+
+    profile = to_speedscope(samples)
+
+    frames = [frame["name"] for frame in profile["shared"]["frames"]]  # type: ignore[index]
+    sampled = profile["profiles"][0]  # type: ignore[index]
+    assert frames[:3] == ["~/.zshrc:1", "~/.zshrc:15", "~/dotfiles/shell/.zshrc:3"]
+    assert sampled["samples"][3] == [1, 2, 3]
+    assert sampled["endValue"] == 16000
+    json.dumps(profile)
+
+
+def test_run_trace(tmp_path: Path) -> None:
+    trace_path = tmp_path / "traces" / "startup.trace"
+    # Stands in for zsh: checks the shim is in place and writes one traced line
+    command = [
+        "sh",
+        "-c",
+        'test -f "$ZDOTDIR/.zshenv" && printf "+1.5\\t%s\\t1\\t1\\texit\\n" "$ZDOTDIR" >&2',
+    ]
+
+    run_trace(trace_path, command=command)
+
+    lines = parse_trace(trace_path.read_text())
+    assert len(lines) == 1
+    assert "shelltrace-" in lines[0]["name"]
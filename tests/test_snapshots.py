@@ -0,0 +1,89 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from scripts.snapshots import SnapshotStore
+
+
+@pytest.fixture
+def git_config(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    path = tmp_path / "gitconfig"
+    monkeypatch.setenv("GIT_CONFIG_GLOBAL", str(path))
+    return path
+
+
+def _git(*args: str) -> str:
+    return subprocess.run(
+        ["git", "config", "--global", *args], capture_output=True, text=True
+    ).stdout
+
+
+def test_snapshot_restores_paths(tmp_path: Path, git_config: Path) -> None:
+    home = tmp_path / "home"
+    home.mkdir()
+    zshrc = home / ".zshrc"
+    zshrc.write_text("original")
+    zshrc.chmod(0o600)
+    zprofile = home / ".zprofile"
+    zprofile.symlink_to("/repo/shell/.zprofile")
+    skills = home / ".claude" / "skills"
+    skills.mkdir(parents=True)
+    (skills / "a").symlink_to("/repo/skills/a")
+    (skills / "mine").mkdir()
+    (skills / "mine" / "SKILL.md").write_text("user skill")
+    created_later = home / ".config" / "starship.toml"
+    _git("--add", "include.path", "/repo/git/.gitconfig.shared")
+
+    store = SnapshotStore(tmp_path / "snapshots")
+    snapshot = store.create(
+        [zshrc, zprofile, skills, skills / "a", created_later], ["include.path"], reason="test"
+    )
+
+    zshrc.write_text("changed")
+    zprofile.unlink()
+    zprofile.write_text("not a link")
+    (skills / "a").unlink()
+    (skills / "mine" / "SKILL.md").unlink()
+    (skills / "extra").symlink_to("/elsewhere")
+    created_later.parent.mkdir()
+    created_later.symlink_to("/repo/terminal/starship.toml")
+    _git("--unset-all", "include.path")
+    _git("--add", "include.path", "/other")
+
+    store.restore(snapshot["id"])
+
+    assert zshrc.read_text() == "original"
+    assert zshrc.stat().st_mode & 0o777 == 0o600
+    assert zprofile.readlink() == Path("/repo/shell/.zprofile")
+    assert sorted(p.name for p in skills.iterdir()) == ["a", "mine"]
+    assert (skills / "mine" / "SKILL.md").read_text() == "user skill"
+    assert not created_later.is_symlink()
+    assert _git("--get-all", "include.path").splitlines() == ["/repo/git/.gitconfig.shared"]
+    assert not list(home.glob(".*.rollback*"))
+
+
+def test_snapshot_is_independent_of_live_files(tmp_path: Path, git_config: Path) -> None:
+    config = tmp_path / "config"
+    config.write_text("before")
+    store = SnapshotStore(tmp_path / "snapshots")
+    store.create([config], [])
+
+    with open(config, "a") as f:
+        f.write(" appended")
+    store.restore()
+
+    assert config.read_text() == "before"
+
+
+def test_snapshot_get_and_prune(tmp_path: Path, git_config: Path) -> None:
+    store = SnapshotStore(tmp_path / "snapshots")
+    with pytest.raises(KeyError):
+        store.get()
+
+    ids = [store.create([], [], reason=str(i))["id"] for i in range(3)]
+
+    assert store.get()["id"] == ids[-1]
+    assert store.get(ids[0])["reason"] == "0"
+    assert store.prune(keep=1) == 2
+    assert [snapshot["id"] for snapshot in store.snapshots()] == [ids[-1]]
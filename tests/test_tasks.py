@@ -1,23 +1,48 @@
+import json
 import os
+import platform
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 from unittest.mock import MagicMock
 
 import pytest
 from invoke.context import Context
 
+import tasks
+from scripts.backups import BackupStore
+from scripts.doctor import DoctorCheck
+from scripts.fsutil import hash_file
+from scripts.setup import InstallManifest, ManifestRecord
+from scripts.shellperf import append_history
 from tasks import (
+    AI_SETUP,
+    COMPONENT_DEPS,
+    COMPONENT_PACKAGES,
     ZSHRC_TOOL_MARKER,
+    _collect_packages,
+    _component_fingerprint,
     _extract_zshrc_tool_content,
+    _home_env,
+    _install_packages,
+    _read_homes,
     _restore_zshrc_tool_content,
+    _run_graph,
     _setup_platform,
     _teardown,
+    _topological_order,
     cleanup,
+    setup,
 )
 
 
 @pytest.fixture
 def fake_home(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
     monkeypatch.setattr(Path, "home", lambda: tmp_path)
+    monkeypatch.setenv("HOME", str(tmp_path))
     return tmp_path
 
 
@@ -180,6 +205,82 @@ class TestCleanup:
     def test_cleanup_no_backups(self, fake_home: Path) -> None:
         cleanup(MagicMock(spec=Context))
 
+    def _zshrc_backups(self, fake_home: Path) -> list[Path]:
+        backups = []
+        for ts in ["20240101_120000", "20240201_120000", "20240301_120000"]:
+            p = fake_home / f".zshrc.backup.{ts}"
+            p.write_text("backup")
+            backups.append(p)
+        return backups
+
+    def test_cleanup_keep(self, fake_home: Path) -> None:
+        oldest, middle, newest = self._zshrc_backups(fake_home)
+        (fake_home / ".claude").mkdir()
+        claude_backup = fake_home / ".claude" / "CLAUDE.md.backup.20240101_120000"
+        claude_backup.write_text("backup")
+
+        cleanup(MagicMock(spec=Context), keep=1)
+
+        assert not oldest.exists() and not middle.exists()
+        assert newest.exists() and claude_backup.exists()
+
+    def test_cleanup_older_than(self, fake_home: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        oldest, middle, newest = self._zshrc_backups(fake_home)
+        now = datetime(2024, 2, 20).timestamp()
+        monkeypatch.setattr("tasks.time.time", lambda: now)
+
+        cleanup(MagicMock(spec=Context), older_than="30d")
+
+        assert not oldest.exists()
+        assert middle.exists() and newest.exists()
+
+    def test_cleanup_dry_run(self, fake_home: Path, capsys: pytest.CaptureFixture[str]) -> None:
+        backups = self._zshrc_backups(fake_home)
+        config = fake_home / "CLAUDE.md"
+        config.write_text("store me")
+        BackupStore().backup(config)
+
+        cleanup(MagicMock(spec=Context), dry_run=True)
+        out = capsys.readouterr().out
+        assert "Would remove 3 backup(s), reclaiming 18 B" in out
+        assert "Keeping 1 backup(s) in the backup store" in out
+
+        cleanup(MagicMock(spec=Context), all_=True, dry_run=True)
+
+        assert all(p.exists() for p in backups)
+        assert len(BackupStore().entries()) == 1
+        assert "Would remove 4 backup(s), reclaiming 26 B" in capsys.readouterr().out
+
+    @pytest.mark.parametrize("options", [{}, {"keep": 0}, {"all_": True}])
+    def test_cleanup_empties_backup_store_only_when_asked(
+        self, fake_home: Path, options: dict[str, object]
+    ) -> None:
+        config = fake_home / "CLAUDE.md"
+        config.write_text("store me")
+        BackupStore().backup(config)
+
+        cleanup(MagicMock(spec=Context), **options)
+
+        assert len(BackupStore().entries()) == (1 if not options else 0)
+
+    def test_cleanup_prunes_backup_store(self, fake_home: Path) -> None:
+        store = BackupStore()
+        config = fake_home / "CLAUDE.md"
+        for content in ["one", "two"]:
+            config.write_text(content)
+            store.backup(config)
+
+        cleanup(MagicMock(spec=Context), keep=1)
+
+        assert len(store.entries()) == 1
+        assert len(list(store.objects_dir.glob("*/*"))) == 1
+
+    def test_cleanup_invalid_age(self, fake_home: Path) -> None:
+        with pytest.raises(SystemExit):
+            cleanup(MagicMock(spec=Context), older_than="soon")
+        with pytest.raises(SystemExit):
+            cleanup(MagicMock(spec=Context), keep="two")
+
 
 class TestSetupPlatform:
     @pytest.fixture
@@ -271,6 +372,116 @@ class TestSetupPlatform:
             _setup_platform(mock_ctx)
 
 
+class TestInstallPackages:
+    def test_collect_packages(self) -> None:
+        packages = _collect_packages(["terminal", "direnv", "git", "shell", "terminal"])
+
+        assert packages["apt"] == ["direnv", "zsh"]
+        assert packages["apt_optional"] == ["zsh-completions"]
+        assert packages["brew"].count("fnm") == 1
+        assert "direnv" in packages["brew"]
+        assert packages["cask"] == ["ghostty"]
+
+    def test_component_packages_are_components(self) -> None:
+        assert set(COMPONENT_PACKAGES) <= set(COMPONENT_DEPS)
+
+    def test_linux_single_transaction(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr("tasks.platform.system", lambda: "Linux")
+        monkeypatch.setattr("tasks._installed_apt_packages", lambda _names: {"zsh"})
+        monkeypatch.setenv("DOTFILES_APT_UPDATED", "")
+        ctx = MagicMock(spec=Context)
+        ctx.run.side_effect = lambda command, **_kwargs: MagicMock(ok="missing" not in command)
+
+        _install_packages(ctx, ["terminal", "direnv", "shell"])
+
+        commands = [call.args[0] for call in ctx.run.call_args_list]
+        assert commands.count("sudo apt-get update -qq") == 1
+        assert commands[-1] == "sudo apt-get install -y direnv zsh-completions"
+        assert os.environ["DOTFILES_APT_UPDATED"] == "1"
+
+    def test_linux_skips_optional_without_candidate(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr("tasks.platform.system", lambda: "Linux")
+        monkeypatch.setattr("tasks._installed_apt_packages", lambda _names: set())
+        monkeypatch.setenv("DOTFILES_APT_UPDATED", "")
+        ctx = MagicMock(spec=Context)
+        ctx.run.side_effect = lambda command, **_kwargs: MagicMock(
+            ok=not command.startswith("apt-cache")
+        )
+
+        _install_packages(ctx, ["terminal"])
+
+        commands = [call.args[0] for call in ctx.run.call_args_list]
+        assert commands == ["sudo apt-get update -qq", "apt-cache show zsh-completions"]
+
+    def test_linux_remembers_optional_without_candidate(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setattr("tasks.platform.system", lambda: "Linux")
+        monkeypatch.setattr("tasks._installed_apt_packages", lambda _names: {"zsh"})
+        monkeypatch.setenv("DOTFILES_APT_UPDATED", "")
+        ctx = MagicMock(spec=Context)
+        ctx.run.side_effect = lambda command, **_kwargs: MagicMock(
+            ok=not command.startswith("apt-cache")
+        )
+
+        _install_packages(ctx, ["terminal", "shell"])
+        ctx.run.reset_mock()
+        _install_packages(ctx, ["terminal", "shell"])
+
+        ctx.run.assert_not_called()
+
+        monkeypatch.setattr("tasks._distro_key", lambda: "debian-13-x86_64")
+        _install_packages(ctx, ["terminal", "shell"])
+
+        commands = [call.args[0] for call in ctx.run.call_args_list]
+        assert commands == ["sudo apt-get update -qq", "apt-cache show zsh-completions"]
+
+    def test_linux_failed_update_does_not_mark_unavailable(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setattr("tasks.platform.system", lambda: "Linux")
+        monkeypatch.setattr("tasks._installed_apt_packages", lambda _names: {"zsh"})
+        monkeypatch.setenv("DOTFILES_APT_UPDATED", "")
+        ctx = MagicMock(spec=Context)
+        ctx.run.return_value = MagicMock(ok=False)
+
+        _install_packages(ctx, ["terminal", "shell"])
+        ctx.run.reset_mock()
+        _install_packages(ctx, ["terminal", "shell"])
+
+        assert ctx.run.call_args_list[0].args[0] == "sudo apt-get update -qq"
+
+    def test_linux_nothing_missing(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr("tasks.platform.system", lambda: "Linux")
+        monkeypatch.setattr("tasks._installed_apt_packages", lambda names: set(names))
+        ctx = MagicMock(spec=Context)
+
+        _install_packages(ctx, ["terminal", "direnv", "shell"])
+
+        ctx.run.assert_not_called()
+
+    def test_macos_single_brew_bundle(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr("tasks.platform.system", lambda: "Darwin")
+        monkeypatch.setattr(
+            "tasks._installed_brew_packages", lambda cask: set() if cask else {"fnm", "direnv"}
+        )
+        brewfiles: list[str] = []
+
+        def fake_run(command: str, **_kwargs: object) -> MagicMock:
+            brewfiles.append(Path(command.split("--file=")[1]).read_text())
+            return MagicMock(ok=True)
+
+        ctx = MagicMock(spec=Context)
+        ctx.run.side_effect = fake_run
+
+        _install_packages(ctx, ["terminal", "direnv", "rectangle"])
+
+        assert ctx.run.call_count == 1
+        assert 'brew "starship"' in brewfiles[0]
+        assert 'brew "fnm"' not in brewfiles[0]
+        assert 'cask "rectangle"' in brewfiles[0]
+
+
 class TestTeardown:
     @pytest.fixture
     def fake_home(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
@@ -326,8 +537,13 @@ class TestTeardown:
             assert not p.exists(), f"{name} should be removed"
         assert not ghostty.exists(), "ghostty dir should be removed"
 
-        zshrc_backups = list(fake_home.glob(".zshrc.backup.*"))
-        assert len(zshrc_backups) == 1
+        # Directories with no record of their content are kept in the backup store
+        backups = BackupStore().entries()
+        assert sorted(entry["source"] for entry in backups) == [
+            str(ghostty),
+            str(ai_dir),
+            str(fake_home / ".zshrc"),
+        ]
 
         assert not ai_symlink.exists() and not ai_symlink.is_symlink()
         assert not ai_dir.exists()
@@ -365,8 +581,7 @@ class TestTeardown:
         assert not zshrc.exists() and not zshrc.is_symlink()
         assert not ghostty.exists() and not ghostty.is_symlink()
 
-        zshrc_backups = list(fake_home.glob(".zshrc.backup.*"))
-        assert len(zshrc_backups) == 0
+        assert BackupStore().entries() == []
 
     def test_teardown_nothing_exists(
         self, fake_home: Path, monkeypatch: pytest.MonkeyPatch
@@ -376,3 +591,597 @@ class TestTeardown:
         monkeypatch.setattr("tasks._load_ai_tool_paths", lambda: [])
 
         _teardown()
+
+    def test_teardown_from_manifest(self, fake_home: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        mock_run = MagicMock()
+        monkeypatch.setattr("tasks.subprocess.run", mock_run)
+        repo = fake_home / "repo"
+        repo.mkdir()
+
+        ours = fake_home / ".zprofile"
+        ours.symlink_to(repo / "zprofile")
+        foreign = fake_home / ".gitignore_global"
+        foreign.symlink_to(fake_home / "elsewhere")
+        unchanged = fake_home / "rectangle.plist"
+        unchanged.write_text("prefs")
+        edited = fake_home / ".zshrc"
+        edited.write_text("loader")
+        tree = fake_home / ".gemini" / "commands"
+        tree.mkdir(parents=True)
+        (tree / "a.toml").write_text("a")
+        skills = fake_home / ".claude" / "skills"
+        skills.mkdir(parents=True)
+        (skills / "skill-a").symlink_to(repo / "skill-a")
+        user_skills = fake_home / ".cursor" / "skills"
+        user_skills.mkdir(parents=True)
+        (user_skills / "mine").mkdir()
+        forgotten = fake_home / "not-in-manifest"
+        forgotten.write_text("keep")
+
+        def record(kind: str, path: Path | str, expected: str = "") -> ManifestRecord:
+            return {"kind": kind, "path": str(path), "expected": expected, "component": "x"}
+
+        InstallManifest().record(
+            [
+                record("symlink", ours, str(repo / "zprofile")),
+                record("symlink", foreign, str(repo / "gitignore")),
+                record("file", unchanged, hash_file(unchanged)),
+                record("file", edited),
+                record("tree", tree),
+                record("file", tree / "a.toml", "stale"),
+                record("dir", skills),
+                record("symlink", skills / "skill-a", str(repo / "skill-a")),
+                record("dir", user_skills),
+                record("symlink", fake_home / "already-gone", "/x"),
+                record("gitconfig", "include.path", "/repo/git/.gitconfig.shared"),
+            ]
+        )
+
+        _teardown()
+
+        assert not ours.is_symlink()
+        assert foreign.is_symlink()
+        assert not unchanged.exists()
+        assert not edited.exists()
+        assert sorted(entry["source"] for entry in BackupStore().entries()) == [
+            str(tree),
+            str(edited),
+        ]
+        assert not tree.exists()
+        assert not skills.exists()
+        assert (user_skills / "mine").is_dir()
+        assert forgotten.exists()
+        assert [call.args[0] for call in mock_run.call_args_list] == [
+            [
+                "git",
+                "config",
+                "--global",
+                "--unset-all",
+                "include.path",
+                "--fixed-value",
+                "/repo/git/.gitconfig.shared",
+            ]
+        ]
+        assert InstallManifest().records() == []
+
+    def test_teardown_keeps_user_files_in_generated_dirs(
+        self, fake_home: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setattr("tasks.subprocess.run", MagicMock())
+        commands = fake_home / ".gemini" / "commands"
+        commands.mkdir(parents=True)
+        generated = commands / "skill-a.toml"
+        generated.write_text("a")
+        edited = commands / "skill-b.toml"
+        edited.write_text("b")
+        mine = commands / "mine.toml"
+        mine.write_text("mine")
+
+        def record(kind: str, path: Path, expected: str = "") -> ManifestRecord:
+            return {"kind": kind, "path": str(path), "expected": expected, "component": "x"}
+
+        InstallManifest().record(
+            [
+                record("dir", commands),
+                record("file", generated, hash_file(generated)),
+                record("file", edited, hash_file(edited)),
+            ]
+        )
+        edited.write_text("b, edited by hand")
+
+        _teardown()
+
+        assert not generated.exists() and not edited.exists()
+        assert mine.read_text() == "mine"
+        assert [entry["source"] for entry in BackupStore().entries()] == [str(edited)]
+
+
+class TestRunGraph:
+    DEPS = {"a": [], "b": [], "c": ["a"], "d": ["c"], "e": []}
+
+    def test_run_graph_respects_dependencies(self) -> None:
+        finished: list[str] = []
+
+        def run(name: str) -> bool:
+            for need in self.DEPS[name]:
+                assert need in finished
+            finished.append(name)
+            return True
+
+        status = _run_graph(self.DEPS, run, jobs=3)
+
+        assert status == dict.fromkeys(self.DEPS, "ok")
+        assert sorted(finished) == sorted(self.DEPS)
+
+    def test_ai_setup_runs_after_shell(self) -> None:
+        finished: list[str] = []
+        lock = threading.Lock()
+
+        def run(name: str) -> bool:
+            if name == tasks.AI_SETUP:
+                assert "shell" in finished
+            time.sleep(0.01 if name == "shell" else 0)
+            with lock:
+                finished.append(name)
+            return True
+
+        status = _run_graph(tasks.SetupSteps(force=True).deps, run, jobs=8)
+
+        assert status[tasks.AI_SETUP] == "ok"
+        assert finished.index("shell") < finished.index(tasks.AI_SETUP)
+
+    def test_run_graph_runs_independent_components_concurrently(self) -> None:
+        barrier = threading.Barrier(2, timeout=5)
+
+        def run(name: str) -> bool:
+            barrier.wait()
+            return True
+
+        assert _run_graph({"a": [], "b": []}, run, jobs=2) == {"a": "ok", "b": "ok"}
+
+    def test_run_graph_fail_fast(self) -> None:
+        status = _run_graph(self.DEPS, lambda name: name != "a", jobs=1)
+
+        assert status == {
+            "a": "failed",
+            "b": "cancelled",
+            "c": "skipped",
+            "d": "skipped",
+            "e": "cancelled",
+        }
+
+    def test_run_graph_keep_going(self) -> None:
+        status = _run_graph(self.DEPS, lambda name: name != "a", jobs=1, keep_going=True)
+
+        assert status == {"a": "failed", "b": "ok", "c": "skipped", "d": "skipped", "e": "ok"}
+
+    def test_run_graph_treats_exceptions_as_failures(self) -> None:
+        def run(name: str) -> bool:
+            raise RuntimeError("boom")
+
+        assert _run_graph({"a": []}, run) == {"a": "failed"}
+
+    @pytest.mark.parametrize(
+        "deps",
+        [{"a": ["b"], "b": ["a"]}, {"a": ["missing"]}],
+        ids=["cycle", "unknown"],
+    )
+    def test_topological_order_rejects_invalid_graphs(self, deps: dict[str, list[str]]) -> None:
+        with pytest.raises(ValueError):
+            _topological_order(deps)
+
+
+class TestComponentFingerprint:
+    @pytest.fixture
+    def repo(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+        repo = tmp_path / "repo"
+        (repo / "lib").mkdir(parents=True)
+        (repo / "lib" / "platform.sh").write_text("# helpers")
+        (repo / "direnv").mkdir()
+        (repo / "direnv" / "setup").write_text("#!/bin/bash")
+        monkeypatch.setattr("tasks.REPO_DIR", repo)
+        monkeypatch.setenv("PATH", str(tmp_path / "bin"))
+        return repo
+
+    def test_component_fingerprint_is_stable(self, repo: Path, fake_home: Path) -> None:
+        assert _component_fingerprint("direnv", "abc") == _component_fingerprint("direnv", "abc")
+        assert _component_fingerprint("direnv", "abc") != _component_fingerprint("direnv", "def")
+
+    @pytest.mark.parametrize("change", ["component_file", "platform_sh", "binary", "path"])
+    def test_component_fingerprint_changes(self, repo: Path, fake_home: Path, change: str) -> None:
+        before = _component_fingerprint("direnv", "abc")
+
+        if change == "component_file":
+            (repo / "direnv" / "direnvrc").write_text("layout uv")
+        elif change == "platform_sh":
+            (repo / "lib" / "platform.sh").write_text("# changed")
+        elif change == "binary":
+            binary = fake_home / "bin" / "direnv"
+            binary.parent.mkdir()
+            binary.write_text("#!/bin/sh")
+            binary.chmod(0o755)
+        else:
+            direnvrc = fake_home / ".config" / "direnv" / "direnvrc"
+            direnvrc.parent.mkdir(parents=True)
+            direnvrc.symlink_to(repo / "direnv" / "direnvrc")
+
+        assert _component_fingerprint("direnv", "abc") != before
+
+
+class TestSetup:
+    def test_setup_skips_unchanged_components(
+        self, fake_home: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        ran: list[str] = []
+
+        def fake_run_component(_ctx: Context, name: str, _offline: bool) -> bool:
+            ran.append(name)
+            return True
+
+        monkeypatch.setattr("tasks._setup_platform", lambda _ctx: None)
+        monkeypatch.setattr("tasks._prefetch_artifacts", lambda _components: None)
+        monkeypatch.setattr("tasks._install_packages", lambda _ctx, _components: None)
+        monkeypatch.setattr("tasks._run_component", fake_run_component)
+        ctx = MagicMock(spec=Context)
+
+        setup(ctx, jobs=1)
+        assert sorted(ran) == sorted([*COMPONENT_DEPS, AI_SETUP])
+
+        ran.clear()
+        setup(ctx, jobs=1)
+        assert ran == [AI_SETUP]
+
+        (fake_home / ".gitignore_global").write_text("changed")
+        ran.clear()
+        setup(ctx, jobs=1)
+        assert sorted(ran) == ["ai", "git"]
+
+        ran.clear()
+        setup(ctx, jobs=1, force=True)
+        assert len(ran) == len(COMPONENT_DEPS) + 1
+
+    def test_setup_does_not_record_failed_components(
+        self, fake_home: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setattr("tasks._setup_platform", lambda _ctx: None)
+        monkeypatch.setattr("tasks._prefetch_artifacts", lambda _components: None)
+        monkeypatch.setattr("tasks._install_packages", lambda _ctx, _components: None)
+        monkeypatch.setattr("tasks._run_component", lambda _ctx, name, _offline: name != "git")
+
+        with pytest.raises(SystemExit):
+            setup(MagicMock(spec=Context), jobs=1, keep_going=True, rollback=False)
+
+        assert "git" not in tasks._load_component_state()
+        assert "lazygit" in tasks._load_component_state()
+
+    def test_setup_rolls_back_on_failure(
+        self, fake_home: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        zshrc = fake_home / ".zshrc"
+        zshrc.write_text("mine")
+
+        def fake_run_component(_ctx: Context, name: str, _offline: bool) -> bool:
+            if name == "shell":
+                zshrc.write_text("broken")
+                (fake_home / ".zprofile").symlink_to(fake_home / "repo" / ".zprofile")
+            return name != "shell"
+
+        monkeypatch.setattr("tasks._setup_platform", lambda _ctx: None)
+        monkeypatch.setattr("tasks._prefetch_artifacts", lambda _components: None)
+        monkeypatch.setattr("tasks._install_packages", lambda _ctx, _components: None)
+        monkeypatch.setattr("tasks._run_component", fake_run_component)
+
+        with pytest.raises(SystemExit):
+            setup(MagicMock(spec=Context), jobs=1)
+
+        assert zshrc.read_text() == "mine"
+        assert not (fake_home / ".zprofile").is_symlink()
+        assert tasks._load_component_state() == {}
+
+
+class TestReset:
+    def test_parse_reset_selection(self) -> None:
+        assert tasks._parse_reset_selection("shell, terminal,claude") == (
+            ["terminal", "shell"],
+            ["claude"],
+        )
+        components, tool_ids = tasks._parse_reset_selection("ai")
+        assert components == []
+        assert "claude" in tool_ids and "gemini" in tool_ids
+
+        with pytest.raises(SystemExit, match="Unknown component"):
+            tasks._parse_reset_selection("shell,nope")
+
+    def test_reset_only_rebuilds_selected(
+        self, fake_home: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        ran: list[str] = []
+
+        def fake_run_component(_ctx: Context, name: str, _offline: bool = False) -> bool:
+            ran.append(name)
+            return True
+
+        monkeypatch.setattr("tasks._run_component", fake_run_component)
+        monkeypatch.setattr("tasks.setup", MagicMock(side_effect=AssertionError("full setup")))
+        repo = fake_home / "repo"
+        zprofile = fake_home / ".zprofile"
+        zprofile.symlink_to(repo / "zprofile")
+        gitignore = fake_home / ".gitignore_global"
+        gitignore.symlink_to(repo / "gitignore")
+        claude_md = fake_home / "CLAUDE.md"
+        claude_md.symlink_to(repo / "CLAUDE.md")
+        gemini_md = fake_home / "GEMINI.md"
+        gemini_md.symlink_to(repo / "GEMINI.md")
+        InstallManifest().record(
+            [
+                {"kind": "symlink", "path": str(path), "expected": str(target), "component": c}
+                for path, target, c in [
+                    (zprofile, repo / "zprofile", "shell"),
+                    (gitignore, repo / "gitignore", "git"),
+                    (claude_md, repo / "CLAUDE.md", "ai:claude"),
+                    (gemini_md, repo / "GEMINI.md", "ai:gemini"),
+                ]
+            ]
+        )
+        ctx = MagicMock(spec=Context)
+
+        tasks.reset(ctx, yes=True, only="shell,claude")
+
+        assert ran == ["shell"]
+        assert ctx.run.call_args.args[0] == "python scripts/setup.py claude"
+        assert not zprofile.is_symlink() and not claude_md.is_symlink()
+        assert gitignore.is_symlink() and gemini_md.is_symlink()
+        assert {r["component"] for r in InstallManifest().records()} == {"git", "ai:gemini"}
+        assert "shell" in tasks._load_component_state()
+
+
+class TestDoctor:
+    @pytest.fixture(autouse=True)
+    def no_binaries(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr("tasks.COMPONENT_PROBES", {})
+
+    def test_doctor_reports_drift(
+        self, fake_home: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+    ) -> None:
+        monkeypatch.setenv("GIT_CONFIG_GLOBAL", str(fake_home / ".gitconfig"))
+        repo = fake_home / "repo"
+        zprofile = fake_home / ".zprofile"
+        zprofile.symlink_to(repo / "zprofile")
+        gitignore = fake_home / ".gitignore_global"
+        InstallManifest().record(
+            [
+                {
+                    "kind": "symlink",
+                    "path": str(zprofile),
+                    "expected": str(repo / "zprofile"),
+                    "component": "shell",
+                },
+                {
+                    "kind": "symlink",
+                    "path": str(gitignore),
+                    "expected": str(repo / "gitignore"),
+                    "component": "git",
+                },
+                {
+                    "kind": "gitconfig",
+                    "path": "include.path",
+                    "expected": "/shared",
+                    "component": "git",
+                },
+            ]
+        )
+        ctx = MagicMock(spec=Context)
+
+        with pytest.raises(SystemExit) as excinfo:
+            tasks.doctor(ctx, json_=True)
+
+        assert excinfo.value.code == 1
+        checks = json.loads(capsys.readouterr().out)
+        assert [(c["subject"], c["status"]) for c in checks] == [
+            (str(zprofile), "ok"),
+            (str(gitignore), "drift"),
+            ("include.path", "drift"),
+        ]
+
+        gitignore.symlink_to(repo / "gitignore")
+        subprocess.run(["git", "config", "--global", "include.path", "/shared"], check=True)
+        tasks.doctor(ctx)
+        assert "3 checks, 0 failing" in capsys.readouterr().out
+
+    def test_doctor_checks_installed_tools_only(
+        self, fake_home: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        checked: list[str] = []
+
+        def fake_check_tool(tool_id: str, *_args: object) -> list[DoctorCheck]:
+            checked.append(tool_id)
+            return []
+
+        monkeypatch.setattr("tasks.check_tool", fake_check_tool)
+        InstallManifest().record(
+            [
+                {
+                    "kind": "symlink",
+                    "path": str(fake_home / "GEMINI.md"),
+                    "expected": "x",
+                    "component": "ai:gemini",
+                },
+            ]
+        )
+
+        probes = tasks._doctor_probes(timeout=1, versions=False)
+
+        assert list(probes) == ["tool:gemini"]
+        probes["tool:gemini"]()
+        assert checked == ["gemini"]
+
+
+class TestProvision:
+    def test_read_homes(self, tmp_path: Path) -> None:
+        homes_file = tmp_path / "homes.txt"
+        homes_file.write_text("/srv/a\n\n# comment\n/srv/b  # trailing\n/srv/a\n")
+
+        assert _read_homes(["/srv/c", "/srv/b"], str(homes_file)) == [
+            Path("/srv/c"),
+            Path("/srv/b"),
+            Path("/srv/a"),
+        ]
+
+    def test_provision_home(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        home = tmp_path / "home"
+        cache_home = tmp_path / "cache"
+        # _provision_home points the environment at the home; restore it afterwards
+        for key in _home_env(home, str(cache_home)):
+            monkeypatch.setenv(key, os.environ.get(key, ""))
+        ran: list[str] = []
+
+        def fake_run_component_logged(name: str, log_path: Path, _offline: bool = False) -> bool:
+            assert log_path.parent == home / ".local" / "state" / "dotfiles" / "logs"
+            (Path.home() / f"{name}.done").touch()
+            ran.append(name)
+            return True
+
+        monkeypatch.setattr("tasks._run_component_logged", fake_run_component_logged)
+
+        result = tasks._provision_home(str(home), str(cache_home), False, False, True)
+
+        assert result["error"] == ""
+        assert set(result["status"].values()) == {"ok"}
+        assert {path.stem for path in home.glob("*.done")} == {*COMPONENT_DEPS, AI_SETUP}
+        assert (home / ".local" / "state" / "dotfiles" / "components.json").exists()
+        assert os.environ["XDG_CACHE_HOME"] == str(cache_home)
+
+        ran.clear()
+        result = tasks._provision_home(str(home), str(cache_home), False, False, True)
+        assert ran == [AI_SETUP]
+        assert result["status"]["shell"] == "cached"
+
+    @pytest.mark.skipif(os.geteuid() != 0, reason="chown to another user needs root")
+    def test_provision_home_hands_files_to_home_owner(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        home = tmp_path / "home"
+        home.mkdir()
+        os.chown(home, 12345, 23456)
+        other = home / "other.txt"
+        other.touch()
+        os.chown(other, 54321, 54321)
+        cache_home = tmp_path / "cache"
+        for key in _home_env(home, str(cache_home)):
+            monkeypatch.setenv(key, os.environ.get(key, ""))
+
+        def fake_run_component_logged(name: str, log_path: Path, _offline: bool = False) -> bool:
+            (Path.home() / ".config" / name).mkdir(parents=True, exist_ok=True)
+            (Path.home() / ".config" / name / "config").touch()
+            return True
+
+        monkeypatch.setattr("tasks._run_component_logged", fake_run_component_logged)
+
+        result = tasks._provision_home(str(home), str(cache_home), False, False, True)
+
+        assert result["error"] == ""
+        created = [path for path in home.rglob("*") if path != other]
+        assert home / ".local" / "state" / "dotfiles" / tasks.PROVISION_LOCK in created
+        assert home / ".config" / "shell" / "config" in created
+        assert {(p.lstat().st_uid, p.lstat().st_gid) for p in created} == {(12345, 23456)}
+        assert (other.stat().st_uid, other.stat().st_gid) == (54321, 54321)
+
+    def test_provision_reports_every_home(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+    ) -> None:
+        def fake_provision_home(home: str, *_args: object) -> tasks.ProvisionResult:
+            error = "failed: shell" if home.endswith("bad") else ""
+            return {"home": home, "status": {"shell": "ok"}, "seconds": 0.1, "error": error}
+
+        monkeypatch.setattr("tasks._provision_home", fake_provision_home)
+        monkeypatch.setattr("tasks.ProcessPoolExecutor", ThreadPoolExecutor)
+        monkeypatch.setattr("tasks._setup_platform", MagicMock())
+        homes = [str(tmp_path / "good"), str(tmp_path / "bad")]
+
+        with pytest.raises(SystemExit, match="Provisioning failed: .*bad"):
+            tasks.provision(MagicMock(spec=Context), home=homes, offline=True)
+
+        out = capsys.readouterr().out
+        assert f"✓ {tmp_path / 'good'} (0.1s; ran shell)" in out
+        assert f"✗ {tmp_path / 'bad'}: failed: shell" in out
+        assert "1 of 2 home(s) provisioned" in out
+
+    def test_provision_needs_a_home(self) -> None:
+        with pytest.raises(SystemExit, match="No homes given"):
+            tasks.provision(MagicMock(spec=Context))
+
+
+class TestBundle:
+    def test_bundle_and_unbundle(
+        self, fake_home: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.delenv("GIT_CONFIG_GLOBAL", raising=False)
+        link = fake_home / ".gitignore_global"
+        link.symlink_to(tasks.REPO_DIR / "git" / ".gitignore_global")
+        InstallManifest().record(
+            [
+                {
+                    "kind": "symlink",
+                    "path": str(link),
+                    "expected": os.readlink(link),
+                    "component": "git",
+                }
+            ]
+        )
+        archive = tmp_path / "env.tar.gz"
+        ctx = MagicMock(spec=Context)
+
+        tasks.bundle(ctx, output=str(archive))
+        tasks.unbundle(ctx, str(archive), home=str(tmp_path / "other"), repo_dir="/opt/dotfiles")
+
+        assert os.readlink(tmp_path / "other" / ".gitignore_global") == (
+            "/opt/dotfiles/git/.gitignore_global"
+        )
+
+    def test_bundle_needs_a_setup(self, fake_home: Path) -> None:
+        with pytest.raises(SystemExit, match="run inv setup first"):
+            tasks.bundle(MagicMock(spec=Context))
+
+
+class TestShellperfReport:
+    def _record(self, commit: str, when: float, total: float) -> None:
+        append_history(
+            {
+                "time": when,
+                "commit": commit,
+                "host": platform.node(),
+                "mode": "cold",
+                "runs": 5,
+                "total": total,
+                "timings": {"files": total / 2},
+            }
+        )
+
+    def test_report_shows_regressions(self, capsys: pytest.CaptureFixture[str]) -> None:
+        self._record("a" * 40, 1.0, 100.0)
+        self._record("b" * 40, 2.0, 160.0)
+
+        tasks.shellperf_report(MagicMock(spec=Context), budget=200.0)
+
+        output = capsys.readouterr().out
+        assert "bbbbbbbbbb" in output
+        assert "total: 100.0 ms -> 160.0 ms at bbbbbbbbbb (after aaaaaaaaaa)" in output
+        assert "files: 50.0 ms -> 80.0 ms" in output
+        assert "within the 200 ms budget" in output
+
+    def test_report_fails_over_budget(self, capsys: pytest.CaptureFixture[str]) -> None:
+        self._record("a" * 40, 1.0, 250.0)
+
+        with pytest.raises(SystemExit) as excinfo:
+            tasks.shellperf_report(MagicMock(spec=Context), budget=200.0, json_=True)
+
+        assert excinfo.value.code == 1
+        report = json.loads(capsys.readouterr().out)
+        assert report["trends"][0]["timings"]["total"] == 250.0
+
+    def test_report_ignores_other_modes(self, capsys: pytest.CaptureFixture[str]) -> None:
+        self._record("a" * 40, 1.0, 250.0)
+
+        tasks.shellperf_report(MagicMock(spec=Context), mode="warm")
+
+        assert "No warm shellperf results" in capsys.readouterr().out